@@ -2,6 +2,9 @@
 ASGI config for Salon_manikura project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Async views (website.views.index, services_list, free_slots) are served
+natively by an ASGI server, e.g. ``uvicorn Salon_manikura.asgi:application``;
+under WSGI Django runs them through async_to_sync.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/4.1/howto/deployment/asgi/
@@ -1,6 +1,9 @@
 import os
+from datetime import time
 from pathlib import Path
 
+import django
+
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 SECRET_KEY = 'your-secret-key'
@@ -19,6 +22,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Первым, чтобы в замер попадало время всех остальных слоёв
+    'website.perf.PerfMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -48,10 +53,39 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'Salon_manikura.wsgi.application'
 
+# SQLite с PRAGMA на каждом соединении (website/database.py). Соединения
+# постоянные: PRAGMA и открытие файла — раз в CONN_MAX_AGE, а не на каждый запрос.
+# 'read' — тот же файл вторым соединением: на него ReadRouter отправляет чтения
+# представлений, помеченных @read_only, чтобы они не ждали запись. Работает
+# только вместе с WAL (SQLITE_PRAGMAS ниже): без него чтения остаются на default
+_SQLITE = {
+    'ENGINE': 'django.db.backends.sqlite3',
+    'NAME': BASE_DIR / 'db.sqlite3',
+    'CONN_MAX_AGE': 600,
+    'CONN_HEALTH_CHECKS': True,
+}
 DATABASES = {
+    'default': _SQLITE,
+    'read': {**_SQLITE, 'TEST': {'MIRROR': 'default'}},
+}
+DATABASE_ROUTERS = ['website.database.ReadRouter']
+READ_DATABASE = 'read'
+# Дополняют и переопределяют website.database.DEFAULT_PRAGMAS. Режим WAL меняет
+# сам файл базы, поэтому включается только в настройках развёртывания:
+# SQLITE_PRAGMAS = {'journal_mode': 'wal'} — вместе с ним synchronous становится
+# 'normal' (без WAL — 'full') и включается соединение для чтения READ_DATABASE
+SQLITE_PRAGMAS = {}
+
+# Кеш процесса — только для разработки: в кеше живут сессии и пользователи сессий
+# (website/sessions.py, website/auth.py), и manage.py check --deploy сообщит об
+# ошибке website.E001. Между воркерами нужен общий кеш, например
+# 'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://127.0.0.1:6379',
+# или на одном сервере файловый:
+# 'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': BASE_DIR / 'cache'
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'salon-manikura',
     }
 }
 
@@ -83,5 +117,90 @@ STATICFILES_DIRS = [
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Сборка статики: manage.py build_assets (вендоринг + collectstatic) — обязательный
+# шаг деплоя. Сторонние файлы (website/static/website/vendor/, см. VENDORED в
+# website/assets.py) в git не хранятся и скачиваются им; без сети build_assets
+# предупреждает и продолжает, а страницы подключают их с CDN.
+# Хеши в именах, минифицированный CSS и копии .gz/.br — website/storage.py
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+_STATICFILES_BACKEND = 'website.storage.CompressedManifestStaticFilesStorage'
+if django.VERSION >= (4, 2):
+    STORAGES = {
+        'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+        'staticfiles': {'BACKEND': _STATICFILES_BACKEND},
+    }
+else:
+    STATICFILES_STORAGE = _STATICFILES_BACKEND
+# /static/ и /media/ отдаёт сам Django (website/assets.py): ETag, Range, вечный кеш
+# для хешированных имён. Выключить, если файлы отдаёт веб-сервер
+SERVE_FILES = True
+STATIC_IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
-AUTH_USER_MODEL = 'website.User'
\ No newline at end of file
+AUTH_USER_MODEL = 'website.User'
+
+# Сессии читаются из кеша и пишутся в кеш и в БД (website/sessions.py).
+# Истёкшие сессии удаляет manage.py purge_sessions
+SESSION_ENGINE = 'website.sessions'
+# Сколько секунд живёт копия сессии в кеше. С LocMemCache (только при DEBUG) выход
+# в другом процессе становится виден здесь не позже чем через это время
+SESSION_CACHE_TTL = 300
+# Пользователь запроса собирается из кеша и только из нужных полей (website/auth.py).
+# ModelBackend остаётся в списке для сессий, открытых до его подключения
+AUTHENTICATION_BACKENDS = [
+    'website.auth.SessionUserBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+# Сколько секунд живёт закешированная строка пользователя сессии
+USER_CACHE_TTL = 60
+
+# Рабочие часы салона и шаг сетки записи (движок свободных слотов website/availability.py)
+SALON_OPENING_TIME = time(9, 0)
+SALON_CLOSING_TIME = time(21, 0)
+SALON_SLOT_STEP_MINUTES = 15
+# Сколько секунд индекс занятости доверяет загруженному дню без перечитывания из БД
+AVAILABILITY_CACHE_TTL = 300
+# Как часто процесс перечитывает статусы записей: правку в админке другого процесса
+# сигнал сюда не доносит, секунды
+STATUS_REGISTRY_TTL = 30
+# Время жизни закешированных виджетов главной страницы, секунды
+HOMEPAGE_WIDGETS_TTL = 300
+# Скидка постоянного клиента: класс расчёта цены и уровни
+# (минимум визитов за 182 дня, скидка в процентах, название уровня)
+PRICING_POLICY = 'website.loyalty.LoyaltyPolicy'
+LOYALTY_TIERS = [
+    (0, 0, 'Новый клиент'),
+    (11, 10, 'Постоянный клиент'),
+]
+# Через сколько секунд корзины визитов пересобираются из БД: так в цену попадают
+# записи, сохранённые другими процессами
+LOYALTY_CACHE_TTL = 60
+# Производные картинок (website/images.py): ширины в пикселях, форматы и качество
+IMAGE_VARIANT_WIDTHS = [80, 160, 320, 640]
+IMAGE_VARIANT_FORMATS = ['avif', 'webp']
+IMAGE_VARIANT_QUALITY = 80
+# Фоновые задачи (website/tasks.py, manage.py worker). TASKS_EAGER = True выполняет
+# задачи сразу в процессе запроса — удобно, если воркер не запущен
+TASKS_EAGER = False
+TASK_MAX_ATTEMPTS = 5
+TASK_RETRY_BASE_SECONDS = 10
+TASK_LOCK_TIMEOUT = 600
+# Замеры производительности (website/perf.py): доля замеряемых запросов, окно отчёта
+# в секундах, выборок на представление, порог одинаковых запросов для пометки N+1
+# и папка, куда процессы сбрасывают выборки для manage.py perfreport.
+# По умолчанию выключены: при PERF_SAMPLE_RATE = 0 PerfMiddleware не подключается
+# и ничего не подменяет. Включить, например: PERF_SAMPLE_RATE = 0.1 и
+# PERF_SNAPSHOT_DIR = BASE_DIR / 'perf' (без папки отчёт видит только свой процесс)
+PERF_SAMPLE_RATE = 0
+PERF_WINDOW_SECONDS = 60 * 60
+PERF_MAX_SAMPLES = 1000
+PERF_DUPLICATE_THRESHOLD = 3
+PERF_SNAPSHOT_DIR = None
+PERF_FLUSH_SECONDS = 30
+# Время жизни закешированных фрагментов шаблонов ({% cache_fragment %}), секунды.
+# Ключи версионированы по updated_at, так что TTL лишь вытесняет старые версии
+FRAGMENT_CACHE_TTL = 24 * 60 * 60
+# Как часто процесс сверяет версии таблиц каталога (ETag / Last-Modified) с общим кешем, секунды
+FRESHNESS_TTL = 30
+# Async-представления выполняют независимые запросы в отдельных потоках и соединениях
+ASYNC_PARALLEL_QUERIES = True
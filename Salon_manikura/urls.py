@@ -1,8 +1,10 @@
+import re
+
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.conf import settings
-from django.conf.urls.static import static
 from django.contrib.auth import views as auth_views
+from website import assets
 from website.forms import CustomAuthenticationForm
 
 urlpatterns = [
@@ -24,7 +26,9 @@ urlpatterns = [
     path('', include('website.urls')),
 ]
 
-if settings.DEBUG:
-    # В режиме разработки Django отдаёт статику
-    urlpatterns += static(settings.STATIC_URL, document_root=settings.STATICFILES_DIRS[0])
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+if settings.SERVE_FILES:
+    # Статика и загрузки без отдельного веб-сервера: с ETag, Range и долгим кешем
+    urlpatterns += [
+        re_path(r'^%s(?P<path>.+)$' % re.escape(settings.STATIC_URL.lstrip('/')), assets.serve_static),
+        re_path(r'^%s(?P<path>.+)$' % re.escape(settings.MEDIA_URL.lstrip('/')), assets.serve_media),
+    ]
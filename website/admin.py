@@ -1,10 +1,33 @@
+from datetime import timedelta
+
+from django import forms
 from django.contrib import admin
+from django.contrib.admin.widgets import ForeignKeyRawIdWidget
 from django.contrib.auth.admin import UserAdmin as DjangoUserAdmin
+from django.core.exceptions import PermissionDenied
+from django.db.models import Count, IntegerField, OuterRef, Prefetch, Subquery
+from django.db.models.functions import Coalesce
+from django.shortcuts import get_object_or_404
+from django.template.response import TemplateResponse
+from django.urls import NoReverseMatch, path, reverse
+from django.utils import timezone
+from django.utils.text import Truncator
+from .loyalty import pricing_policy
 from .models import (
     User, Service, Master, MasterService,
     AppointmentStatus, Appointment, Review,
-    Promotion, GalleryImage, Favorite
+    Promotion, GalleryImage, Favorite, Task
 )
+from .pagination import APPOINTMENT_ORDERING, after_cursor, appointment_cursor
+
+# Записи мастера в карточке: редактируются только недавние и будущие,
+# более ранние подгружаются страницами по ссылке «Более ранние записи»
+APPOINTMENT_INLINE_PAST_DAYS = 30
+OLDER_APPOINTMENTS_PAGE_SIZE = 50
+
+
+def appointment_inline_start():
+    return timezone.localdate() - timedelta(days=APPOINTMENT_INLINE_PAST_DAYS)
 
 # Inline для MasterService
 class MasterServiceInline(admin.TabularInline):
@@ -14,26 +37,70 @@ class MasterServiceInline(admin.TabularInline):
     verbose_name = 'Услуга мастера'
     verbose_name_plural = 'Услуги мастеров'
 
+class RowObjectRawIdWidget(ForeignKeyRawIdWidget):
+    """Поле id со ссылкой на объект. Подпись берётся из объекта, уже загруженного
+    со строкой inline через select_related, а не отдельным запросом на строку."""
+
+    related_obj = None
+
+    def label_and_url_for_value(self, value):
+        obj = self.related_obj
+        if obj is None or str(obj.pk) != str(value):
+            return super().label_and_url_for_value(value)
+        try:
+            url = reverse(
+                f'{self.admin_site.name}:{obj._meta.app_label}_{obj._meta.model_name}_change', args=(obj.pk,)
+            )
+        except NoReverseMatch:
+            url = ''
+        return Truncator(obj).words(14), url
+
+
+class AppointmentInlineForm(forms.ModelForm):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        for name in AppointmentInline.raw_id_fields:
+            widget = self.fields[name].widget
+            if isinstance(widget, RowObjectRawIdWidget) and self.instance.pk:
+                widget.related_obj = getattr(self.instance, name)
+
+
 # Inline для Appointment в MasterAdmin
 class AppointmentInline(admin.TabularInline):
     model = Appointment
+    form = AppointmentInlineForm
     extra = 0
     fk_name = 'master'
-    readonly_fields = ('created_at', 'updated_at', 'client_name', 'service_name')
+    template = 'admin/website/master/appointment_inline.html'
+    verbose_name_plural = f'Записи за последние {APPOINTMENT_INLINE_PAST_DAYS} дней и будущие'
+    # Клиент и услуга — поля id с подписью, а не выпадающие списки всех клиентов
+    # и услуг в каждой строке: списки и были главной ценой страницы
+    raw_id_fields = ('client', 'service')
+    readonly_fields = ('created_at', 'updated_at')
     fields = (
-        'client', 'client_name', 'service', 'service_name',
+        'client', 'service',
         'appointment_date', 'appointment_time', 'status',
         'price_paid', 'created_at', 'updated_at'
     )
     show_change_link = True
 
-    @admin.display(description='Клиент')
-    def client_name(self, obj):
-        return obj.client.username if obj.client else '-'
+    def get_queryset(self, request):
+        return (
+            super().get_queryset(request)
+            .filter(appointment_date__gte=appointment_inline_start())
+            .select_related('client', 'service')
+        )
 
-    @admin.display(description='Услуга')
-    def service_name(self, obj):
-        return obj.service.name if obj.service else '-'
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        if db_field.name in self.raw_id_fields:
+            kwargs['widget'] = RowObjectRawIdWidget(db_field.remote_field, self.admin_site, using=kwargs.get('using'))
+        field = super().formfield_for_foreignkey(db_field, request, **kwargs)
+        if db_field.name == 'status':
+            # Варианты статуса читаются один раз на запрос, а не в каждой строке
+            if not hasattr(request, '_appointment_status_choices'):
+                request._appointment_status_choices = list(field.choices)
+            field.choices = request._appointment_status_choices
+        return field
 
 # Inline для Favorite в UserAdmin
 class FavoriteInline(admin.TabularInline):
@@ -65,45 +132,121 @@ class CustomUserAdmin(DjangoUserAdmin):
     date_hierarchy = 'date_joined'
     readonly_fields = ('last_login', 'date_joined', 'created_at', 'updated_at')
     inlines = [FavoriteInline]
+    actions = ['preview_loyalty']
+
+    @admin.action(description='Предпросмотр скидок постоянного клиента')
+    def preview_loyalty(self, request, queryset):
+        policy = pricing_policy()
+        rows = [
+            {'client': client, 'visits': visits, 'discount': tier[1], 'level': tier[2]}
+            for client, visits, tier in policy.preview(list(queryset))
+        ]
+        return TemplateResponse(request, 'admin/website/loyalty_preview.html', {
+            **self.admin_site.each_context(request),
+            'title': 'Скидки постоянного клиента',
+            'opts': self.model._meta,
+            'rows': rows,
+        })
 
-    @admin.display(description='Количество записей')
+    def get_queryset(self, request):
+        # Число записей — подзапросом по индексу appointment_client_idx в том же запросе,
+        # что и список. Не JOIN + GROUP BY: группировку унаследовали бы запросы
+        # date_hierarchy и счётчика страниц, и каждый прошёл бы по всем записям
+        appointments_total = (
+            Appointment.objects.filter(client=OuterRef('pk'))
+            .order_by().values('client').annotate(total=Count('*')).values('total')
+        )
+        return super().get_queryset(request).annotate(
+            appointments_total=Coalesce(Subquery(appointments_total, output_field=IntegerField()), 0)
+        )
+
+    @admin.display(description='Количество записей', ordering='appointments_total')
     def appointment_count(self, obj):
-        return obj.appointments.count()
+        return obj.appointments_total
 
 @admin.register(Service)
 class ServiceAdmin(admin.ModelAdmin):
-    list_display = ('id', 'name', 'price', 'duration_minutes', 'created_at')
+    list_display = (
+        'id', 'name', 'price', 'duration_minutes',
+        'rating_avg', 'review_count', 'bookings_30d', 'created_at'
+    )
     list_display_links = ('name',)
     list_filter = ('price',)
     search_fields = ('name', 'description')
-    readonly_fields = ('created_at', 'updated_at')
+    readonly_fields = ('created_at', 'updated_at', 'rating_avg', 'review_count', 'bookings_30d')
     date_hierarchy = 'created_at'
     raw_id_fields = ()
 
 @admin.register(Master)
 class MasterAdmin(admin.ModelAdmin):
-    list_display = ('id', 'name', 'specialization', 'services_list')
+    list_display = (
+        'id', 'name', 'specialization', 'services_list',
+        'rating_avg', 'review_count', 'bookings_30d'
+    )
     list_display_links = ('name',)
     search_fields = ('name', 'specialization')
+    readonly_fields = ('rating_avg', 'review_count', 'bookings_30d')
     inlines = [MasterServiceInline, AppointmentInline]
 
+    def get_queryset(self, request):
+        # Услуги всех мастеров страницы подгружаются одним запросом вместе с названиями
+        return super().get_queryset(request).prefetch_related(
+            Prefetch('masterservice_set', queryset=MasterService.objects.select_related('service'))
+        )
+
     @admin.display(description='Услуги мастера')
     def services_list(self, obj):
-        # Получаем все записи MasterService для данного мастера и берём название услуги
-        services_qs = MasterService.objects.filter(master=obj)
-        return ", ".join(ms.service.name for ms in services_qs)
+        return ", ".join(ms.service.name for ms in obj.masterservice_set.all())
+
+    def get_urls(self):
+        return [
+            path(
+                '<path:object_id>/older-appointments/',
+                self.admin_site.admin_view(self.older_appointments),
+                name='website_master_older_appointments',
+            ),
+        ] + super().get_urls()
+
+    def older_appointments(self, request, object_id):
+        """Страница записей мастера раньше окна inline (фрагмент таблицы для подгрузки)."""
+        master = get_object_or_404(Master, pk=object_id)
+        if not self.has_view_or_change_permission(request, master):
+            raise PermissionDenied
+        appointments = Appointment.objects.filter(
+            master=master, appointment_date__lt=appointment_inline_start()
+        ).order_by(*APPOINTMENT_ORDERING)
+        cursor = request.GET.get('before')
+        if cursor:
+            appointments = after_cursor(appointments, cursor)
+            if appointments is None:
+                appointments = Appointment.objects.none()
+        page = list(
+            appointments.select_related('client', 'service', 'status')[:OLDER_APPOINTMENTS_PAGE_SIZE + 1]
+        )
+        next_cursor = None
+        if len(page) > OLDER_APPOINTMENTS_PAGE_SIZE:
+            page = page[:OLDER_APPOINTMENTS_PAGE_SIZE]
+            next_cursor = appointment_cursor(page[-1])
+        response = TemplateResponse(request, 'admin/website/master/older_appointments.html', {
+            'appointments': page,
+        })
+        if next_cursor:
+            response['X-Next-Cursor'] = next_cursor
+        return response
 
 @admin.register(MasterService)
 class MasterServiceAdmin(admin.ModelAdmin):
     list_display = ('master', 'service')
+    list_select_related = ('master', 'service')
     list_filter = ('master', 'service')
     search_fields = ('master__name', 'service__name')
     raw_id_fields = ('master', 'service')
 
 @admin.register(AppointmentStatus)
 class AppointmentStatusAdmin(admin.ModelAdmin):
-    list_display = ('id', 'name')
-    search_fields = ('name',)
+    list_display = ('id', 'name', 'code', 'occupies_slot')
+    list_filter = ('occupies_slot',)
+    search_fields = ('name', 'code')
     list_display_links = ('name',)
 
 @admin.register(Appointment)
@@ -112,6 +255,7 @@ class AppointmentAdmin(admin.ModelAdmin):
         'id', 'client_name', 'master_name',
         'service', 'appointment_date', 'appointment_time', 'status'
     )
+    list_select_related = ('client', 'master', 'service', 'status')
     list_display_links = ('id',)
     list_filter = ('status', 'appointment_date')
     date_hierarchy = 'appointment_date'
@@ -139,6 +283,7 @@ class AppointmentAdmin(admin.ModelAdmin):
 @admin.register(Review)
 class ReviewAdmin(admin.ModelAdmin):
     list_display = ('id', 'client', 'rating', 'created_at')
+    list_select_related = ('client',)
     list_filter = ('rating', 'created_at')
     search_fields = ('client__username', 'text')
     raw_id_fields = ('client', 'appointment')
@@ -165,6 +310,7 @@ class PromotionAdmin(admin.ModelAdmin):
 @admin.register(GalleryImage)
 class GalleryImageAdmin(admin.ModelAdmin):
     list_display = ('id', 'description', 'uploaded_by', 'uploaded_at')
+    list_select_related = ('uploaded_by',)
     list_filter = ('uploaded_at', 'uploaded_by')
     date_hierarchy = 'uploaded_at'
     search_fields = ('description', 'uploaded_by__username')
@@ -175,6 +321,7 @@ class GalleryImageAdmin(admin.ModelAdmin):
 @admin.register(Favorite)
 class FavoriteAdmin(admin.ModelAdmin):
     list_display = ('id', 'client', 'service', 'created_at')
+    list_select_related = ('client', 'service')
     list_display_links = ('client', 'service')
     list_filter = ('created_at',)
     date_hierarchy = 'created_at'
@@ -182,3 +329,23 @@ class FavoriteAdmin(admin.ModelAdmin):
     raw_id_fields = ('client', 'service')
     readonly_fields = ('created_at',)
     fields = ('client', 'service', 'created_at')
+
+@admin.register(Task)
+class TaskAdmin(admin.ModelAdmin):
+    list_display = ('id', 'name', 'status', 'attempts', 'max_attempts', 'run_after', 'updated_at')
+    list_filter = ('status', 'name')
+    search_fields = ('name',)
+    date_hierarchy = 'created_at'
+    readonly_fields = ('attempts', 'locked_at', 'last_error', 'created_at', 'updated_at')
+    fields = (
+        'name', 'payload', 'status', 'attempts', 'max_attempts',
+        'run_after', 'locked_at', 'last_error', 'created_at', 'updated_at'
+    )
+    actions = ['retry_tasks']
+
+    @admin.action(description='Повторить выбранные задачи')
+    def retry_tasks(self, request, queryset):
+        updated = queryset.exclude(status=Task.RUNNING).update(
+            status=Task.PENDING, attempts=0, run_after=timezone.now(), last_error=''
+        )
+        self.message_user(request, f'Задач поставлено в очередь: {updated}')
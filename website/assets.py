@@ -0,0 +1,253 @@
+import base64
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import urllib.request
+from functools import lru_cache
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from . import images
+from .storage import is_blob
+
+try:
+    import brotli
+except ImportError:  # brotli необязателен: без него собираются только .gz
+    brotli = None
+
+# Статика и медиа: сборка (минификация, предсжатие .gz/.br, вендоринг
+# сторонних стилей) и отдача файлов без веб-сервера перед Django —
+# с ETag, Range и вечным кешем для файлов, имя которых меняется вместе
+# с содержимым (хешированная статика, blobs/, производные картинок).
+
+# Сторонние файлы, которые кладутся в static вместо подключения с CDN:
+# имя → (путь в static, адрес, SRI-хеш). Версии закреплены, сами файлы
+# в git не хранятся (.gitignore) — их скачивает manage.py build_assets.
+VENDORED = {
+    'bootstrap': (
+        'website/vendor/bootstrap-5.3.0.min.css',
+        'https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css',
+        'sha384-9ndCyUaIbzAi2FUVXJi0CjmCapSmO7SnpJef0486qhLnuZ2cdeRhO02iuK6FUUVM',
+    ),
+}
+VENDOR_ROOT = Path(__file__).resolve().parent / 'static'
+
+COMPRESSIBLE = ('.css', '.js', '.svg', '.json', '.txt', '.html', '.map')
+# Сжатые копии меньше этого размера не пишем — выигрыш не окупает лишний файл
+COMPRESS_MIN_SIZE = 256
+STREAM_CHUNK_SIZE = 64 * 1024
+YEAR = 365 * 24 * 60 * 60
+
+
+_SOURCE_MAP = re.compile(rb'/\*# sourceMappingURL=[^*]*\*/\s*$')
+
+
+class VendorError(Exception):
+    pass
+
+
+def vendored_path(name):
+    return VENDOR_ROOT / VENDORED[name][0]
+
+
+def vendor(name, force=False):
+    """Скачивает закреплённую версию и проверяет её SRI-хеш. True, если файл обновлён."""
+    path, url, integrity = VENDORED[name]
+    target = VENDOR_ROOT / path
+    if target.exists() and not force:
+        return False
+    try:
+        with urllib.request.urlopen(url, timeout=30) as response:
+            data = response.read()
+    except OSError as exc:
+        raise VendorError(f'{name}: не удалось скачать {url}: {exc}')
+    algorithm, expected = integrity.split('-', 1)
+    actual = base64.b64encode(hashlib.new(algorithm, data).digest()).decode()
+    if actual != expected:
+        raise VendorError(f'{name}: хеш {algorithm}-{actual} не совпадает с закреплённым')
+    # Карту исходников не вендорим, а collectstatic требует файл по ссылке на неё
+    data = _SOURCE_MAP.sub(b'', data)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    target.write_bytes(data)
+    return True
+
+
+_COMMENT_OR_STRING = re.compile(r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\')|/\*(?!!).*?\*/', re.S)
+_SPACES = re.compile(r'\s+')
+_AROUND = re.compile(r'\s*([{};,>])\s*')
+_AFTER_COLON = re.compile(r':\s+')
+
+
+def minify_css(text):
+    """Убирает комментарии (кроме /*! … */) и лишние пробелы; строки не трогает.
+
+    Пробел перед «:» сохраняется: в селекторе «a :hover» он значим.
+    """
+    strings = []
+
+    def stash(match):
+        if match.group(1) is None:
+            return ' '
+        strings.append(match.group(1))
+        return f'\0{len(strings) - 1}\0'
+
+    text = _COMMENT_OR_STRING.sub(stash, text)
+    text = _SPACES.sub(' ', text)
+    text = _AROUND.sub(r'\1', text)
+    text = _AFTER_COLON.sub(':', text).replace(';}', '}').strip()
+    return re.sub(r'\0(\d+)\0', lambda match: strings[int(match.group(1))], text)
+
+
+def compress(path):
+    """Пишет рядом path.gz и path.br (если есть brotli), когда сжатие заметно экономит."""
+    path = Path(path)
+    data = path.read_bytes()
+    written = []
+    if len(data) < COMPRESS_MIN_SIZE:
+        return written
+    variants = [('.gz', lambda: gzip.compress(data, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        variants.append(('.br', lambda: brotli.compress(data, quality=11)))
+    for suffix, encode in variants:
+        packed = encode()
+        if len(packed) < len(data) * 0.95:
+            target = path.with_name(path.name + suffix)
+            target.write_bytes(packed)
+            written.append(target)
+    return written
+
+
+# Отдача файлов
+
+_ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+_RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+@lru_cache(maxsize=None)
+def _hashed_static():
+    # Имена из манифеста collectstatic: содержимое под таким именем не меняется.
+    # Манифест меняется только при выкладке, вместе с перезапуском процессов
+    hashed = getattr(staticfiles_storage, 'hashed_files', None) or {}
+    return frozenset(hashed.values())
+
+
+def serve_static(request, path):
+    """/static/: из STATIC_ROOT после collectstatic, иначе (разработка) — через finders."""
+    root = settings.STATIC_ROOT
+    if root and os.path.isfile(os.path.join(root, 'staticfiles.json')) and not settings.DEBUG:
+        return serve(request, path, root, immutable=path in _hashed_static())
+    found = finders.find(path)
+    if not found:
+        raise Http404(path)
+    return serve(request, os.path.basename(found), os.path.dirname(found))
+
+
+def serve_media(request, path):
+    # Загрузки лежат по хешу содержимого, производные картинок — по хешу оригинала
+    immutable = is_blob(path) or (
+        path.startswith(images.CACHE_DIR + '/') and not path.startswith(images.CACHE_DIR + '/sources/')
+    )
+    return serve(request, path, settings.MEDIA_ROOT, immutable=immutable)
+
+
+def serve(request, path, document_root, immutable=False):
+    """Файл из document_root с ETag/Last-Modified, Range и предсжатыми копиями."""
+    try:
+        fullpath = safe_join(document_root, path)
+    except SuspiciousFileOperation:
+        raise Http404(path)
+    if not os.path.isfile(fullpath):
+        raise Http404(path)
+    content_type, encoding = mimetypes.guess_type(fullpath)
+    content_type = content_type or 'application/octet-stream'
+
+    # Сжатую копию отдаём только целиком: диапазоны считаются по исходному файлу
+    compressible = fullpath.endswith(COMPRESSIBLE)
+    served, content_encoding = fullpath, encoding
+    if compressible and 'HTTP_RANGE' not in request.META:
+        accepted = request.headers.get('Accept-Encoding', '')
+        for name, suffix in _ENCODINGS:
+            if name in accepted and os.path.isfile(fullpath + suffix):
+                served, content_encoding = fullpath + suffix, name
+                break
+
+    stat = os.stat(served)
+    etag = quote_etag(f'{stat.st_mtime_ns:x}-{stat.st_size:x}' + (f'-{content_encoding}' if content_encoding else ''))
+    response = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+    if response is None:
+        response = _file_response(request, served, stat.st_size, etag, content_type)
+    if content_encoding:
+        response.headers['Content-Encoding'] = content_encoding
+    if compressible:
+        response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['ETag'] = etag
+    response.headers['Last-Modified'] = http_date(stat.st_mtime)
+    response.headers['Accept-Ranges'] = 'bytes'
+    if immutable:
+        max_age = getattr(settings, 'STATIC_IMMUTABLE_MAX_AGE', YEAR)
+        response.headers['Cache-Control'] = f'public, max-age={max_age}, immutable'
+    else:
+        # Имя не меняется вместе с содержимым — браузер сверяет файл по ETag
+        response.headers['Cache-Control'] = 'public, no-cache'
+    return response
+
+
+def _file_response(request, path, size, etag, content_type):
+    byte_range = _requested_range(request, size, etag)
+    if byte_range is None:
+        return FileResponse(open(path, 'rb'), content_type=content_type)
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response.headers['Content-Range'] = f'bytes */{size}'
+        return response
+    start, end = byte_range
+    response = StreamingHttpResponse(_read_range(path, start, end), status=206, content_type=content_type)
+    response.headers['Content-Range'] = f'bytes {start}-{end}/{size}'
+    response.headers['Content-Length'] = str(end - start + 1)
+    return response
+
+
+def _requested_range(request, size, etag):
+    """(начало, конец) включительно; None — отдать весь файл; False — диапазон вне файла."""
+    header = request.META.get('HTTP_RANGE', '').strip()
+    if not header or request.method != 'GET':
+        return None
+    # If-Range: диапазон действителен, только если файл не менялся
+    if_range = request.headers.get('If-Range')
+    if if_range and if_range != etag:
+        return None
+    # Несколько диапазонов (multipart/byteranges) не поддерживаем — отдаём файл целиком
+    match = _RANGE.match(header)
+    if not match or not any(match.groups()):
+        return None
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    else:
+        start, end = max(0, size - int(last)), size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def _read_range(path, start, end):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(STREAM_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
@@ -0,0 +1,52 @@
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+from .models import User
+
+# Пользователь запроса без полной строки website_user. AuthenticationMiddleware
+# на каждом запросе вызывает get_user(); здесь он собирает модель только из
+# нужных каждому запросу полей, закешированных на USER_CACHE_TTL. Остальные
+# поля отложены: Django дочитает их из БД при первом обращении.
+KEY_PREFIX = 'session-user:'
+
+# id, username, role — для шаблонов и представлений, флаги — проверкам доступа,
+# которые делают бэкенд и админка на каждом запросе. Порядок — как у полей
+# модели: в нём from_db() раскладывает значения. Пароля здесь нет: проверке
+# сессии (выход на всех устройствах при смене пароля) нужен только хеш сессии,
+# и в общий кеш кладётся он, а не хеш пароля
+FIELDS = tuple(
+    field.attname for field in User._meta.concrete_fields
+    if field.attname in {'id', 'username', 'role', 'is_active', 'is_staff', 'is_superuser'}
+)
+
+
+def _key(user_id):
+    return f'{KEY_PREFIX}{user_id}'
+
+
+def _ttl():
+    return getattr(settings, 'USER_CACHE_TTL', 60)
+
+
+def invalidate(user_id):
+    cache.delete(_key(user_id))
+
+
+class SessionUserBackend(ModelBackend):
+    """ModelBackend, который загружает пользователя сессии из кеша и не целиком."""
+
+    def get_user(self, user_id):
+        cached = cache.get(_key(user_id))
+        if cached is None:
+            row = User._default_manager.filter(pk=user_id).values_list(*FIELDS, 'password').first()
+            if row is None:
+                return None
+            cached = (row[:-1], User(password=row[-1]).get_session_auth_hash())
+            cache.set(_key(user_id), cached, _ttl())
+        values, session_auth_hash = cached
+        user = User.from_db(DEFAULT_DB_ALIAS, FIELDS, values)
+        # Пароль отложен: django.contrib.auth сверяет хеш сессии с посчитанным при загрузке
+        user.get_session_auth_hash = lambda: session_auth_hash
+        return user if self.user_can_authenticate(user) else None
@@ -0,0 +1,271 @@
+import heapq
+import threading
+import time as _time
+from bisect import bisect_left, bisect_right
+from datetime import time, timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import Appointment, MasterService
+from .statuses import status_registry
+
+MINUTES_IN_DAY = 24 * 60
+
+
+def to_minutes(value):
+    return value.hour * 60 + value.minute
+
+
+def from_minutes(minutes):
+    return time(minutes // 60, minutes % 60)
+
+
+def salon_hours():
+    # Рабочее окно салона в минутах от полуночи и шаг сетки записи
+    opening = to_minutes(getattr(settings, 'SALON_OPENING_TIME', time(9, 0)))
+    closing = to_minutes(getattr(settings, 'SALON_CLOSING_TIME', time(21, 0)))
+    step = getattr(settings, 'SALON_SLOT_STEP_MINUTES', 15)
+    return opening, closing, step
+
+
+class DaySchedule:
+    """Занятые интервалы [начало, конец) одного мастера на один день.
+
+    Интервалы записей хранятся по id, а для поиска поддерживаются
+    отсортированные непересекающиеся блоки занятости — проверка
+    слота и поиск свободного окна выполняются бинарным поиском.
+    """
+
+    __slots__ = ('intervals', 'starts', 'ends', 'loaded_at')
+
+    def __init__(self, intervals=None):
+        self.intervals = dict(intervals or {})
+        self.loaded_at = _time.monotonic()
+        self._rebuild()
+
+    def _rebuild(self):
+        starts, ends = [], []
+        for start, end in sorted(self.intervals.values()):
+            if ends and start <= ends[-1]:
+                ends[-1] = max(ends[-1], end)
+            else:
+                starts.append(start)
+                ends.append(end)
+        self.starts, self.ends = starts, ends
+
+    def add(self, appointment_id, start, end):
+        self.intervals[appointment_id] = (start, min(end, MINUTES_IN_DAY))
+        self._rebuild()
+
+    def remove(self, appointment_id):
+        if self.intervals.pop(appointment_id, None) is not None:
+            self._rebuild()
+
+    def is_free(self, start, end, exclude_id=None):
+        idx = bisect_left(self.starts, end) - 1
+        if idx < 0 or self.ends[idx] <= start:
+            return True
+        if exclude_id is None or exclude_id not in self.intervals:
+            return False
+        # Редактирование существующей записи: её собственный интервал не считается
+        return not any(
+            s < end and e > start
+            for appointment_id, (s, e) in self.intervals.items()
+            if appointment_id != exclude_id
+        )
+
+    def free_slots(self, duration, limit, not_before=0):
+        opening, closing, step = salon_hours()
+
+        def align(minutes):
+            if minutes <= opening:
+                return opening
+            return opening + -(-(minutes - opening) // step) * step
+
+        slots = []
+        current = align(not_before)
+        while current + duration <= closing and len(slots) < limit:
+            idx = bisect_right(self.starts, current) - 1
+            if idx >= 0 and self.ends[idx] > current:
+                current = align(self.ends[idx])
+                continue
+            if idx + 1 < len(self.starts) and self.starts[idx + 1] < current + duration:
+                current = align(self.ends[idx + 1])
+                continue
+            slots.append(from_minutes(current))
+            current += step
+        return slots
+
+
+class AvailabilityIndex:
+    """Процессный индекс занятости мастеров по дням.
+
+    Дни подгружаются из БД по требованию (одним запросом на диапазон)
+    и обновляются инкрементально сигналами сохранения/удаления записи.
+    TTL ограничивает расхождение с изменениями из других процессов;
+    смена статусов (status_registry.changed_at) делает загруженные дни устаревшими.
+    """
+
+    def __init__(self):
+        self._days = {}
+        self._keys = {}
+        self._lock = threading.RLock()
+
+    @property
+    def ttl(self):
+        return getattr(settings, 'AVAILABILITY_CACHE_TTL', 300)
+
+    def _is_fresh(self, schedule):
+        # День, загруженный до смены набора занимающих время статусов, перечитывается
+        return (
+            _time.monotonic() - schedule.loaded_at < self.ttl
+            and schedule.loaded_at >= status_registry.changed_at()
+        )
+
+    @staticmethod
+    def busy_queryset(master_ids, date_from, date_to):
+        # Занятые интервалы мастеров за диапазон дат — единственный запрос индекса
+        return (
+            Appointment.objects
+            .filter(status_id__in=status_registry.busy_ids(), master_id__in=master_ids,
+                    appointment_date__range=(date_from, date_to))
+            .order_by()
+            .values_list('id', 'master_id', 'appointment_date', 'appointment_time',
+                         'service__duration_minutes')
+        )
+
+    @staticmethod
+    def _interval(appointment_time, duration):
+        start = to_minutes(appointment_time)
+        return start, start + (duration or Appointment.DEFAULT_DURATION_MINUTES)
+
+    def preload(self, master_ids, date_from, date_to):
+        # Одна выборка на весь диапазон вместо запроса на каждого мастера и день
+        master_ids = list(master_ids)
+        rows = self.busy_queryset(master_ids, date_from, date_to)
+        grouped = {}
+        for appointment_id, master_id, day, start_time, duration in rows:
+            grouped.setdefault((master_id, day), {})[appointment_id] = self._interval(start_time, duration)
+
+        with self._lock:
+            self._evict_stale()
+            for number in range((date_to - date_from).days + 1):
+                day = date_from + timedelta(days=number)
+                for master_id in master_ids:
+                    key = (master_id, day)
+                    self._store(key, DaySchedule(grouped.get(key)))
+
+    def _evict_stale(self):
+        if len(self._days) < getattr(settings, 'AVAILABILITY_MAX_DAYS', 10000):
+            return
+        for key, schedule in list(self._days.items()):
+            if not self._is_fresh(schedule):
+                self._store(key, None)
+
+    def _store(self, key, schedule):
+        old = self._days.get(key)
+        if old is not None:
+            for appointment_id in old.intervals:
+                self._keys.pop(appointment_id, None)
+        if schedule is None:
+            self._days.pop(key, None)
+            return
+        self._days[key] = schedule
+        for appointment_id in schedule.intervals:
+            self._keys[appointment_id] = key
+
+    def day(self, master_id, day):
+        key = (master_id, day)
+        with self._lock:
+            schedule = self._days.get(key)
+            if schedule is not None and self._is_fresh(schedule):
+                return schedule
+        self.preload([master_id], day, day)
+        with self._lock:
+            return self._days[key]
+
+    def is_slot_free(self, master_id, day, start_time, duration, exclude_id=None):
+        start, end = self._interval(start_time, duration)
+        schedule = self.day(master_id, day)
+        with self._lock:
+            return schedule.is_free(start, end, exclude_id=exclude_id)
+
+    def next_free_slots(self, master_id, day, duration, limit=5, not_before=None):
+        schedule = self.day(master_id, day)
+        start = to_minutes(not_before) if not_before else 0
+        with self._lock:
+            return schedule.free_slots(duration or Appointment.DEFAULT_DURATION_MINUTES, limit, start)
+
+    def discard(self, appointment_id):
+        with self._lock:
+            key = self._keys.pop(appointment_id, None)
+            schedule = self._days.get(key)
+            if schedule is not None:
+                schedule.remove(appointment_id)
+
+    def update(self, appointment):
+        with self._lock:
+            self.discard(appointment.pk)
+            if not (appointment.master_id and appointment.appointment_time and appointment.occupies_slot):
+                return
+            key = (appointment.master_id, appointment.appointment_date)
+            schedule = self._days.get(key)
+            if schedule is None:
+                # День ещё не загружен — он подтянет запись из БД при первом обращении
+                return
+            schedule.add(appointment.pk, *self._interval(appointment.appointment_time, appointment.duration_minutes))
+            self._keys[appointment.pk] = key
+
+    def clear(self):
+        with self._lock:
+            self._days.clear()
+            self._keys.clear()
+
+
+availability = AvailabilityIndex()
+
+
+def service_master_ids(service_id):
+    return list(
+        MasterService.objects.filter(service_id=service_id)
+        .order_by('master_id')
+        .values_list('master_id', flat=True)
+    )
+
+
+def find_free_slots(service, date_from, date_to, offset=0, limit=20, master_ids=None):
+    """Ближайшие свободные слоты услуги у всех мастеров, которые её выполняют.
+
+    Возвращает список (дата, время, id мастера) в порядке дата → время → мастер
+    и флаг наличия следующей страницы. Запросов к БД два на весь диапазон:
+    мастера услуги (если master_ids не передан) и занятость всех этих мастеров.
+    """
+    if master_ids is None:
+        master_ids = service_master_ids(service.pk)
+    if not master_ids:
+        return [], False
+    availability.preload(master_ids, date_from, date_to)
+
+    now = timezone.localtime()
+    wanted = offset + limit + 1
+    found = []
+    # По номеру дня, а не day += 1: диапазон может кончаться на date.max
+    for number in range((date_to - date_from).days + 1):
+        day = date_from + timedelta(days=number)
+        if len(found) >= wanted:
+            break
+        if day < now.date():
+            continue
+        not_before = now.time() if day == now.date() else None
+        per_master = [
+            [(slot, master_id) for slot in
+             availability.next_free_slots(master_id, day, service.duration_minutes,
+                                          limit=wanted, not_before=not_before)]
+            for master_id in master_ids
+        ]
+        for slot, master_id in heapq.merge(*per_master):
+            found.append((day, slot, master_id))
+            if len(found) >= wanted:
+                break
+    return found[offset:offset + limit], len(found) > offset + limit
@@ -0,0 +1,349 @@
+import json
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from statistics import mean, median
+
+from django.conf import settings
+from django.db import connection, connections, transaction
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from . import database, widgets
+from .availability import availability
+from .models import Appointment, AppointmentStatus, Master, MasterDayLock, MasterService, Service, User
+from .perf import percentile
+from .statuses import status_registry
+
+# Нагрузочные замеры ключевых страниц (manage.py benchmark). Запросы идут через
+# тестовый клиент Django со всеми middleware; всё, что сценарии пишут в БД,
+# откатывается в конце прогона.
+BENCHMARK_HOST = 'localhost'
+STAFF_USERNAME = 'benchmark_admin'
+CLIENT_USERNAME = 'benchmark_client'
+# На сколько дней вперёд сдвинуты слоты сценария записи, чтобы не пересекаться с данными
+BOOKING_DAYS_AHEAD = 400
+# То же для одновременной нагрузки: её записи сохраняются по-настоящему и удаляются в конце
+CONCURRENT_DAYS_AHEAD = 800
+CONCURRENT_USERNAME = 'benchmark_concurrent'
+CONCURRENT_READ_PAGES = ('appointment_list', 'schedule')
+# Настройки SQLite «как было» для сравнения (--untuned): журнал с откатом,
+# fsync на каждую транзакцию, кеш страниц по умолчанию, чтение через default
+UNTUNED_PRAGMAS = {
+    'journal_mode': 'delete', 'synchronous': 'full', 'cache_size': -2000, 'mmap_size': 0, 'temp_store': 'default',
+}
+# Настроенный прогон — в WAL, даже если развёртывание его не включает
+# (SQLITE_PRAGMAS); исходный режим журнала файла возвращается после замера
+TUNED_PRAGMAS = {'journal_mode': 'wal'}
+
+
+class BenchmarkError(Exception):
+    pass
+
+
+class Context:
+    """Пользователи и объекты, нужные сценариям. Создаются внутри откатываемой транзакции."""
+
+    def __init__(self):
+        staff = User.objects.filter(username=STAFF_USERNAME).first() or User.objects.create_superuser(
+            STAFF_USERNAME, f'{STAFF_USERNAME}@example.com', None, role='admin'
+        )
+        customer = User.objects.filter(username=CLIENT_USERNAME).first() or User.objects.create_user(
+            CLIENT_USERNAME, role='client'
+        )
+        self.anonymous = Client(SERVER_NAME=BENCHMARK_HOST)
+        self.staff = Client(SERVER_NAME=BENCHMARK_HOST)
+        self.staff.force_login(staff)
+        self.customer = Client(SERVER_NAME=BENCHMARK_HOST)
+        self.customer.force_login(customer)
+        self.customer_id = customer.pk
+        link = MasterService.objects.order_by('id').first()
+        if link is None:
+            raise BenchmarkError('Нет мастеров с услугами: сначала manage.py generate_salon_data')
+        self.master_id, self.service_id = link.master_id, link.service_id
+        self.status_id = status_registry.id_for(AppointmentStatus.CONFIRMED)
+        self.bookings = 0
+
+    def next_booking(self):
+        # Каждая итерация — новый свободный слот: по одной записи в день далеко в будущем
+        self.bookings += 1
+        day = timezone.localdate() + timedelta(days=BOOKING_DAYS_AHEAD + self.bookings)
+        return {
+            'client': self.customer_id, 'master': self.master_id, 'service': self.service_id,
+            'appointment_date': day.isoformat(), 'appointment_time': '10:00', 'status': self.status_id,
+        }
+
+
+def _get(client_name, url_name, args=(), query=None):
+    def run(context):
+        return getattr(context, client_name).get(reverse(url_name, args=args), query or {})
+    return run, 200
+
+
+def _book(context):
+    return context.customer.post(
+        reverse('book_appointment', args=[context.master_id]), context.next_booking()
+    )
+
+
+def _admin(model):
+    return _get('staff', f'admin:website_{model}_changelist')
+
+
+SCENARIOS = {
+    'index': _get('anonymous', 'index'),
+    'services_list': _get('anonymous', 'services_list'),
+    'service_search': _get('anonymous', 'service_search', query={'q': 'маникюр'}),
+    'appointment_list': _get('anonymous', 'appointment_list'),
+    'book_appointment': (_book, 302),
+    'admin_users': _admin('user'),
+    'admin_masters': _admin('master'),
+    'admin_services': _admin('service'),
+    'admin_appointments': _admin('appointment'),
+    'admin_reviews': _admin('review'),
+}
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def measure(run, expected_status, context, iterations, warmup):
+    timings, queries = [], []
+    for i in range(warmup + iterations):
+        counter = QueryCounter()
+        start = time.perf_counter()
+        with connection.execute_wrapper(counter):
+            response = run(context)
+        elapsed = (time.perf_counter() - start) * 1000
+        if response.status_code != expected_status:
+            raise BenchmarkError(f'ответ {response.status_code}, ожидался {expected_status}')
+        if i >= warmup:
+            timings.append(elapsed)
+            queries.append(counter.count)
+    timings.sort()
+    return {
+        'p50_ms': round(percentile(timings, 50), 2),
+        'p95_ms': round(percentile(timings, 95), 2),
+        'mean_ms': round(mean(timings), 2),
+        'queries': median(queries),
+        'queries_max': max(queries),
+    }
+
+
+def run(names=None, iterations=30, warmup=3, stdout=None):
+    """Прогоняет сценарии и возвращает {сценарий: показатели}. БД после прогона не меняется."""
+    names = names or list(SCENARIOS)
+    unknown = set(names) - set(SCENARIOS)
+    if unknown:
+        raise BenchmarkError(f'Неизвестные сценарии: {", ".join(sorted(unknown))}')
+    results = {}
+    # Без выборочных замеров middleware: они искажали бы время самих сценариев
+    with override_settings(PERF_SAMPLE_RATE=0, ALLOWED_HOSTS=[BENCHMARK_HOST]):
+        try:
+            with transaction.atomic():
+                context = Context()
+                for name in names:
+                    scenario, expected_status = SCENARIOS[name]
+                    try:
+                        results[name] = measure(scenario, expected_status, context, iterations, warmup)
+                    except BenchmarkError as exc:
+                        raise BenchmarkError(f'{name}: {exc}')
+                    if stdout is not None:
+                        stdout.write(format_row(name, results[name]))
+                transaction.set_rollback(True)
+        finally:
+            # Индексы в памяти могли увидеть откаченные записи
+            availability.clear()
+            widgets.invalidate()
+    return results
+
+
+class _Worker(threading.Thread):
+    """Поток нагрузки: до deadline выполняет request() и копит время ответов."""
+
+    def __init__(self, request, expected_status, deadline, barrier):
+        super().__init__(daemon=True)
+        self.request, self.expected_status = request, expected_status
+        self.deadline, self.barrier = deadline, barrier
+        self.timings, self.errors = [], 0
+
+    def run(self):
+        # Исключение представления (например, «database is locked») — ответ 500, а не конец потока
+        client = Client(SERVER_NAME=BENCHMARK_HOST, raise_request_exception=False)
+        try:
+            self.barrier.wait()
+            i = 0
+            while time.perf_counter() < self.deadline:
+                start = time.perf_counter()
+                response = self.request(client, i)
+                self.timings.append((time.perf_counter() - start) * 1000)
+                if response.status_code != self.expected_status:
+                    self.errors += 1
+                i += 1
+        finally:
+            # Постоянные соединения потока сами не закроются
+            for conn in connections.all():
+                conn.close()
+
+
+def _summary(workers, seconds):
+    timings = sorted(t for worker in workers for t in worker.timings)
+    return {
+        'requests': len(timings),
+        'per_second': round(len(timings) / seconds, 1),
+        'p50_ms': round(percentile(timings, 50), 2) if timings else 0,
+        'p95_ms': round(percentile(timings, 95), 2) if timings else 0,
+        'errors': sum(worker.errors for worker in workers),
+    }
+
+
+def run_concurrent(readers=4, writers=2, seconds=10, untuned=False):
+    """Чтение и запись одновременно, каждый поток со своим соединением.
+
+    Читатели открывают страницы из CONCURRENT_READ_PAGES, писатели создают
+    записи через appointment_add — каждую в свой день далеко в будущем.
+    Записи нельзя откатить одной транзакцией, поэтому они удаляются в конце.
+    Прогон идёт в WAL (TUNED_PRAGMAS), untuned — сравнение с SQLite без WAL и
+    без отдельного соединения для чтения. Режим журнала файла затем возвращается.
+    """
+    link = MasterService.objects.order_by('id').first()
+    if link is None:
+        raise BenchmarkError('Нет мастеров с услугами: сначала manage.py generate_salon_data')
+    customer = User.objects.filter(username=CONCURRENT_USERNAME).first() or User.objects.create_user(
+        CONCURRENT_USERNAME, role='client'
+    )
+    status_id = status_registry.id_for(AppointmentStatus.CONFIRMED)
+    first_day = timezone.localdate() + timedelta(days=CONCURRENT_DAYS_AHEAD)
+    read_urls = [reverse(name) for name in CONCURRENT_READ_PAGES]
+    add_url = reverse('appointment_add')
+
+    def read(client, i):
+        return client.get(read_urls[i % len(read_urls)])
+
+    def writer(number):
+        def write(client, i):
+            day = first_day + timedelta(days=i * writers + number)
+            return client.post(add_url, {
+                'client': customer.pk, 'master': link.master_id, 'service': link.service_id,
+                'appointment_date': day.isoformat(), 'appointment_time': '10:00', 'status': status_id,
+            })
+        return write
+
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA journal_mode')
+        original_journal_mode = cursor.fetchone()[0]
+    overrides = {'PERF_SAMPLE_RATE': 0, 'ALLOWED_HOSTS': [BENCHMARK_HOST]}
+    if untuned:
+        overrides.update(SQLITE_PRAGMAS=UNTUNED_PRAGMAS, READ_DATABASE=None)
+    else:
+        overrides.update(SQLITE_PRAGMAS={**settings.SQLITE_PRAGMAS, **TUNED_PRAGMAS})
+    with override_settings(**overrides):
+        # Новые PRAGMA применяются к новым соединениям; режим журнала меняется,
+        # только когда файл никто больше не держит открытым
+        connections.close_all()
+        try:
+            barrier = threading.Barrier(readers + writers)
+            deadline = time.perf_counter() + seconds
+            read_workers = [_Worker(read, 200, deadline, barrier) for _ in range(readers)]
+            write_workers = [_Worker(writer(n), 302, deadline, barrier) for n in range(writers)]
+            for worker in read_workers + write_workers:
+                worker.start()
+            for worker in read_workers + write_workers:
+                worker.join()
+            with connection.cursor() as cursor:
+                cursor.execute('PRAGMA journal_mode')
+                journal_mode = cursor.fetchone()[0]
+            read_connection = bool(database.read_alias())
+        finally:
+            Appointment.objects.filter(client=customer, appointment_date__gte=first_day).delete()
+            MasterDayLock.objects.filter(day__gte=first_day).delete()
+            customer.delete()
+            connections.close_all()
+            with connection.cursor() as cursor:
+                cursor.execute(f'PRAGMA journal_mode = {original_journal_mode}')
+            connections.close_all()
+            availability.clear()
+            widgets.invalidate()
+    return {
+        'journal_mode': journal_mode,
+        'read_connection': read_connection,
+        'reads': _summary(read_workers, seconds),
+        'writes': _summary(write_workers, seconds),
+    }
+
+
+def format_concurrent(result):
+    lines = [f'журнал {result["journal_mode"]}, отдельное соединение для чтения: '
+             f'{"да" if result["read_connection"] else "нет"}']
+    for kind, title in (('reads', 'чтение'), ('writes', 'запись')):
+        row = result[kind]
+        lines.append(
+            f'{title:<8} {row["per_second"]:>7.1f} в сек.   p50 {row["p50_ms"]:>8.1f} мс   '
+            f'p95 {row["p95_ms"]:>8.1f} мс   ошибок {row["errors"]}'
+        )
+    return '\n'.join(lines)
+
+
+def environment():
+    return {
+        'appointments': Appointment.objects.count(),
+        'masters': Master.objects.count(),
+        'services': Service.objects.count(),
+    }
+
+
+def save_baseline(path, results, iterations):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps({
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'iterations': iterations,
+        'data': environment(),
+        'results': results,
+    }, ensure_ascii=False, indent=2))
+
+
+def load_baseline(path):
+    try:
+        baseline = json.loads(Path(path).read_text())
+    except (OSError, ValueError) as exc:
+        raise BenchmarkError(f'Не удалось прочитать базовую линию {path}: {exc}')
+    if not isinstance(baseline, dict) or not isinstance(baseline.get('results'), dict):
+        raise BenchmarkError(f'{path} — не базовая линия: нет результатов замеров')
+    return baseline
+
+
+def compare(results, baseline, tolerance=0.2):
+    """[(сценарий, показатель, было, стало, регрессия?)] относительно базовой линии.
+
+    Регрессия — рост p95 больше чем на tolerance или любой рост числа запросов.
+    """
+    rows = []
+    for name, current in results.items():
+        before = baseline['results'].get(name)
+        if before is None:
+            continue
+        for metric in ('p50_ms', 'p95_ms', 'queries'):
+            old, new = before[metric], current[metric]
+            if metric == 'queries':
+                regression = new > old
+            else:
+                regression = metric == 'p95_ms' and new > old * (1 + tolerance)
+            rows.append((name, metric, old, new, regression))
+    return rows
+
+
+def format_row(name, result):
+    return (
+        f'{name:<22} p50 {result["p50_ms"]:>8.1f} мс   p95 {result["p95_ms"]:>8.1f} мс   '
+        f'запросов {result["queries"]:>5g} (макс. {result["queries_max"]})'
+    )
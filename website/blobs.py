@@ -0,0 +1,60 @@
+from django.apps import apps
+from django.db import transaction
+from django.db.models import F
+
+from .images import IMAGE_FIELDS
+from .models import MediaBlob
+from .storage import content_addressed_storage, is_blob
+
+# Подсчёт ссылок на файлы хранилища по содержимому. Когда на файл
+# не ссылается ни один объект, он удаляется после коммита транзакции.
+
+
+def image_field_names(instance):
+    return [field_name for label, field_name in IMAGE_FIELDS if instance._meta.label == label]
+
+
+def current_names(instance):
+    return {name: getattr(instance, name).name or '' for name in image_field_names(instance)}
+
+
+def stored_names(instance):
+    fields = image_field_names(instance)
+    if not fields or not instance.pk:
+        return {}
+    return type(instance).objects.filter(pk=instance.pk).values(*fields).first() or {}
+
+
+def incref(name):
+    if not is_blob(name):
+        return
+    blob, created = MediaBlob.objects.get_or_create(name=name)
+    MediaBlob.objects.filter(pk=blob.pk).update(ref_count=F('ref_count') + 1)
+
+
+def decref(name):
+    if not is_blob(name):
+        return
+    MediaBlob.objects.filter(name=name, ref_count__gt=0).update(ref_count=F('ref_count') - 1)
+    deleted, _ = MediaBlob.objects.filter(name=name, ref_count=0).delete()
+    if deleted:
+        transaction.on_commit(lambda: content_addressed_storage().delete(name))
+
+
+def references_changed(old, new):
+    """old/new — {поле: имя файла} до и после сохранения объекта."""
+    with transaction.atomic():
+        for field in set(old) | set(new):
+            before, after = old.get(field, ''), new.get(field, '')
+            if before != after:
+                incref(after)
+                decref(before)
+
+
+def count_references():
+    """{имя файла: число ссылок} по всем полям-картинкам — для пересчёта с нуля."""
+    counts = {}
+    for label, field_name in IMAGE_FIELDS:
+        for name in apps.get_model(label).objects.exclude(**{field_name: ''}).values_list(field_name, flat=True):
+            counts[name] = counts.get(name, 0) + 1
+    return counts
@@ -0,0 +1,77 @@
+import random
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import OperationalError, connection, transaction
+from django.db.models import F
+
+from .availability import availability
+from .models import MasterDayLock
+
+# Атомарное бронирование. Проверка «слот свободен» и вставка записи идут в одной
+# транзакции, которая начинается с UPDATE строки-замка (мастер, день): в SQLite
+# этот UPDATE сразу берёт блокировку на запись (а SELECT … FOR UPDATE там не
+# поддерживается), в PostgreSQL — блокирует саму строку. Второе бронирование на
+# тот же день мастера ждёт первое и видит уже сохранённую запись.
+
+
+# Код ошибки проверки, когда мастер уже занят (Appointment.clean)
+SLOT_TAKEN = 'slot_taken'
+
+
+class BookingBusy(Exception):
+    """Не дождались блокировки — бронирование можно сразу повторить."""
+
+
+def _lock(master_id, day):
+    rows = MasterDayLock.objects.filter(master_id=master_id, day=day)
+    if not rows.update(version=F('version') + 1):
+        # Первое бронирование на этот день: создаём замок (гонку создания решает UNIQUE)
+        MasterDayLock.objects.bulk_create([MasterDayLock(master_id=master_id, day=day)], ignore_conflicts=True)
+        rows.update(version=F('version') + 1)
+
+
+@contextmanager
+def day_lock(master_id, day):
+    """Транзакция, в которой день мастера занят только этим бронированием."""
+    with transaction.atomic():
+        if master_id and day:
+            # UPDATE замка должен быть первым запросом транзакции: тогда SQLite
+            # ждёт чужую блокировку (busy timeout), а не отказывает сразу
+            _lock(master_id, day)
+            # Индекс процесса мог не видеть записей других процессов — перечитываем день
+            availability.preload([master_id], day, day)
+        yield
+
+
+def is_lock_error(exc):
+    return 'locked' in str(exc)
+
+
+def save_with_retry(save):
+    """save() с короткими повторами, если БД занята другим писателем.
+
+    Внутри внешней транзакции повторять нельзя — ошибка уходит наверх.
+    """
+    attempts = getattr(settings, 'BOOKING_LOCK_RETRIES', 3)
+    for attempt in range(attempts):
+        try:
+            return save()
+        except OperationalError as exc:
+            if not is_lock_error(exc) or connection.in_atomic_block:
+                raise
+            if attempt + 1 < attempts:
+                # Разносим повторы во времени, чтобы конкуренты не столкнулись снова
+                time.sleep(random.uniform(0.01, 0.05) * (attempt + 1))
+    raise BookingBusy()
+
+
+def alternatives(appointment, limit=3):
+    """Ближайшее свободное время того же мастера в тот же день — подсказка проигравшему."""
+    if not (appointment.master_id and appointment.appointment_date):
+        return []
+    return availability.next_free_slots(
+        appointment.master_id, appointment.appointment_date, appointment.duration_minutes,
+        limit=limit, not_before=appointment.appointment_time,
+    )
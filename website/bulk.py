@@ -0,0 +1,264 @@
+import csv
+import json
+from datetime import date, time
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime, parse_time
+
+from . import counters, freshness, loyalty, widgets
+from .availability import DaySchedule, availability, to_minutes
+from .models import Appointment, AppointmentStatus, Master, Service, User
+from .statuses import status_registry
+
+# Массовый перенос записей: импорт и выгрузка в CSV и JSON Lines.
+# Импорт идёт пачками: справочники читаются один раз, занятость мастеров —
+# одним запросом на пачку, строки вставляются через bulk_create без
+# full_clean() и сигналов; производные данные пересчитываются в конце.
+FIELDS = ('id', 'date', 'time', 'client', 'master', 'service', 'status', 'price_paid', 'created_at')
+FORMATS = ('csv', 'jsonl')
+DEFAULT_BATCH_SIZE = 2000
+EXPORT_CHUNK_SIZE = 2000
+
+
+def detect_format(path):
+    return 'jsonl' if str(path).endswith(('.jsonl', '.ndjson')) else 'csv'
+
+
+def read_rows(stream, fmt):
+    """(номер строки, словарь полей) из потока — файл целиком в память не читается."""
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for line_no, line in enumerate(stream, start=1):
+        if line.strip():
+            try:
+                yield line_no, json.loads(line)
+            except ValueError as exc:
+                yield line_no, exc
+
+
+class RowError(Exception):
+    pass
+
+
+# Имя, которое носят несколько мастеров или услуг: по нему нельзя понять, о ком строка
+AMBIGUOUS = object()
+
+
+def by_name(pairs):
+    """{имя: значение} из пар; одинаковые имена помечаются AMBIGUOUS, а не затирают друг друга."""
+    mapping = {}
+    for name, value in pairs:
+        mapping[name] = AMBIGUOUS if name in mapping else value
+    return mapping
+
+
+class AppointmentImporter:
+    """Проверяет и вставляет записи пачками. Ошибки копятся построчно в errors."""
+
+    def __init__(self, batch_size=DEFAULT_BATCH_SIZE, dry_run=False):
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        self.errors = []
+        self.imported = 0
+        self.client_ids = set()
+        # Мастера, услуги и статусы — небольшие справочники, читаются один раз
+        self.masters = by_name(Master.objects.values_list('name', 'id'))
+        self.services = by_name(
+            (name, (pk, duration))
+            for name, pk, duration in Service.objects.values_list('name', 'id', 'duration_minutes')
+        )
+        self.statuses = dict(AppointmentStatus.objects.values_list('code', 'id'))
+        self.busy_status_ids = status_registry.busy_ids()
+
+    def run(self, stream, fmt):
+        rows = read_rows(stream, fmt)
+        while True:
+            batch = list(islice(rows, self.batch_size))
+            if not batch:
+                break
+            self.import_batch(batch)
+        if self.imported and not self.dry_run:
+            self.finish()
+        return self.imported
+
+    def import_batch(self, batch):
+        clients = self._clients(batch)
+        parsed = []
+        for line_no, row in batch:
+            try:
+                if isinstance(row, Exception):
+                    raise RowError(f'некорректный JSON: {row}')
+                if not isinstance(row, dict):
+                    raise RowError('строка должна быть JSON-объектом')
+                parsed.append((line_no, self._parse(row, clients)))
+            except RowError as exc:
+                self.errors.append((line_no, str(exc)))
+
+        schedules = self._schedules(parsed)
+        appointments = []
+        for line_no, (appointment, created_at, duration) in parsed:
+            if appointment.master_id is not None and appointment.status_id in self.busy_status_ids:
+                schedule = schedules[(appointment.master_id, appointment.appointment_date)]
+                start = to_minutes(appointment.appointment_time)
+                end = start + (duration or Appointment.DEFAULT_DURATION_MINUTES)
+                if not schedule.is_free(start, end):
+                    self.errors.append((line_no, 'мастер уже занят в это время'))
+                    continue
+                # Строки одной пачки проверяются и друг против друга
+                schedule.add(-line_no, start, end)
+            appointments.append((appointment, created_at))
+
+        if appointments and not self.dry_run:
+            insert_appointments(appointments)
+        self.imported += len(appointments)
+        self.client_ids.update(appointment.client_id for appointment, created_at in appointments)
+
+    def _clients(self, batch):
+        usernames = {str(row.get('client') or '').strip() for line_no, row in batch if isinstance(row, dict)}
+        return dict(
+            User.objects.filter(role='client', username__in=usernames).values_list('username', 'id')
+        )
+
+    def _parse(self, row, clients):
+        def lookup(mapping, field, message, empty=None):
+            # Пустое значение — связь не указана (выгрузка пишет так клиента, мастера,
+            # услугу и статус, которых уже нет)
+            value = str(row.get(field) or '').strip()
+            if not value:
+                return empty
+            if value not in mapping:
+                raise RowError(f'{message}: «{value}»')
+            if mapping[value] is AMBIGUOUS:
+                raise RowError(f'{message}: «{value}» — таких несколько, строка не загружена')
+            return mapping[value]
+
+        try:
+            appointment_date = parse_date(str(row.get('date') or '').strip())
+            appointment_time = parse_time(str(row.get('time') or '').strip())
+        except ValueError:
+            appointment_date = appointment_time = None
+        if appointment_date is None or appointment_time is None:
+            raise RowError(f'некорректная дата или время: {row.get("date")} {row.get("time")}')
+        price_paid = row.get('price_paid')
+        if price_paid in (None, ''):
+            price_paid = None
+        else:
+            try:
+                price_paid = Decimal(str(price_paid))
+            except InvalidOperation:
+                raise RowError(f'некорректная сумма оплаты: {price_paid}')
+        created_at = row.get('created_at') or None
+        if created_at:
+            try:
+                created_at = parse_datetime(str(created_at))
+            except ValueError:
+                created_at = None
+            if created_at is None:
+                raise RowError(f'некорректная дата создания: {row.get("created_at")}')
+            if timezone.is_naive(created_at):
+                created_at = timezone.make_aware(created_at)
+
+        service_id, duration = lookup(self.services, 'service', 'неизвестная услуга', empty=(None, None))
+        appointment = Appointment(
+            client_id=lookup(clients, 'client', 'неизвестный клиент'),
+            master_id=lookup(self.masters, 'master', 'неизвестный мастер'),
+            service_id=service_id,
+            status_id=lookup(self.statuses, 'status', 'неизвестный статус'),
+            appointment_date=appointment_date,
+            appointment_time=appointment_time,
+            price_paid=price_paid,
+        )
+        return appointment, created_at, duration
+
+    def _schedules(self, parsed):
+        # Занятость всех мастеров пачки на её даты — один запрос вместо запроса на строку
+        keys = {
+            (appointment.master_id, appointment.appointment_date)
+            for line_no, (appointment, created_at, duration) in parsed
+            if appointment.master_id is not None
+        }
+        intervals = {key: {} for key in keys}
+        if keys:
+            rows = (
+                Appointment.objects
+                .filter(status_id__in=self.busy_status_ids,
+                        master_id__in={master_id for master_id, day in keys},
+                        appointment_date__in={day for master_id, day in keys})
+                .order_by()
+                .values_list('id', 'master_id', 'appointment_date', 'appointment_time',
+                             'service__duration_minutes')
+            )
+            for appointment_id, master_id, day, start_time, duration in rows:
+                if (master_id, day) in intervals:
+                    start = to_minutes(start_time)
+                    end = start + (duration or Appointment.DEFAULT_DURATION_MINUTES)
+                    intervals[(master_id, day)][appointment_id] = (start, end)
+        return {key: DaySchedule(value) for key, value in intervals.items()}
+
+    def finish(self):
+        after_bulk_load(self.client_ids)
+
+
+def after_bulk_load(client_ids):
+    # bulk_create не вызывает сигналы: пересчитываем то, что они поддерживают
+    counters.rebuild()
+    availability.clear()
+    loyalty.forget(client_ids)
+    widgets.invalidate()
+    freshness.versions.touch(Master, Service)
+
+
+def insert_appointments(appointments):
+    """Вставляет пары (запись, created_at или None) без full_clean() и сигналов."""
+    with transaction.atomic():
+        created = Appointment.objects.bulk_create(
+            [appointment for appointment, created_at in appointments], batch_size=500
+        )
+        # auto_now_add перезаписывает created_at при вставке — исходные даты ставим
+        # одним подготовленным UPDATE (bulk_update строит CASE на каждую строку и в разы медленнее)
+        dated = [
+            (connection.ops.adapt_datetimefield_value(created_at), obj.pk)
+            for obj, (appointment, created_at) in zip(created, appointments)
+            if created_at is not None
+        ]
+        if dated:
+            table = connection.ops.quote_name(Appointment._meta.db_table)
+            with connection.cursor() as cursor:
+                cursor.executemany(f'UPDATE {table} SET created_at = %s WHERE id = %s', dated)
+
+
+def export_rows(queryset):
+    """Строки выгрузки в порядке FIELDS, потоково через iterator()."""
+    return queryset.order_by('appointment_date', 'appointment_time', 'id').values_list(
+        'id', 'appointment_date', 'appointment_time', 'client__username', 'master__name',
+        'service__name', 'status__code', 'price_paid', 'created_at',
+    ).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+
+def write_rows(stream, rows, fmt):
+    count = 0
+    if fmt == 'csv':
+        writer = csv.writer(stream)
+        writer.writerow(FIELDS)
+        for row in rows:
+            writer.writerow(['' if value is None else _plain(value) for value in row])
+            count += 1
+        return count
+    for row in rows:
+        stream.write(json.dumps(dict(zip(FIELDS, map(_plain, row))), ensure_ascii=False) + '\n')
+        count += 1
+    return count
+
+
+def _plain(value):
+    if isinstance(value, (date, time)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
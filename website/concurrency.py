@@ -0,0 +1,44 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, connection
+
+# Синхронный код (ORM, шаблоны) из async-представлений. run() выполняет функцию
+# в общем потоке запроса, как это делает сам Django; gather() раскидывает
+# независимые функции по отдельным потокам, у каждого из которых своё
+# соединение с БД, так что их запросы идут одновременно.
+
+
+async def run(func, *args, **kwargs):
+    return await sync_to_async(func)(*args, **kwargs)
+
+
+def _serial(funcs):
+    # Внутри транзакции (тесты, откатываемый прогон benchmark) другие соединения
+    # не видят её данных — тогда всё выполняется по очереди в потоке запроса
+    if getattr(settings, 'ASYNC_PARALLEL_QUERIES', True) and not connection.in_atomic_block:
+        return None
+    return [func() for func in funcs]
+
+
+def _in_own_thread(func):
+    def call():
+        try:
+            return func()
+        finally:
+            # Соединение рабочего потока закрывается по тем же правилам, что и в конце запроса
+            close_old_connections()
+    return call
+
+
+async def gather(*funcs):
+    """Результаты функций без аргументов в том же порядке; независимые запросы — параллельно."""
+    if len(funcs) < 2:
+        return [await run(func) for func in funcs]
+    results = await run(_serial, funcs)
+    if results is not None:
+        return results
+    return list(await asyncio.gather(*(
+        sync_to_async(_in_own_thread(func), thread_sensitive=False)() for func in funcs
+    )))
@@ -0,0 +1,142 @@
+from datetime import date, timedelta
+
+from django.db import transaction
+from django.db.models import Case, When, F, Value, Count, Sum, FloatField
+from django.db.models.functions import Cast
+
+from . import freshness
+from .models import Master, Service, Appointment, Review
+
+# Денормализованные счётчики мастеров и услуг: отзывы, сумма и среднее оценок,
+# число записей за последние BOOKINGS_WINDOW_DAYS дней. Обновляются из сигналов
+# (website/signals.py), полностью пересчитываются командой rebuild_counters.
+# Выход записи из окна 30 дней сигналом не отмечается: bookings_30d уменьшает
+# только rebuild_counters, поэтому он должен запускаться раз в сутки.
+BOOKINGS_WINDOW_DAYS = 30
+COUNTER_FIELDS = ('review_count', 'rating_sum', 'rating_avg', 'bookings_30d')
+
+
+def window_start():
+    return date.today() - timedelta(days=BOOKINGS_WINDOW_DAYS)
+
+
+def in_window(appointment_date):
+    return appointment_date is not None and appointment_date >= window_start()
+
+
+def _targets(master_id, service_id):
+    return [(model, pk) for model, pk in ((Master, master_id), (Service, service_id)) if pk]
+
+
+def change_rating(master_id, service_id, count, total):
+    # Одно UPDATE на объект: в SQL правая часть видит старые значения полей
+    new_count = F('review_count') + count
+    for model, pk in _targets(master_id, service_id):
+        model.objects.filter(pk=pk).update(
+            review_count=new_count,
+            rating_sum=F('rating_sum') + total,
+            rating_avg=Case(
+                When(review_count=-count, then=Value(None)),
+                default=Cast(F('rating_sum') + total, FloatField()) / new_count,
+                output_field=FloatField(),
+            ),
+        )
+        # Рейтинг виден на главной, а updated_at при этом не меняется
+        freshness.versions.touch(model)
+
+
+def change_bookings(master_id, service_id, delta):
+    for model, pk in _targets(master_id, service_id):
+        model.objects.filter(pk=pk).update(bookings_30d=F('bookings_30d') + delta)
+        freshness.versions.touch(model)
+
+
+def appointment_changed(old, new, appointment_id):
+    """old/new — кортежи (master_id, service_id, appointment_date) или None."""
+    if old == new:
+        return
+    with transaction.atomic():
+        if old and in_window(old[2]):
+            change_bookings(old[0], old[1], -1)
+        if new and in_window(new[2]):
+            change_bookings(new[0], new[1], 1)
+        if old and new and old[:2] != new[:2]:
+            # Отзывы записи переезжают к новому мастеру/услуге вместе с ней
+            totals = Review.objects.filter(appointment_id=appointment_id).aggregate(
+                count=Count('id'), total=Sum('rating')
+            )
+            if totals['count']:
+                change_rating(old[0], old[1], -totals['count'], -totals['total'])
+                change_rating(new[0], new[1], totals['count'], totals['total'])
+
+
+def review_changed(old, new):
+    """old/new — кортежи (master_id, service_id, rating) или None."""
+    if old == new:
+        return
+    with transaction.atomic():
+        if old:
+            change_rating(old[0], old[1], -1, -old[2])
+        if new:
+            change_rating(new[0], new[1], 1, new[2])
+
+
+def collect():
+    """Пересчёт счётчиков с нуля: {(модель, pk): {поле: значение}}."""
+    expected = {}
+    for model in (Master, Service):
+        for pk in model.objects.values_list('pk', flat=True):
+            expected[(model, pk)] = {
+                'review_count': 0, 'rating_sum': 0, 'rating_avg': None, 'bookings_30d': 0,
+            }
+    for model, field in ((Master, 'master_id'), (Service, 'service_id')):
+        reviews = (
+            Review.objects
+            .filter(**{f'appointment__{field}__isnull': False})
+            .values_list(f'appointment__{field}')
+            .annotate(count=Count('id'), total=Sum('rating'))
+        )
+        for pk, count, total in reviews:
+            expected[(model, pk)].update(
+                review_count=count, rating_sum=total, rating_avg=total / count,
+            )
+        bookings = (
+            Appointment.objects
+            .filter(**{f'{field}__isnull': False, 'appointment_date__gte': window_start()})
+            .values_list(field)
+            .annotate(count=Count('id'))
+        )
+        for pk, count in bookings:
+            expected[(model, pk)]['bookings_30d'] = count
+    return expected
+
+
+def rebuild(verify_only=False):
+    """Сверяет и (если не verify_only) исправляет счётчики. Возвращает расхождения."""
+    expected = collect()
+    mismatches = []
+    with transaction.atomic():
+        for model in (Master, Service):
+            changed = []
+            for obj in model.objects.only('pk', *COUNTER_FIELDS):
+                values = expected[(model, obj.pk)]
+                diff = [
+                    (field, getattr(obj, field), value)
+                    for field, value in values.items()
+                    if not _same(getattr(obj, field), value)
+                ]
+                if diff:
+                    mismatches.extend((obj, *item) for item in diff)
+                    for field, value in values.items():
+                        setattr(obj, field, value)
+                    changed.append(obj)
+            if changed and not verify_only:
+                model.objects.bulk_update(changed, COUNTER_FIELDS, batch_size=500)
+                freshness.versions.touch(model)
+    return mismatches
+
+
+def _same(stored, actual):
+    if stored is None or actual is None:
+        return stored is actual
+    return abs(stored - actual) < 1e-9
@@ -0,0 +1,129 @@
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.backends.signals import connection_created
+
+# Настройка SQLite для нагрузки: PRAGMA на каждом новом соединении и
+# отдельное соединение для чтения. Страницы, которые только читают, уходят на
+# алиас READ_DATABASE — тот же файл, открытый вторым соединением с query_only.
+# Запись и всё, что выполняется внутри транзакции, остаются на default.
+#
+# Режим журнала WAL (читатели работают со снимком и не ждут писателя) — свойство
+# файла, а не соединения: он переписывает заголовок базы и создаёт рядом файлы
+# -wal и -shm. Поэтому он не включается по умолчанию, а задаётся в настройках
+# развёртывания: SQLITE_PRAGMAS = {'journal_mode': 'wal'}. От него зависят:
+# - synchronous: 'normal' безопасен только в WAL, с журналом отката — 'full';
+# - соединение для чтения: без WAL читатель всё равно ждёт блокировку писателя,
+#   поэтому READ_DATABASE используется, только когда WAL включён.
+
+# Значения по умолчанию — только настройки соединения, файл базы они не меняют.
+# SQLITE_PRAGMAS в настройках дополняет и переопределяет их; новые PRAGMA идут
+# после значений по умолчанию, так что busy_timeout всегда выполняется первым
+DEFAULT_PRAGMAS = {
+    # Сколько миллисекунд ждать блокировку, прежде чем вернуть «database is locked».
+    # Первым: journal_mode из SQLITE_PRAGMAS тоже бывает нужно дождаться других соединений
+    'busy_timeout': 5000,
+    # Отрицательное значение — размер в КиБ: 64 МиБ страниц на соединение
+    'cache_size': -64 * 1024,
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'memory',
+}
+# На соединении для чтения SQLite сам отвергнет запись, если маршрутизатор ошибётся
+READ_PRAGMAS = {'query_only': 'on'}
+
+_read_only = ContextVar('database_read_only', default=False)
+
+
+def wal_enabled():
+    return str(getattr(settings, 'SQLITE_PRAGMAS', {}).get('journal_mode', '')).lower() == 'wal'
+
+
+def _read_database():
+    alias = getattr(settings, 'READ_DATABASE', None)
+    return alias if alias in settings.DATABASES else None
+
+
+def read_alias():
+    """Алиас, на который уходят чтения @read_only, или None, если WAL не включён."""
+    return _read_database() if wal_enabled() else None
+
+
+def pragmas(alias):
+    values = {**DEFAULT_PRAGMAS, **getattr(settings, 'SQLITE_PRAGMAS', {})}
+    # Меньше fsync на транзакцию: в WAL сбой питания может потерять последние
+    # транзакции, но не испортить базу. С журналом отката так не бывает — там 'full'
+    values.setdefault('synchronous', 'normal' if wal_enabled() else 'full')
+    if alias == _read_database():
+        # Режим журнала — свойство файла, его задаёт соединение для записи
+        values.pop('journal_mode', None)
+        values.update(READ_PRAGMAS)
+    return values
+
+
+def configure(connection):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in pragmas(connection.alias).items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+def _configure(sender, connection, **kwargs):
+    configure(connection)
+
+
+def install():
+    connection_created.connect(_configure, dispatch_uid='website.database')
+    for connection in connections.all():
+        if connection.connection is not None:
+            configure(connection)
+
+
+def read_only(view):
+    """Чтения представления идут на соединение READ_DATABASE. Работает и с async-представлениями."""
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def inner(request, *args, **kwargs):
+            token = _read_only.set(True)
+            try:
+                return await view(request, *args, **kwargs)
+            finally:
+                _read_only.reset(token)
+    else:
+        @wraps(view)
+        def inner(request, *args, **kwargs):
+            token = _read_only.set(True)
+            try:
+                return view(request, *args, **kwargs)
+            finally:
+                _read_only.reset(token)
+    return inner
+
+
+class ReadRouter:
+    """Чтения из представлений read_only — на READ_DATABASE, остальное — на default."""
+
+    def db_for_read(self, model, **hints):
+        alias = read_alias()
+        # Внутри транзакции читаем через неё же: второе соединение не видит её изменений
+        if alias and _read_only.get() and not connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return alias
+        return None
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Оба алиаса — одна и та же база
+        aliases = {DEFAULT_DB_ALIAS, _read_database()}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, **hints):
+        if db == _read_database():
+            return False
+        return None
@@ -1,7 +1,8 @@
 from django import forms
 from django.contrib.auth.forms import UserCreationForm, AuthenticationForm
 from django.utils import timezone
-from .models import User, Appointment
+from .models import User, Appointment, Master
+from .statuses import status_registry
 
 # === 1. Форма для записи на приём (Appointment) ===
 class AppointmentForm(forms.ModelForm):
@@ -30,6 +31,50 @@ class AppointmentForm(forms.ModelForm):
         return cleaned
 
 
+# === 1а. Фильтр списка записей (GET-параметры, все поля необязательны) ===
+class AppointmentFilterForm(forms.Form):
+    master = forms.ModelChoiceField(
+        queryset=Master.objects.all(),
+        required=False,
+        label='Мастер',
+        empty_label='Все мастера',
+        widget=forms.Select(attrs={'class': 'form-select'})
+    )
+    date_from = forms.DateField(
+        required=False,
+        label='С даты',
+        widget=forms.DateInput(attrs={'type': 'date', 'class': 'form-control'})
+    )
+    date_to = forms.DateField(
+        required=False,
+        label='По дату',
+        widget=forms.DateInput(attrs={'type': 'date', 'class': 'form-control'})
+    )
+    status = forms.ChoiceField(
+        required=False,
+        label='Статус',
+        widget=forms.Select(attrs={'class': 'form-select'})
+    )
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Статусы берутся из реестра процесса, без запроса к БД
+        self.fields['status'].choices = [('', 'Все статусы')] + status_registry.choices()
+
+    def filter(self, queryset):
+        # Фильтруем по id, без соединения с таблицами мастеров и статусов
+        data = self.cleaned_data
+        if data.get('master'):
+            queryset = queryset.filter(master_id=data['master'].pk)
+        if data.get('date_from'):
+            queryset = queryset.filter(appointment_date__gte=data['date_from'])
+        if data.get('date_to'):
+            queryset = queryset.filter(appointment_date__lte=data['date_to'])
+        if data.get('status'):
+            queryset = queryset.filter(status_id=status_registry.id_for(data['status']))
+        return queryset
+
+
 # === 2. Форма регистрации нового пользователя ===
 class RegistrationForm(UserCreationForm):
     username = forms.CharField(
@@ -0,0 +1,40 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.db.models import Count, Max
+
+# Кеш отрисованных фрагментов шаблонов ({% cache_fragment %}). Ключ строится из
+# updated_at объекта, поэтому правка одной услуги сбрасывает только её карточку,
+# а старые версии просто вытесняются из кеша по TTL.
+
+
+def fragment_ttl():
+    return getattr(settings, 'FRAGMENT_CACHE_TTL', 24 * 60 * 60)
+
+
+def object_version(obj):
+    """Версия объекта для ключа: модель, pk и updated_at (если есть)."""
+    if not hasattr(obj, '_meta'):
+        return [obj]
+    updated_at = getattr(obj, 'updated_at', None)
+    return [obj._meta.label, obj.pk, updated_at.timestamp() if updated_at else '']
+
+
+def list_version(queryset):
+    # Версия целого списка: меняется при добавлении, удалении и правке любого объекта
+    stats = queryset.order_by().aggregate(count=Count('pk'), updated_at=Max('updated_at'))
+    updated_at = stats['updated_at']
+    return f'{stats["count"]}-{updated_at.timestamp() if updated_at else 0}'
+
+
+def fragment_key(name, obj, vary_on=()):
+    return make_template_fragment_key(name, [*object_version(obj), *vary_on])
+
+
+def get_or_render(name, obj, vary_on, render):
+    key = fragment_key(name, obj, vary_on)
+    content = cache.get(key)
+    if content is None:
+        content = render()
+        cache.set(key, content, fragment_ttl())
+    return content
@@ -0,0 +1,109 @@
+import hashlib
+import threading
+import time as _time
+from calendar import timegm
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control, quote_etag
+from django.utils.http import http_date
+
+# Версии таблиц каталога для условных GET (ETag / Last-Modified).
+# Версия таблицы — момент её последнего изменения: при первом обращении это
+# max(updated_at), дальше её сдвигают сигналы сохранения и удаления (удаление
+# не меняет max(updated_at), поэтому одного агрегата недостаточно). Значение
+# живёт в памяти процесса и в общем кеше, откуда его раз в FRESHNESS_TTL
+# перечитывают другие процессы.
+KEY_PREFIX = 'freshness:'
+
+
+def _label(model):
+    return model if isinstance(model, str) else model._meta.label
+
+
+class TableVersions:
+    def __init__(self):
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    @property
+    def ttl(self):
+        return getattr(settings, 'FRESHNESS_TTL', 30)
+
+    def get(self, model):
+        label = _label(model)
+        entry = self._versions.get(label)
+        if entry is not None and _time.monotonic() - entry[1] < self.ttl:
+            return entry[0]
+        version = cache.get(KEY_PREFIX + label)
+        if version is None:
+            version = apps.get_model(label).objects.aggregate(updated_at=Max('updated_at'))['updated_at']
+            version = version or timezone.now()
+            # add(), а не set(): не затираем сдвиг, сделанный другим процессом за это время
+            cache.add(KEY_PREFIX + label, version, None)
+        with self._lock:
+            self._versions[label] = (version, _time.monotonic())
+        return version
+
+    def touch(self, *models):
+        now = timezone.now()
+        with self._lock:
+            for model in models:
+                label = _label(model)
+                self._versions[label] = (now, _time.monotonic())
+                cache.set(KEY_PREFIX + label, now, None)
+
+    def clear(self):
+        with self._lock:
+            self._versions.clear()
+
+
+versions = TableVersions()
+
+
+def last_modified(*models):
+    return max(versions.get(model) for model in models)
+
+
+def etag(request, *models, extra=()):
+    """ETag страницы из версий таблиц, пользователя (шапка у вошедших своя) и доп. значений."""
+    parts = [versions.get(model).isoformat() for model in models]
+    parts.append(str(request.user.pk or 0) if hasattr(request, 'user') else '0')
+    parts.extend(str(value) for value in extra)
+    return hashlib.md5('|'.join(parts).encode()).hexdigest()
+
+
+def conditional(etag_func, last_modified_func):
+    """condition() и Cache-Control: no-cache для async-представлений.
+
+    condition() из django.views.decorators.http до Django 5.0 корутины не оборачивает,
+    а с 5.0 вызывает etag_func и last_modified_func прямо в event loop, где чтение
+    версий из БД падает с SynchronousOnlyOperation. Здесь они идут через sync_to_async.
+    Браузер хранит страницу, но каждый раз сверяет её по ETag / Last-Modified.
+    """
+    def decorator(view):
+        @wraps(view)
+        async def inner(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return await view(request, *args, **kwargs)
+            # Версии таблиц могут читаться из кеша и БД — в синхронном потоке
+            etag, modified = await sync_to_async(_validators)(request, etag_func, last_modified_func)
+            response = get_conditional_response(request, etag=etag, last_modified=modified)
+            if response is None:
+                response = await view(request, *args, **kwargs)
+            if response.status_code in (200, 304):
+                response.headers.setdefault('ETag', etag)
+                response.headers.setdefault('Last-Modified', http_date(modified))
+            patch_cache_control(response, no_cache=True)
+            return response
+        return inner
+    return decorator
+
+
+def _validators(request, etag_func, last_modified_func):
+    return quote_etag(etag_func(request)), timegm(last_modified_func(request).utctimetuple())
@@ -0,0 +1,142 @@
+import hashlib
+import io
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from PIL import Image, ImageOps, features
+
+from . import freshness
+
+# Производные картинок: уменьшенные копии в современных форматах.
+# Файлы лежат в CACHE_DIR/<хеш>/ по содержимому оригинала (одинаковые загрузки
+# делят одни и те же производные), а манифест по имени оригинала —
+# в CACHE_DIR/sources/, откуда его читает тег {% responsive_image %}.
+CACHE_DIR = 'cache'
+MANIFEST_CACHE_PREFIX = 'image-manifest:'
+
+# Поля с картинками, для которых строятся производные: (модель, поле)
+IMAGE_FIELDS = (
+    ('website.Service', 'image'),
+    ('website.Master', 'photo'),
+    ('website.Promotion', 'image'),
+    ('website.GalleryImage', 'image'),
+)
+
+_PIL_FORMATS = {'avif': 'AVIF', 'webp': 'WEBP', 'jpeg': 'JPEG', 'png': 'PNG'}
+
+
+def variant_widths():
+    return getattr(settings, 'IMAGE_VARIANT_WIDTHS', [80, 160, 320, 640])
+
+
+def variant_formats():
+    # AVIF и WebP — только если Pillow собран с их поддержкой
+    wanted = getattr(settings, 'IMAGE_VARIANT_FORMATS', ['avif', 'webp'])
+    return [fmt for fmt in wanted if features.check(fmt)]
+
+
+def _manifest_path(name):
+    return f'{CACHE_DIR}/sources/{hashlib.sha1(name.encode()).hexdigest()}.json'
+
+
+def _write(path, data):
+    if default_storage.exists(path):
+        default_storage.delete(path)
+    default_storage.save(path, ContentFile(data))
+
+
+def get_manifest(name):
+    """Манифест производных для файла оригинала или None, если их ещё нет."""
+    if not name:
+        return None
+    key = MANIFEST_CACHE_PREFIX + hashlib.sha1(name.encode()).hexdigest()
+    manifest = cache.get(key)
+    if manifest is None:
+        path = _manifest_path(name)
+        manifest = {}
+        if default_storage.exists(path):
+            with default_storage.open(path) as f:
+                manifest = json.load(f)
+        # Отсутствие производных кешируем ненадолго: их может построить другой процесс
+        cache.set(key, manifest, None if manifest else 60)
+    return manifest or None
+
+
+def _encode(image, fmt):
+    buffer = io.BytesIO()
+    options = {'quality': getattr(settings, 'IMAGE_VARIANT_QUALITY', 80)}
+    if fmt == 'png':
+        options = {'optimize': True}
+    image.save(buffer, _PIL_FORMATS[fmt], **options)
+    return buffer.getvalue()
+
+
+def generate_variants(field_file, force=False):
+    """Строит производные для загруженного файла и возвращает манифест."""
+    name = field_file.name
+    manifest = get_manifest(name)
+    if manifest and not force:
+        return manifest
+
+    with field_file.open('rb') as f:
+        original = f.read()
+    digest = hashlib.sha256(original).hexdigest()
+    directory = f'{CACHE_DIR}/{digest[:2]}/{digest}'
+
+    image = ImageOps.exif_transpose(Image.open(io.BytesIO(original)))
+    has_alpha = image.mode in ('RGBA', 'LA') or 'transparency' in image.info
+    fallback = 'png' if has_alpha else 'jpeg'
+    image = image.convert('RGBA' if has_alpha else 'RGB')
+
+    widths = sorted({min(width, image.width) for width in variant_widths()})
+    variants = {}
+    for fmt in variant_formats() + [fallback]:
+        variants[fmt] = []
+        for width in widths:
+            path = f'{directory}/{width}w.{fmt}'
+            if force or not default_storage.exists(path):
+                resized = image.copy()
+                resized.thumbnail((width, width * image.height // image.width or 1))
+                _write(path, _encode(resized, fmt))
+            variants[fmt].append([width, path])
+
+    manifest = {
+        'digest': digest,
+        'width': image.width,
+        'height': image.height,
+        'fallback': fallback,
+        'variants': variants,
+    }
+    _write(_manifest_path(name), json.dumps(manifest).encode())
+    cache.delete(MANIFEST_CACHE_PREFIX + hashlib.sha1(name.encode()).hexdigest())
+    return manifest
+
+
+def pending_fields(instance):
+    # Поля-картинки объекта, для файлов которых ещё нет производных
+    return [
+        field_name for label, field_name in IMAGE_FIELDS
+        if instance._meta.label == label
+        and getattr(instance, field_name)
+        and not get_manifest(getattr(instance, field_name).name)
+    ]
+
+
+def generate_for_instance(instance, force=False):
+    # Все поля-картинки объекта, у которых есть файл
+    generated = False
+    for label, field_name in IMAGE_FIELDS:
+        if instance._meta.label == label:
+            field_file = getattr(instance, field_name)
+            if field_file:
+                generate_variants(field_file, force=force)
+                generated = True
+    if generated and any(field.name == 'updated_at' for field in instance._meta.fields):
+        # Разметка картинки сменилась (появился srcset) — сдвигаем версию объекта,
+        # чтобы закешированные фрагменты с ним перерисовались. update() без сигналов
+        type(instance).objects.filter(pk=instance.pk).update(updated_at=timezone.now())
+        freshness.versions.touch(type(instance))
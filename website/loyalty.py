@@ -0,0 +1,168 @@
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Appointment
+
+# Скользящий счётчик визитов клиента: дневные корзины за WINDOW_DAYS дней.
+# Корзины живут в кеше и правятся сигналами при создании/удалении записи,
+# поэтому при бронировании не нужен COUNT по всей истории клиента.
+# Сигнал правит кеш только того процесса, который сохранил запись, поэтому
+# корзины пересобираются из БД через LOYALTY_CACHE_TTL после загрузки:
+# правки сигналами этот срок не продлевают.
+WINDOW_DAYS = 182
+KEY_PREFIX = 'loyalty:'
+
+# (минимум визитов за окно, скидка в процентах, уровень) — по возрастанию минимума
+DEFAULT_TIERS = [
+    (0, 0, 'Новый клиент'),
+    (11, 10, 'Постоянный клиент'),
+]
+
+
+def _window_start():
+    return timezone.localdate() - timedelta(days=WINDOW_DAYS)
+
+
+def _window_start_at():
+    # Полночь первого дня окна по местному времени: та же граница, что в _visits,
+    # но сравнение с created_at, а не с TruncDate, сохраняет индекс по полю
+    return timezone.make_aware(datetime.combine(_window_start(), datetime.min.time()))
+
+
+def _key(client_id):
+    return f'{KEY_PREFIX}{client_id}'
+
+
+def _ttl():
+    return getattr(settings, 'LOYALTY_CACHE_TTL', 60)
+
+
+def load_buckets(client_ids):
+    """Корзины {client_id: {дата: визитов}} для нескольких клиентов одним запросом."""
+    buckets = {client_id: {} for client_id in client_ids}
+    rows = (
+        Appointment.objects
+        .filter(client_id__in=client_ids, created_at__gte=_window_start_at())
+        .annotate(day=TruncDate('created_at'))
+        .order_by()
+        .values_list('client_id', 'day')
+        .annotate(count=Count('id'))
+    )
+    for client_id, day, count in rows:
+        buckets[client_id][day] = count
+    return buckets
+
+
+def _store(entries):
+    # Запись кеша — (когда пересобрать из БД, корзины): правки сигналами этот срок не сдвигают
+    now = time.time()
+    alive = {client_id: entry for client_id, entry in entries.items() if entry[0] > now}
+    for client_id, entry in alive.items():
+        cache.set(_key(client_id), entry, entry[0] - now)
+    cache.delete_many([_key(client_id) for client_id in entries if client_id not in alive])
+
+
+def _load(client_ids):
+    expires = time.time() + _ttl()
+    loaded = load_buckets(client_ids)
+    _store({client_id: (expires, buckets) for client_id, buckets in loaded.items()})
+    return loaded
+
+
+def _cached(entry):
+    return entry is not None and entry[0] > time.time()
+
+
+def _buckets(client_id):
+    entry = cache.get(_key(client_id))
+    if not _cached(entry):
+        return _load([client_id])[client_id]
+    return entry[1]
+
+
+def _visits(buckets):
+    start = _window_start()
+    return sum(count for day, count in buckets.items() if day >= start)
+
+
+def visit_count(client_id):
+    return _visits(_buckets(client_id))
+
+
+def visit_counts(client_ids):
+    # Для массового предпросмотра: из кеша что есть, остальное — одним запросом
+    cached = cache.get_many([_key(client_id) for client_id in client_ids])
+    result = {}
+    missing = []
+    for client_id in client_ids:
+        entry = cached.get(_key(client_id))
+        if not _cached(entry):
+            missing.append(client_id)
+        else:
+            result[client_id] = _visits(entry[1])
+    if missing:
+        result.update({client_id: _visits(buckets) for client_id, buckets in _load(missing).items()})
+    return result
+
+
+def record_visit(client_id, created_at, delta):
+    # Правим корзину, только если клиент уже в кеше; иначе она соберётся из БД
+    entry = cache.get(_key(client_id))
+    if not _cached(entry):
+        return
+    day = timezone.localdate(created_at)
+    if day < _window_start():
+        return
+    expires, buckets = entry
+    buckets[day] = buckets.get(day, 0) + delta
+    if buckets[day] <= 0:
+        del buckets[day]
+    start = _window_start()
+    _store({client_id: (expires, {d: count for d, count in buckets.items() if d >= start})})
+
+
+def forget(client_ids):
+    # После массового импорта: корзины соберутся из БД при следующем обращении
+    cache.delete_many([_key(client_id) for client_id in client_ids])
+
+
+class LoyaltyPolicy:
+    """Цена услуги с учётом уровня лояльности клиента."""
+
+    def __init__(self, tiers=None):
+        tiers = tiers or getattr(settings, 'LOYALTY_TIERS', DEFAULT_TIERS)
+        self.tiers = sorted(tiers)
+
+    def tier(self, visits):
+        current = self.tiers[0]
+        for tier in self.tiers:
+            if visits >= tier[0]:
+                current = tier
+        return current
+
+    def price(self, base_price, visits):
+        min_visits, discount, level = self.tier(visits)
+        price = base_price * (Decimal(100) - Decimal(discount)) / Decimal(100)
+        return price.quantize(Decimal('0.01'))
+
+    def quote(self, service, client):
+        """(цена, уровень) для записи клиента на услугу."""
+        visits = visit_count(client.pk) if client and client.pk else 0
+        return self.price(service.price, visits), self.tier(visits)
+
+    def preview(self, clients):
+        """[(клиент, визитов, уровень)] для списка клиентов — без запроса на каждого."""
+        counts = visit_counts([client.pk for client in clients])
+        return [(client, counts[client.pk], self.tier(counts[client.pk])) for client in clients]
+
+
+def pricing_policy():
+    return import_string(getattr(settings, 'PRICING_POLICY', 'website.loyalty.LoyaltyPolicy'))()
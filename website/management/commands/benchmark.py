@@ -0,0 +1,69 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from website.benchmark import (
+    SCENARIOS, BenchmarkError, compare, format_concurrent, load_baseline, run, run_concurrent, save_baseline,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет p50/p95 времени ответа и число SQL-запросов ключевых страниц и админки '
+        'и сравнивает с сохранённой базовой линией. Данные для замеров: manage.py generate_salon_data.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('scenarios', nargs='*', metavar='scenario', help=f'Сценарии (по умолчанию все): {", ".join(SCENARIOS)}.')
+        parser.add_argument('--iterations', type=int, default=30, help='Замеров на сценарий.')
+        parser.add_argument('--warmup', type=int, default=3, help='Прогревочных запросов перед замерами.')
+        parser.add_argument('--save-baseline', metavar='PATH', help='Сохранить результаты как базовую линию.')
+        parser.add_argument('--baseline', metavar='PATH', help='Сравнить с базовой линией из файла.')
+        parser.add_argument('--tolerance', type=float, default=0.2, help='Допустимый рост p95 (доля), по умолчанию 0.2.')
+        parser.add_argument('--fail-on-regression', action='store_true', help='Завершиться с ошибкой при регрессии.')
+        parser.add_argument(
+            '--concurrent', action='store_true',
+            help='Вместо сценариев — одновременные чтение и запись из нескольких потоков.',
+        )
+        parser.add_argument('--readers', type=int, default=4, help='Потоков чтения (--concurrent).')
+        parser.add_argument('--writers', type=int, default=2, help='Потоков записи (--concurrent).')
+        parser.add_argument('--seconds', type=float, default=10, help='Длительность нагрузки (--concurrent).')
+        parser.add_argument(
+            '--untuned', action='store_true',
+            help='Для сравнения: SQLite без WAL и без отдельного соединения для чтения (--concurrent).',
+        )
+
+    def handle(self, *args, **options):
+        if options['concurrent']:
+            try:
+                result = run_concurrent(
+                    options['readers'], options['writers'], options['seconds'], untuned=options['untuned']
+                )
+            except BenchmarkError as exc:
+                raise CommandError(exc)
+            self.stdout.write(format_concurrent(result))
+            return
+
+        try:
+            # Базовая линия читается до замеров: ошибка в файле не должна ждать их окончания
+            baseline = load_baseline(options['baseline']) if options['baseline'] else None
+            results = run(options['scenarios'], options['iterations'], options['warmup'], stdout=self.stdout)
+        except BenchmarkError as exc:
+            raise CommandError(exc)
+
+        if options['save_baseline']:
+            save_baseline(options['save_baseline'], results, options['iterations'])
+            self.stdout.write(self.style.SUCCESS(f'Базовая линия сохранена: {options["save_baseline"]}'))
+        if baseline is None:
+            return
+
+        self.stdout.write(f'\nСравнение с базовой линией от {baseline["created_at"]} ({baseline["data"]}):')
+        regressions = 0
+        for name, metric, old, new, regression in compare(results, baseline, options['tolerance']):
+            change = f'{(new - old) / old:+.0%}' if old else '—'
+            line = f'{name:<22} {metric:<8} {old:>9g} → {new:>9g}  {change}'
+            if regression:
+                regressions += 1
+                self.stdout.write(self.style.ERROR(line + '  регрессия'))
+            else:
+                self.stdout.write(line)
+        if regressions and options['fail_on_regression']:
+            raise CommandError(f'Регрессий: {regressions}')
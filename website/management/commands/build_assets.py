@@ -0,0 +1,25 @@
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+
+from website.assets import VENDORED, VendorError, vendor
+
+
+class Command(BaseCommand):
+    help = ('Скачивает закреплённые сторонние стили в static и собирает статику: '
+            'хеши в именах, минификация CSS, копии .gz/.br.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--offline', action='store_true', help='Не скачивать сторонние файлы.')
+        parser.add_argument('--refresh-vendor', action='store_true', help='Скачать сторонние файлы заново.')
+
+    def handle(self, *args, **options):
+        if not options['offline']:
+            for name in VENDORED:
+                try:
+                    if vendor(name, force=options['refresh_vendor']):
+                        self.stdout.write(f'Скачан {name}')
+                except VendorError as exc:
+                    # Без локальной копии страницы подключают файл с CDN
+                    self.stderr.write(str(exc))
+        call_command('collectstatic', interactive=False, verbosity=options['verbosity'])
+        self.stdout.write(self.style.SUCCESS('Статика собрана'))
@@ -0,0 +1,26 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand
+
+from website.images import IMAGE_FIELDS, generate_variants
+
+
+class Command(BaseCommand):
+    help = 'Строит уменьшенные копии и AVIF/WebP-варианты для уже загруженных картинок.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Пересобрать даже существующие варианты.')
+
+    def handle(self, *args, **options):
+        built = failed = 0
+        for label, field_name in IMAGE_FIELDS:
+            model = apps.get_model(label)
+            for obj in model.objects.exclude(**{field_name: ''}).iterator():
+                field_file = getattr(obj, field_name)
+                try:
+                    generate_variants(field_file, force=options['force'])
+                except (OSError, ValueError) as exc:
+                    failed += 1
+                    self.stderr.write(f'{label} #{obj.pk} ({field_file.name}): {exc}')
+                else:
+                    built += 1
+        self.stdout.write(self.style.SUCCESS(f'Готово: {built}, с ошибками: {failed}'))
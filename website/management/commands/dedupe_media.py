@@ -0,0 +1,88 @@
+from django.apps import apps
+from django.core.files import File
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from website.blobs import count_references
+from website.images import IMAGE_FIELDS
+from website.models import MediaBlob
+from website.storage import BLOB_DIR, content_addressed_storage, content_name, is_blob
+
+# Папки upload_to полей-картинок, где лежат файлы до переноса
+UPLOAD_DIRS = ('services', 'masters', 'promotions', 'gallery')
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит загруженные картинки в хранилище по содержимому (одинаковые файлы '
+        'хранятся один раз), пересчитывает ссылки и удаляет файлы, на которые никто не ссылается.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Только показать, что будет сделано.')
+
+    def handle(self, *args, **options):
+        storage = content_addressed_storage()
+        dry_run = options['dry_run']
+        legacy = set()
+
+        # 1. Старые файлы с суффиксами вида «Ксения_w3jqlmJ.webp» → общий файл по хешу
+        for label, field_name in IMAGE_FIELDS:
+            model = apps.get_model(label)
+            for pk, name in model.objects.exclude(**{field_name: ''}).values_list('pk', field_name).iterator():
+                if is_blob(name):
+                    continue
+                if not storage.exists(name):
+                    self.stderr.write(f'{label} #{pk}: файл {name} не найден')
+                    continue
+                legacy.add(name)
+                if dry_run:
+                    continue
+                with storage.open(name) as f:
+                    blob = storage.save(name, File(f, name=name))
+                model.objects.filter(pk=pk).update(**{field_name: blob})
+                self.stdout.write(f'{label} #{pk}: {name} → {blob}')
+
+        if dry_run:
+            self.stdout.write(f'Будет перенесено файлов: {len(legacy)}')
+            return
+
+        # 2. Счётчики ссылок с нуля
+        counts = count_references()
+        with transaction.atomic():
+            MediaBlob.objects.exclude(name__in=[name for name in counts if is_blob(name)]).delete()
+            for name, ref_count in counts.items():
+                if is_blob(name):
+                    MediaBlob.objects.update_or_create(name=name, defaults={'ref_count': ref_count})
+
+        # 3. Старые файлы и файлы хранилища, на которые никто не ссылается.
+        # Непривязанные файлы в папках загрузок удаляются, только если это копия
+        # уже сохранённого по хешу файла; уникальные остаются и попадают в отчёт
+        freed = 0
+        orphans = [name for name in legacy if name not in counts]
+        for directory in UPLOAD_DIRS:
+            if not storage.exists(directory):
+                continue
+            for filename in storage.listdir(directory)[1]:
+                name = f'{directory}/{filename}'
+                if name in counts or name in orphans:
+                    continue
+                with storage.open(name) as f:
+                    duplicate_of = content_name(File(f, name=name), name)
+                if duplicate_of in counts:
+                    orphans.append(name)
+                else:
+                    self.stdout.write(f'Файл {name} ни к чему не привязан, оставлен')
+        directories, files = storage.listdir(BLOB_DIR) if storage.exists(BLOB_DIR) else ([], [])
+        for directory in directories:
+            for name in storage.listdir(f'{BLOB_DIR}/{directory}')[1]:
+                if f'{BLOB_DIR}/{directory}/{name}' not in counts:
+                    orphans.append(f'{BLOB_DIR}/{directory}/{name}')
+        for name in orphans:
+            freed += storage.size(name)
+            storage.delete(name)
+            self.stdout.write(f'Удалён {name}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Перенесено: {len(legacy)}, удалено файлов: {len(orphans)}, освобождено {freed // 1024} КБ. '
+            'Для новых имён файлов постройте варианты: manage.py build_image_variants'
+        ))
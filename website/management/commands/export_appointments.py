@@ -0,0 +1,37 @@
+import sys
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from website.bulk import FORMATS, detect_format, export_rows, write_rows
+from website.models import Appointment
+
+
+class Command(BaseCommand):
+    help = 'Выгружает записи в CSV или JSON Lines потоково, не загружая их все в память.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', '-o', default='-', help='Файл выгрузки или «-» для stdout.')
+        parser.add_argument('--format', choices=FORMATS, help='Формат (по умолчанию — по расширению файла).')
+        parser.add_argument('--date-from', type=date.fromisoformat, help='Записи начиная с даты (ГГГГ-ММ-ДД).')
+        parser.add_argument('--date-to', type=date.fromisoformat, help='Записи по дату включительно.')
+
+    def handle(self, *args, **options):
+        output = options['output']
+        fmt = options['format'] or detect_format(output)
+        appointments = Appointment.objects.all()
+        if options['date_from']:
+            appointments = appointments.filter(appointment_date__gte=options['date_from'])
+        if options['date_to']:
+            appointments = appointments.filter(appointment_date__lte=options['date_to'])
+
+        rows = export_rows(appointments)
+        try:
+            if output == '-':
+                count = write_rows(sys.stdout, rows, fmt)
+            else:
+                with open(output, 'w', encoding='utf-8', newline='') as stream:
+                    count = write_rows(stream, rows, fmt)
+        except OSError as exc:
+            raise CommandError(exc)
+        self.stderr.write(self.style.SUCCESS(f'Выгружено записей: {count}'))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from website.synthetic import DEFAULT_SCALE, generate
+
+
+class Command(BaseCommand):
+    help = (
+        'Наполняет БД синтетическими мастерами, услугами, клиентами, записями, отзывами и акциями '
+        'для нагрузочных замеров (manage.py benchmark). Данные добавляются к существующим.'
+    )
+
+    def add_arguments(self, parser):
+        for name, default in DEFAULT_SCALE.items():
+            parser.add_argument(f'--{name}', type=int, default=default, help=f'Сколько создать (по умолчанию {default}).')
+        parser.add_argument('--seed', type=int, default=0, help='Зерно генератора: одинаковое зерно — одинаковые данные.')
+
+    def handle(self, *args, **options):
+        scale = {name: options[name] for name in DEFAULT_SCALE}
+        created = generate(scale, seed=options['seed'], stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(
+            'Создано: ' + ', '.join(f'{name} — {count}' for name, count in created.items())
+        ))
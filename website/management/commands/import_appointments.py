@@ -0,0 +1,40 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from website.bulk import DEFAULT_BATCH_SIZE, FIELDS, FORMATS, AppointmentImporter, detect_format
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает записи из CSV или JSON Lines пачками через bulk_create. '
+        f'Поля: {", ".join(FIELDS)} (id игнорируется; клиент — логин, мастер и услуга — '
+        'названия, статус — код, пустое значение — не указан). Строки с ошибками и с именами, '
+        'которые носят несколько мастеров или услуг, пропускаются и выводятся с номерами.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл с записями или «-» для чтения из stdin.')
+        parser.add_argument('--format', choices=FORMATS, help='Формат файла (по умолчанию — по расширению).')
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help='Строк в пачке.')
+        parser.add_argument('--dry-run', action='store_true', help='Только проверить, ничего не записывая.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or detect_format(path)
+        importer = AppointmentImporter(batch_size=options['batch_size'], dry_run=options['dry_run'])
+        try:
+            if path == '-':
+                importer.run(sys.stdin, fmt)
+            else:
+                with open(path, encoding='utf-8', newline='') as stream:
+                    importer.run(stream, fmt)
+        except OSError as exc:
+            raise CommandError(exc)
+
+        for line_no, message in importer.errors:
+            self.stderr.write(f'Строка {line_no}: {message}')
+        action = 'Проверено' if options['dry_run'] else 'Загружено'
+        self.stdout.write(self.style.SUCCESS(
+            f'{action} записей: {importer.imported}, с ошибками: {len(importer.errors)}'
+        ))
@@ -0,0 +1,48 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from website.perf import report
+
+SORT_KEYS = {
+    'p95': 'wall_ms_p95',
+    'requests': 'requests',
+    'queries': 'queries_avg',
+    'sql': 'sql_ms_avg',
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Сводка замеров производительности по представлениям за PERF_WINDOW_SECONDS: '
+        'время ответа, SQL и шаблонов, число запросов и повторяющиеся запросы (N+1).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sort', choices=SORT_KEYS, default='p95', help='Поле сортировки (по убыванию).')
+        parser.add_argument('--limit', type=int, default=20, help='Сколько представлений показать.')
+        parser.add_argument('--json', action='store_true', help='Вывести сводку в JSON.')
+
+    def handle(self, *args, **options):
+        rows = sorted(report(), key=lambda row: -row[SORT_KEYS[options['sort']]])[:options['limit']]
+        if options['json']:
+            self.stdout.write(json.dumps(rows, ensure_ascii=False, indent=2))
+            return
+        if not rows:
+            self.stdout.write('Замеров пока нет: проверьте PERF_SAMPLE_RATE и PERF_SNAPSHOT_DIR.')
+            return
+
+        header = f'{"Представление":<40} {"Запр.":>6} {"p50 мс":>8} {"p95 мс":>8} {"SQL мс":>8} {"Шабл. мс":>9} {"SQL шт.":>8}'
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        for row in rows:
+            self.stdout.write(
+                f'{row["view"]:<40} {row["requests"]:>6} {row["wall_ms_p50"]:>8.1f} {row["wall_ms_p95"]:>8.1f} '
+                f'{row["sql_ms_avg"]:>8.1f} {row["template_ms_avg"]:>9.1f} {row["queries_avg"]:>8.1f}'
+            )
+            if row['n_plus_one_requests']:
+                self.stdout.write(self.style.WARNING(
+                    f'  N+1 в {row["n_plus_one_requests"]} из {row["requests"]} ответов:'
+                ))
+                for pattern in row['duplicate_queries']:
+                    self.stdout.write(f'    ×{pattern["max_repeats"]}: {pattern["sql"][:150]}')
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from website import sessions
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет истёкшие сессии из БД короткими пачками, не блокируя запись надолго. '
+        'Запускать по расписанию, например раз в час.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=sessions.PURGE_BATCH_SIZE,
+            help='Сессий в одной транзакции.',
+        )
+
+    def handle(self, *args, **options):
+        deleted = sessions.purge_expired(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Удалено истёкших сессий: {deleted}'))
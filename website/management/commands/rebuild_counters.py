@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from website import counters
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает с нуля счётчики отзывов, рейтинга и записей за 30 дней '
+        'у мастеров и услуг. Запускать раз в сутки: окно 30 дней сдвигается со временем.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify', action='store_true',
+            help='Только сверить счётчики и завершиться с ошибкой при расхождениях.',
+        )
+
+    def handle(self, *args, **options):
+        mismatches = counters.rebuild(verify_only=options['verify'])
+        for obj, field, stored, actual in mismatches:
+            self.stdout.write(f'{obj._meta.verbose_name} #{obj.pk} «{obj}»: {field} = {stored}, ожидалось {actual}')
+        if options['verify'] and mismatches:
+            raise CommandError(f'Найдено расхождений: {len(mismatches)}')
+        action = 'Найдено' if options['verify'] else 'Исправлено'
+        self.stdout.write(self.style.SUCCESS(f'{action} расхождений: {len(mismatches)}'))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from website.tasks import run_worker
+
+
+class Command(BaseCommand):
+    help = 'Запускает воркер фоновых задач (обработка картинок и другие медленные операции).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=2, help='Сколько задач выполнять одновременно.')
+        parser.add_argument(
+            '--processes', action='store_true',
+            help='Пул процессов вместо потоков: CPU-тяжёлые задачи идут на другие ядра.',
+        )
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Пауза опроса очереди, секунды.')
+        parser.add_argument('--once', action='store_true', help='Выполнить готовые задачи и завершиться.')
+
+    def handle(self, *args, **options):
+        pool = 'процессов' if options['processes'] else 'потоков'
+        self.stdout.write(f'Воркер запущен: {options["concurrency"]} {pool}')
+        processed = run_worker(
+            concurrency=options['concurrency'],
+            use_processes=options['processes'],
+            poll_interval=options['poll_interval'],
+            once=options['once'],
+        )
+        self.stdout.write(self.style.SUCCESS(f'Выполнено задач: {processed}'))
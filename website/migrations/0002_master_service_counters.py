@@ -0,0 +1,89 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:41
+
+from datetime import date, timedelta
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def fill_counters(apps, schema_editor):
+    # Пересчёт на исторических моделях, без импорта кода приложения:
+    # его будущие правки не должны менять эту миграцию
+    Appointment = apps.get_model('website', 'Appointment')
+    Review = apps.get_model('website', 'Review')
+    window_start = date.today() - timedelta(days=30)
+    for model, field in ((apps.get_model('website', 'Master'), 'master_id'),
+                         (apps.get_model('website', 'Service'), 'service_id')):
+        reviews = {
+            pk: (count, total)
+            for pk, count, total in Review.objects
+            .filter(**{f'appointment__{field}__isnull': False})
+            .values_list(f'appointment__{field}')
+            .annotate(count=Count('id'), total=Sum('rating'))
+        }
+        bookings = dict(
+            Appointment.objects
+            .filter(**{f'{field}__isnull': False, 'appointment_date__gte': window_start})
+            .values_list(field)
+            .annotate(count=Count('id'))
+        )
+        objs = list(model.objects.all())
+        for obj in objs:
+            count, total = reviews.get(obj.pk, (0, 0))
+            obj.review_count, obj.rating_sum = count, total
+            obj.rating_avg = total / count if count else None
+            obj.bookings_30d = bookings.get(obj.pk, 0)
+        model.objects.bulk_update(
+            objs, ['review_count', 'rating_sum', 'rating_avg', 'bookings_30d'], batch_size=500
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('website', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='master',
+            name='bookings_30d',
+            field=models.PositiveIntegerField(db_index=True, default=0, editable=False, verbose_name='Записей за 30 дней'),
+        ),
+        migrations.AddField(
+            model_name='master',
+            name='rating_avg',
+            field=models.FloatField(db_index=True, editable=False, null=True, verbose_name='Средний рейтинг'),
+        ),
+        migrations.AddField(
+            model_name='master',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Сумма оценок'),
+        ),
+        migrations.AddField(
+            model_name='master',
+            name='review_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Отзывов'),
+        ),
+        migrations.AddField(
+            model_name='service',
+            name='bookings_30d',
+            field=models.PositiveIntegerField(db_index=True, default=0, editable=False, verbose_name='Записей за 30 дней'),
+        ),
+        migrations.AddField(
+            model_name='service',
+            name='rating_avg',
+            field=models.FloatField(db_index=True, editable=False, null=True, verbose_name='Средний рейтинг'),
+        ),
+        migrations.AddField(
+            model_name='service',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Сумма оценок'),
+        ),
+        migrations.AddField(
+            model_name='service',
+            name='review_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Отзывов'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
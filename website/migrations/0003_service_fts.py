@@ -0,0 +1,38 @@
+from django.db import migrations
+
+FTS_TABLE = 'website_service_fts'
+
+
+def create_fts(apps, schema_editor):
+    # Только SQLite со сборкой FTS5; на остальных базах работает поиск без индекса
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA compile_options')
+        if 'ENABLE_FTS5' not in {row[0] for row in cursor.fetchall()}:
+            return
+        cursor.execute(
+            f'CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5('
+            "name, description, tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+        )
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, name, description) '
+            'SELECT id, name, description FROM website_service'
+        )
+
+
+def drop_fts(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('website', '0002_master_service_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts, drop_fts),
+    ]
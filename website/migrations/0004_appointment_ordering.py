@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:43
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('website', '0003_service_fts'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='appointment',
+            options={'ordering': ['-appointment_date', '-appointment_time', '-id'], 'verbose_name': 'Запись', 'verbose_name_plural': 'Записи'},
+        ),
+    ]
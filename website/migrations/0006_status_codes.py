@@ -0,0 +1,55 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Коды и флаг занятости для статусов, созданных до появления этих полей
+KNOWN_STATUSES = {
+    'подтверждена': ('confirmed', True),
+    'подтверждено': ('confirmed', True),
+    'в процессе': ('in_progress', True),
+    'отменена': ('cancelled', False),
+    'отменено': ('cancelled', False),
+}
+
+
+def fill_codes(apps, schema_editor):
+    AppointmentStatus = apps.get_model('website', 'AppointmentStatus')
+    used = set()
+    for status in AppointmentStatus.objects.order_by('id'):
+        code, occupies = KNOWN_STATUSES.get(status.name.strip().lower(), (None, False))
+        if code is None or code in used:
+            code = f'status-{status.pk}'
+        used.add(code)
+        status.code = code
+        status.occupies_slot = occupies
+        status.save(update_fields=['code', 'occupies_slot'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('website', '0005_booking_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='appointmentstatus',
+            name='code',
+            field=models.SlugField(max_length=30, null=True, verbose_name='Код'),
+        ),
+        migrations.AddField(
+            model_name='appointmentstatus',
+            name='occupies_slot',
+            field=models.BooleanField(default=False, help_text='Записи с этим статусом участвуют в проверке двойного бронирования', verbose_name='Занимает время мастера'),
+        ),
+        migrations.RunPython(fill_codes, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='appointmentstatus',
+            name='code',
+            field=models.SlugField(max_length=30, unique=True, verbose_name='Код'),
+        ),
+        migrations.AlterField(
+            model_name='appointment',
+            name='status',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, to='website.appointmentstatus', verbose_name='Статус'),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:52
+
+import website.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('website', '0007_task_queue'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True, verbose_name='Файл')),
+                ('ref_count', models.PositiveIntegerField(default=0, verbose_name='Ссылок')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+            ],
+            options={
+                'verbose_name': 'Медиафайл',
+                'verbose_name_plural': 'Медиафайлы',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.AlterField(
+            model_name='galleryimage',
+            name='image',
+            field=models.ImageField(storage=website.storage.content_addressed_storage, upload_to='gallery/', verbose_name='Изображение'),
+        ),
+        migrations.AlterField(
+            model_name='master',
+            name='photo',
+            field=models.ImageField(blank=True, storage=website.storage.content_addressed_storage, upload_to='masters/', verbose_name='Фото мастера'),
+        ),
+        migrations.AlterField(
+            model_name='promotion',
+            name='image',
+            field=models.ImageField(blank=True, storage=website.storage.content_addressed_storage, upload_to='promotions/', verbose_name='Картинка акции'),
+        ),
+        migrations.AlterField(
+            model_name='service',
+            name='image',
+            field=models.ImageField(blank=True, storage=website.storage.content_addressed_storage, upload_to='services/', verbose_name='Картинка услуги'),
+        ),
+    ]
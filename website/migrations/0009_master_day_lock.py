@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('website', '0008_content_addressed_media'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MasterDayLock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='День')),
+                ('version', models.PositiveIntegerField(default=0, verbose_name='Изменений')),
+                ('master', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='website.master', verbose_name='Мастер')),
+            ],
+            options={
+                'verbose_name': 'Блокировка дня мастера',
+                'verbose_name_plural': 'Блокировки дней мастеров',
+                'constraints': [models.UniqueConstraint(fields=('master', 'day'), name='master_day_lock_unique')],
+            },
+        ),
+    ]
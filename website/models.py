@@ -3,6 +3,8 @@ from django.utils import timezone
 from django.contrib.auth.models import AbstractUser, Group, Permission
 from django.core.exceptions import ValidationError
 
+from .storage import content_addressed_storage
+
 class User(AbstractUser):
     ROLE_CHOICES = [
         ('client', 'Клиент'),
@@ -49,7 +51,12 @@ class Service(models.Model):
     description = models.TextField(blank=True, verbose_name='Описание')
     price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name='Цена')
     duration_minutes = models.PositiveIntegerField(verbose_name='Длительность (мин)')
-    image = models.ImageField(upload_to='services/', blank=True, verbose_name='Картинка услуги')
+    image = models.ImageField(upload_to='services/', blank=True, storage=content_addressed_storage, verbose_name='Картинка услуги')
+    # Денормализованные счётчики, поддерживаются website/counters.py
+    review_count = models.PositiveIntegerField(default=0, editable=False, verbose_name='Отзывов')
+    rating_sum = models.PositiveIntegerField(default=0, editable=False, verbose_name='Сумма оценок')
+    rating_avg = models.FloatField(null=True, editable=False, db_index=True, verbose_name='Средний рейтинг')
+    bookings_30d = models.PositiveIntegerField(default=0, editable=False, db_index=True, verbose_name='Записей за 30 дней')
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
     updated_at = models.DateTimeField(auto_now=True, verbose_name='Дата изменения')
 
@@ -65,7 +72,12 @@ class Service(models.Model):
 class Master(models.Model):
     name = models.CharField(max_length=100, verbose_name='Имя мастера')
     specialization = models.TextField(blank=True, verbose_name='Специализация')
-    photo = models.ImageField(upload_to='masters/', blank=True, verbose_name='Фото мастера')
+    photo = models.ImageField(upload_to='masters/', blank=True, storage=content_addressed_storage, verbose_name='Фото мастера')
+    # Денормализованные счётчики, поддерживаются website/counters.py
+    review_count = models.PositiveIntegerField(default=0, editable=False, verbose_name='Отзывов')
+    rating_sum = models.PositiveIntegerField(default=0, editable=False, verbose_name='Сумма оценок')
+    rating_avg = models.FloatField(null=True, editable=False, db_index=True, verbose_name='Средний рейтинг')
+    bookings_30d = models.PositiveIntegerField(default=0, editable=False, db_index=True, verbose_name='Записей за 30 дней')
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
     updated_at = models.DateTimeField(auto_now=True, verbose_name='Дата изменения')
 
@@ -92,7 +104,18 @@ class MasterService(models.Model):
 
 
 class AppointmentStatus(models.Model):
+    # Стабильные коды статусов, на которые опирается код (название можно менять в админке)
+    CONFIRMED = 'confirmed'
+    IN_PROGRESS = 'in_progress'
+    CANCELLED = 'cancelled'
+
     name = models.CharField(max_length=50, verbose_name='Статус записи')
+    code = models.SlugField(max_length=30, unique=True, verbose_name='Код')
+    occupies_slot = models.BooleanField(
+        default=False,
+        verbose_name='Занимает время мастера',
+        help_text='Записи с этим статусом участвуют в проверке двойного бронирования'
+    )
 
     class Meta:
         verbose_name = 'Статус записи'
@@ -103,6 +126,9 @@ class AppointmentStatus(models.Model):
 
 
 class Appointment(models.Model):
+    # Длительность по умолчанию, если услуга не указана
+    DEFAULT_DURATION_MINUTES = 30
+
     client = models.ForeignKey(
         User,
         on_delete=models.SET_NULL,
@@ -131,6 +157,9 @@ class Appointment(models.Model):
         AppointmentStatus,
         on_delete=models.SET_NULL,
         null=True,
+        # Статусов единицы: отдельный индекс не сужает выборку и только сбивает
+        # планировщик с индекса appointment_master_day_idx
+        db_index=False,
         verbose_name='Статус'
     )
     price_paid = models.DecimalField(
@@ -142,29 +171,78 @@ class Appointment(models.Model):
     class Meta:
         verbose_name = 'Запись'
         verbose_name_plural = 'Записи'
-        ordering = ['-appointment_date', '-appointment_time']
+        # id в конце делает порядок однозначным — на нём держится постраничный вывод по ключу
+        ordering = ['-appointment_date', '-appointment_time', '-id']
+        indexes = [
+            # Занятость мастера по дням; записи без мастера в проверке конфликтов не участвуют
+            models.Index(
+                fields=['master', 'appointment_date', 'appointment_time'],
+                condition=models.Q(master__isnull=False),
+                name='appointment_master_day_idx',
+            ),
+            # Скидка постоянного клиента: записи клиента за последние полгода
+            models.Index(fields=['client', 'created_at'], name='appointment_client_idx'),
+            # Популярность за месяц и порядок списка записей (id входит в индекс как rowid)
+            models.Index(fields=['appointment_date', 'appointment_time'], name='appointment_date_idx'),
+        ]
 
     def __str__(self):
         client = self.client.username if self.client else 'Не указан'
         service = self.service.name if self.service else '—'
         return f'Запись: {client} — {service} ({self.appointment_date} {self.appointment_time})'
 
+    @property
+    def duration_minutes(self):
+        if self.service_id and self.service.duration_minutes:
+            return self.service.duration_minutes
+        return self.DEFAULT_DURATION_MINUTES
+
+    @property
+    def occupies_slot(self):
+        from .statuses import status_registry
+        return self.status_id in status_registry.busy_ids()
+
     def clean(self):
-        # Бизнес-логика: запрет двойного бронирования мастера
-        if self.master and self.appointment_date and self.appointment_time:
-            conflict = Appointment.objects.filter(
-                master=self.master,
-                appointment_date=self.appointment_date,
-                appointment_time=self.appointment_time
-            ).exclude(id=self.id).filter(
-                status__name__in=['Подтверждена', 'В процессе']
-            ).exists()
-            if conflict:
-                raise ValidationError("Мастер уже занят в это время.")
+        # Бизнес-логика: запрет двойного бронирования мастера с учётом длительности услуги.
+        # Занятость берётся из индекса в памяти (website/availability.py), а не запросом на каждое сохранение
+        if self.master_id and self.appointment_date and self.appointment_time:
+            from .availability import availability
+            free = availability.is_slot_free(
+                self.master_id,
+                self.appointment_date,
+                self.appointment_time,
+                self.duration_minutes,
+                exclude_id=self.pk,
+            )
+            if not free:
+                raise ValidationError("Мастер уже занят в это время.", code='slot_taken')
 
     def save(self, *args, **kwargs):
+        # Быстрая проверка по индексу в памяти, заодно приводит поля к типам Python
         self.full_clean()
-        super().save(*args, **kwargs)
+        from .booking import day_lock
+        with day_lock(self.master_id, self.appointment_date):
+            # Под блокировкой дня занятость перечитана из БД: параллельная запись
+            # к тому же мастеру на то же время сюда уже не пройдёт
+            self.clean()
+            super().save(*args, **kwargs)
+
+
+class MasterDayLock(models.Model):
+    # Строка-замок на день мастера: бронирования в этот день проходят через неё по одному
+    master = models.ForeignKey(Master, on_delete=models.CASCADE, verbose_name='Мастер')
+    day = models.DateField(verbose_name='День')
+    version = models.PositiveIntegerField(default=0, verbose_name='Изменений')
+
+    class Meta:
+        verbose_name = 'Блокировка дня мастера'
+        verbose_name_plural = 'Блокировки дней мастеров'
+        constraints = [
+            models.UniqueConstraint(fields=['master', 'day'], name='master_day_lock_unique'),
+        ]
+
+    def __str__(self):
+        return f'{self.master_id} — {self.day}'
 
 
 class Review(models.Model):
@@ -201,7 +279,7 @@ class Review(models.Model):
 class Promotion(models.Model):
     title = models.CharField(max_length=100, verbose_name='Заголовок акции')
     description = models.TextField(blank=True, verbose_name='Описание акции')
-    image = models.ImageField(upload_to='promotions/', blank=True, verbose_name='Картинка акции')
+    image = models.ImageField(upload_to='promotions/', blank=True, storage=content_addressed_storage, verbose_name='Картинка акции')
     start_date = models.DateField(verbose_name='Дата начала')
     end_date = models.DateField(verbose_name='Дата окончания')
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
@@ -211,6 +289,10 @@ class Promotion(models.Model):
         verbose_name = 'Акция'
         verbose_name_plural = 'Акции'
         ordering = ['-start_date']
+        indexes = [
+            # Ближайшие акции: end_date >= сегодня
+            models.Index(fields=['end_date', 'start_date'], name='promotion_end_date_idx'),
+        ]
 
     def __str__(self):
         return self.title
@@ -224,7 +306,7 @@ class Promotion(models.Model):
 
 
 class GalleryImage(models.Model):
-    image = models.ImageField(upload_to='gallery/', verbose_name='Изображение')
+    image = models.ImageField(upload_to='gallery/', storage=content_addressed_storage, verbose_name='Изображение')
     description = models.CharField(max_length=255, blank=True, verbose_name='Описание')
     uploaded_by = models.ForeignKey(
         User,
@@ -269,3 +351,55 @@ class Favorite(models.Model):
         return f'{self.client.username} → {self.service.name}'
 
 
+
+
+class Task(models.Model):
+    # Фоновая задача: хранится в БД, выполняется командой manage.py worker
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Выполнена'),
+        (FAILED, 'Ошибка'),
+    ]
+
+    name = models.CharField(max_length=100, verbose_name='Задача')
+    payload = models.JSONField(default=dict, blank=True, verbose_name='Параметры')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING, verbose_name='Статус')
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name='Попыток')
+    max_attempts = models.PositiveSmallIntegerField(default=5, verbose_name='Максимум попыток')
+    run_after = models.DateTimeField(default=timezone.now, verbose_name='Не раньше')
+    locked_at = models.DateTimeField(null=True, blank=True, verbose_name='Взята в работу')
+    last_error = models.TextField(blank=True, verbose_name='Последняя ошибка')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Дата изменения')
+
+    class Meta:
+        verbose_name = 'Фоновая задача'
+        verbose_name_plural = 'Фоновые задачи'
+        ordering = ['-created_at']
+        indexes = [
+            # Выборка очереди воркером: ожидающие задачи, у которых подошло время
+            models.Index(fields=['status', 'run_after'], name='task_queue_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.name} #{self.pk} ({self.get_status_display()})'
+
+
+class MediaBlob(models.Model):
+    # Файл в хранилище по содержимому и число объектов, которые на него ссылаются
+    name = models.CharField(max_length=255, unique=True, verbose_name='Файл')
+    ref_count = models.PositiveIntegerField(default=0, verbose_name='Ссылок')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
+
+    class Meta:
+        verbose_name = 'Медиафайл'
+        verbose_name_plural = 'Медиафайлы'
+        ordering = ['name']
+
+    def __str__(self):
+        return f'{self.name} ({self.ref_count})'
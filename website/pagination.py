@@ -0,0 +1,26 @@
+from datetime import date, time
+
+from django.db.models import Q
+
+# Постраничный вывод записей по ключу (keyset): вместо OFFSET следующая
+# страница начинается «после» последней показанной строки. Курсор — её
+# дата, время и id; порядок совпадает с Appointment.Meta.ordering.
+APPOINTMENT_ORDERING = ('-appointment_date', '-appointment_time', '-id')
+
+
+def appointment_cursor(appointment):
+    return f'{appointment.appointment_date.isoformat()}_{appointment.appointment_time.isoformat()}_{appointment.pk}'
+
+
+def after_cursor(appointments, cursor):
+    """Строки после курсора в порядке (-дата, -время, -id); None, если курсор испорчен."""
+    try:
+        day, at, pk = cursor.split('_')
+        day, at, pk = date.fromisoformat(day), time.fromisoformat(at), int(pk)
+    except ValueError:
+        return None
+    return appointments.filter(
+        Q(appointment_date__lt=day)
+        | Q(appointment_date=day, appointment_time__lt=at)
+        | Q(appointment_date=day, appointment_time=at, id__lt=pk)
+    )
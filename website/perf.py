@@ -0,0 +1,296 @@
+import json
+import os
+import random
+import threading
+import time
+from collections import defaultdict, deque
+from contextvars import ContextVar
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.template.backends.django import Template as DjangoTemplate
+
+# Замеры производительности по представлениям: число и время SQL-запросов,
+# время отрисовки шаблонов и полное время ответа. Замеряется доля запросов
+# PERF_SAMPLE_RATE (по умолчанию 0 — замеры выключены и отрисовка шаблонов не
+# подменяется); выборки копятся в памяти процесса и раз в PERF_FLUSH_SECONDS
+# сбрасываются в PERF_SNAPSHOT_DIR, если она задана, — отчёт собирается по всем процессам.
+# Замер текущего ответа лежит в ContextVar, поэтому запросы и шаблоны из потоков
+# sync_to_async (async-представления, website/concurrency.py) тоже в него попадают.
+_recorder = ContextVar('perf_recorder', default=None)
+
+
+def sample_rate():
+    return getattr(settings, 'PERF_SAMPLE_RATE', 0.0)
+
+
+def window_seconds():
+    return getattr(settings, 'PERF_WINDOW_SECONDS', 3600)
+
+
+def duplicate_threshold():
+    # Столько одинаковых запросов за один ответ считаем признаком N+1
+    return getattr(settings, 'PERF_DUPLICATE_THRESHOLD', 3)
+
+
+class Recorder:
+    """Замеры одного ответа. Подключается к соединениям через execute_wrapper."""
+
+    __slots__ = ('queries', 'sql_time', 'template_time', 'statements', 'depth', '_lock')
+
+    def __init__(self):
+        self.queries = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.statements = defaultdict(int)
+        self.depth = 0
+        # Запросы одного ответа могут идти из нескольких потоков одновременно
+        self._lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.sql_time += elapsed
+                self.queries += 1
+                # Параметры уже вынесены в params, так что одинаковый текст — один и тот же запрос
+                self.statements[sql] += 1
+
+    def duplicates(self):
+        threshold = duplicate_threshold()
+        return {sql: count for sql, count in self.statements.items() if count >= threshold}
+
+
+_original_render = DjangoTemplate.render
+
+
+def _timed_render(self, context=None, request=None):
+    recorder = _recorder.get()
+    if recorder is None:
+        return _original_render(self, context, request)
+    # Вложенные render_to_string уже входят во время внешнего шаблона
+    recorder.depth += 1
+    start = time.perf_counter()
+    try:
+        return _original_render(self, context, request)
+    finally:
+        recorder.depth -= 1
+        if not recorder.depth:
+            recorder.template_time += time.perf_counter() - start
+
+
+def _record(execute, sql, params, many, context):
+    recorder = _recorder.get()
+    if recorder is None:
+        return execute(sql, params, many, context)
+    return recorder(execute, sql, params, many, context)
+
+
+def _attach(connection, **kwargs):
+    # Обёртка постоянная: вне замера она стоит один ContextVar.get() на запрос
+    if _record not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record)
+
+
+def install():
+    DjangoTemplate.render = _timed_render
+    connection_created.connect(_attach, dispatch_uid='website.perf')
+    for connection in connections.all():
+        _attach(connection)
+
+
+class PerfStore:
+    """Скользящее окно выборок по имени URL: не больше PERF_MAX_SAMPLES на представление."""
+
+    # Столько повторяющихся запросов помним на представление
+    MAX_PATTERNS = 20
+
+    def __init__(self):
+        self._samples = {}
+        self._patterns = defaultdict(dict)
+        self._lock = threading.Lock()
+        self._flushed_at = time.monotonic()
+
+    def add(self, view, wall, recorder):
+        sample = [
+            round(time.time(), 3), round(wall * 1000, 2), round(recorder.sql_time * 1000, 2),
+            round(recorder.template_time * 1000, 2), recorder.queries,
+        ]
+        duplicates = recorder.duplicates()
+        sample.append(max(duplicates.values(), default=0))
+        with self._lock:
+            samples = self._samples.get(view)
+            if samples is None:
+                samples = self._samples[view] = deque(maxlen=getattr(settings, 'PERF_MAX_SAMPLES', 1000))
+            samples.append(sample)
+            patterns = self._patterns[view]
+            for sql, count in duplicates.items():
+                requests, repeats = patterns.get(sql, (0, 0))
+                patterns[sql] = (requests + 1, max(repeats, count))
+            if len(patterns) > self.MAX_PATTERNS * 2:
+                top = sorted(patterns.items(), key=lambda item: -item[1][0])[:self.MAX_PATTERNS]
+                self._patterns[view] = dict(top)
+        self._maybe_flush()
+
+    def snapshot(self):
+        since = time.time() - window_seconds()
+        with self._lock:
+            return {
+                view: {
+                    'samples': [sample for sample in samples if sample[0] >= since],
+                    'patterns': {sql: list(value) for sql, value in self._patterns[view].items()},
+                }
+                for view, samples in self._samples.items()
+            }
+
+    def clear(self):
+        with self._lock:
+            self._samples.clear()
+            self._patterns.clear()
+
+    def _maybe_flush(self):
+        directory = getattr(settings, 'PERF_SNAPSHOT_DIR', None)
+        if not directory or time.monotonic() - self._flushed_at < getattr(settings, 'PERF_FLUSH_SECONDS', 30):
+            return
+        self._flushed_at = time.monotonic()
+        self.flush(directory)
+
+    def flush(self, directory):
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f'perf-{os.getpid()}.json'
+        tmp = path.with_suffix('.tmp')
+        tmp.write_text(json.dumps(self.snapshot()))
+        os.replace(tmp, path)
+
+
+store = PerfStore()
+
+
+def collect():
+    """Выборки всех процессов: свежие снимки из PERF_SNAPSHOT_DIR и живые данные текущего."""
+    merged = defaultdict(lambda: {'samples': [], 'patterns': {}})
+    sources = []
+    directory = getattr(settings, 'PERF_SNAPSHOT_DIR', None)
+    own = f'perf-{os.getpid()}.json'
+    if directory and Path(directory).is_dir():
+        since = time.time() - window_seconds()
+        for path in Path(directory).glob('perf-*.json'):
+            if path.name == own or path.stat().st_mtime < since:
+                continue
+            try:
+                sources.append(json.loads(path.read_text()))
+            except (OSError, ValueError):
+                continue
+    sources.append(store.snapshot())
+    for source in sources:
+        for view, data in source.items():
+            merged[view]['samples'].extend(data['samples'])
+            patterns = merged[view]['patterns']
+            for sql, (requests, repeats) in data['patterns'].items():
+                old_requests, old_repeats = patterns.get(sql, (0, 0))
+                patterns[sql] = (old_requests + requests, max(old_repeats, repeats))
+    return merged
+
+
+def percentile(values, percent):
+    # Ближайший ранг по отсортированному списку
+    if not values:
+        return None
+    return values[min(len(values) - 1, max(0, round(percent / 100 * len(values) + 0.5) - 1))]
+
+
+def report(data=None):
+    """Сводка по представлениям, самые медленные (по p95) первыми."""
+    rows = []
+    for view, data in (collect() if data is None else data).items():
+        samples = data['samples']
+        if not samples:
+            continue
+        count = len(samples)
+        walls = sorted(sample[1] for sample in samples)
+        queries = [sample[4] for sample in samples]
+        patterns = sorted(data['patterns'].items(), key=lambda item: -item[1][0])[:3]
+        rows.append({
+            'view': view,
+            'requests': count,
+            'wall_ms_p50': percentile(walls, 50),
+            'wall_ms_p95': percentile(walls, 95),
+            'wall_ms_max': walls[-1],
+            'sql_ms_avg': round(sum(sample[2] for sample in samples) / count, 2),
+            'template_ms_avg': round(sum(sample[3] for sample in samples) / count, 2),
+            'queries_avg': round(sum(queries) / count, 1),
+            'queries_max': max(queries),
+            'n_plus_one_requests': sum(1 for sample in samples if sample[5]),
+            'duplicate_queries': [
+                {'sql': sql, 'requests': requests, 'max_repeats': repeats}
+                for sql, (requests, repeats) in patterns
+            ],
+        })
+    rows.sort(key=lambda row: -row['wall_ms_p95'])
+    return rows
+
+
+class PerfMiddleware:
+    """Замеряет долю PERF_SAMPLE_RATE запросов; на остальные тратится один random()."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        # Замеры выключены — Django исключит middleware из цепочки, Template.render не трогаем
+        if not sample_rate():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+        install()
+
+    @staticmethod
+    def _sampled():
+        rate = sample_rate()
+        return bool(rate) and random.random() < rate
+
+    @staticmethod
+    def _store(request, wall, recorder):
+        match = getattr(request, 'resolver_match', None)
+        if match is not None and match.url_name:
+            store.add(match.view_name, wall, recorder)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not self._sampled():
+            return self.get_response(request)
+
+        recorder = Recorder()
+        token = _recorder.set(recorder)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _recorder.reset(token)
+        self._store(request, time.perf_counter() - start, recorder)
+        return response
+
+    async def __acall__(self, request):
+        if not self._sampled():
+            return await self.get_response(request)
+
+        recorder = Recorder()
+        token = _recorder.set(recorder)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _recorder.reset(token)
+        self._store(request, time.perf_counter() - start, recorder)
+        return response
@@ -0,0 +1,98 @@
+from datetime import date, timedelta
+
+from django.urls import reverse
+
+from .availability import salon_hours, to_minutes
+from .models import Appointment, Master
+from .statuses import status_registry
+
+# Сетка расписания салона: строки — мастера, столбцы — дни, в ячейке — записи
+# на шкале рабочего дня. Все записи диапазона читаются одним запросом и
+# раскладываются по ячейкам в Python, так что число запросов не зависит ни
+# от числа мастеров, ни от числа дней.
+
+# Вид сетки → число дней
+VIEWS = {'day': 1, 'week': 7}
+
+
+def _hhmm(minutes):
+    return f'{minutes // 60:02d}:{minutes % 60:02d}'
+
+
+class Block:
+    """Запись на шкале дня: offset и width — доли рабочего окна салона в процентах.
+
+    Подписи собираются здесь, а не фильтрами в шаблоне: на неделю у салона
+    тысячи записей, и каждый фильтр в цикле заметен во времени отрисовки.
+    """
+
+    __slots__ = ('appointment_id', 'offset', 'width', 'busy', 'url', 'label', 'title')
+
+    def __init__(self, appointment_id, start, end, opening, closing, busy, url, service, client, status_name):
+        span = closing - opening
+        left = min(max(start, opening), closing)
+        right = min(max(end, opening), closing)
+        self.appointment_id = appointment_id
+        self.offset = round((left - opening) * 100 / span, 2)
+        self.width = round((right - left) * 100 / span, 2)
+        self.busy = busy
+        self.url = url
+        service = service or 'Без услуги'
+        self.label = f'{_hhmm(start)} {service}'
+        self.title = f'{_hhmm(start)}–{_hhmm(end)} · {service} · {client or "—"} · {status_name}'
+
+
+def clamp(day):
+    """Дата, от которой сетка и ссылки «назад»/«вперёд» не выходят за date.min/date.max."""
+    margin = timedelta(days=max(VIEWS.values()))
+    return min(max(day, date.min + margin), date.max - margin)
+
+
+def date_range(date_from, days):
+    return [date_from + timedelta(days=i) for i in range(days)]
+
+
+def appointments_between(date_from, date_to):
+    # Единственный запрос записей: клиент и услуга — через JOIN, статус — из реестра.
+    # Кортежи, а не модели: на неделю это тысячи строк, и сборка объектов дороже самого запроса
+    return (
+        Appointment.objects
+        .filter(appointment_date__range=(date_from, date_to), master__isnull=False)
+        .order_by('master_id', 'appointment_date', 'appointment_time', 'id')
+        .values_list('id', 'master_id', 'appointment_date', 'appointment_time', 'status_id',
+                     'client__username', 'service__name', 'service__duration_minutes')
+    )
+
+
+def build(date_from, days=1):
+    """(дни, [(мастер, [записи дня для каждого дня])]) — мастера по имени."""
+    days = date_range(date_from, days)
+    opening, closing, step = salon_hours()
+    busy_ids = status_registry.busy_ids()
+    # Один reverse на всю сетку: адреса записей отличаются только id
+    detail_url = reverse('appointment_detail', args=[0]).replace('/0/', '/{}/')
+
+    cells = {}
+    rows = appointments_between(days[0], days[-1])
+    for appointment_id, master_id, day, start_time, status_id, client, service, duration in rows:
+        start = to_minutes(start_time)
+        cells.setdefault((master_id, day), []).append(Block(
+            appointment_id, start, start + (duration or Appointment.DEFAULT_DURATION_MINUTES), opening, closing,
+            status_id in busy_ids, detail_url.format(appointment_id),
+            service, client, status_registry.name_for(status_id),
+        ))
+
+    return days, [
+        (master, [cells.get((master.pk, day), []) for day in days])
+        for master in Master.objects.order_by('name', 'id').only('id', 'name', 'specialization')
+    ]
+
+
+def hour_marks():
+    """Часы шкалы: (подпись, смещение в процентах)."""
+    opening, closing, step = salon_hours()
+    first = -(-opening // 60) * 60
+    return [
+        (f'{minutes // 60:02d}:00', round((minutes - opening) * 100 / (closing - opening), 2))
+        for minutes in range(first, closing, 60)
+    ]
@@ -0,0 +1,155 @@
+import re
+from functools import reduce
+from operator import and_
+
+from django.db import connection, connections, router
+from django.db.models import Q
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import Service
+
+# Полнотекстовый поиск услуг. На SQLite с FTS5 используется виртуальная таблица
+# FTS_TABLE (создаётся миграцией 0003, синхронизируется сигналами), иначе —
+# поиск по подстрокам с ранжированием и подсветкой в Python.
+FTS_TABLE = 'website_service_fts'
+NAME_WEIGHT = 10.0
+DESCRIPTION_WEIGHT = 1.0
+SNIPPET_WORDS = 12
+
+# Маркеры подсветки: в тексте их не бывает, после экранирования меняются на <mark>
+_OPEN, _CLOSE = '\x02', '\x03'
+
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+# Окончания русских словоформ, от длинных к коротким: «маникюра», «маникюрный» → «маникюр»
+_ENDINGS = sorted((
+    'ами', 'ями', 'ого', 'его', 'ому', 'ему', 'ыми', 'ими', 'ой', 'ей', 'ий', 'ый', 'ая', 'яя',
+    'ое', 'ее', 'ые', 'ие', 'ую', 'юю', 'ов', 'ев', 'ам', 'ям', 'ах', 'ях', 'ом', 'ем', 'ия',
+    'ью', 'ь', 'а', 'я', 'о', 'е', 'ы', 'и', 'у', 'ю', 'й',
+), key=len, reverse=True)
+MIN_STEM_LENGTH = 3
+
+
+def stem(word):
+    word = word.lower().replace('ё', 'е')
+    for ending in _ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= MIN_STEM_LENGTH:
+            return word[:-len(ending)]
+    return word
+
+
+def query_terms(query):
+    return [stem(word) for word in _WORD_RE.findall(query)]
+
+
+_fts_tables = {}
+
+
+def fts_available():
+    # Проверка наличия таблицы один раз на базу, а не на каждый запрос
+    if connection.vendor != 'sqlite':
+        return False
+    name = str(connection.settings_dict['NAME'])
+    if name not in _fts_tables:
+        _fts_tables[name] = FTS_TABLE in connection.introspection.table_names()
+    return _fts_tables[name]
+
+
+def _highlighted(text):
+    return mark_safe(escape(text).replace(_OPEN, '<mark>').replace(_CLOSE, '</mark>'))
+
+
+def search_services(query, limit=None):
+    """Услуги по запросу, лучшие совпадения первыми.
+
+    У найденных услуг заполнены search_rank, name_highlight и
+    description_snippet (безопасный HTML с <mark>).
+    """
+    terms = query_terms(query)
+    if not terms:
+        return []
+    if fts_available():
+        return _search_fts(terms, limit)
+    return _search_python(terms, limit)
+
+
+def _search_fts(terms, limit):
+    match = ' '.join('"%s"*' % term.replace('"', '""') for term in terms)
+    sql = (
+        f'SELECT rowid, bm25({FTS_TABLE}, %s, %s), '
+        f'highlight({FTS_TABLE}, 0, %s, %s), '
+        f'snippet({FTS_TABLE}, 1, %s, %s, %s, %s) '
+        f'FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s ORDER BY 2, rowid'
+    )
+    params = [NAME_WEIGHT, DESCRIPTION_WEIGHT, _OPEN, _CLOSE, _OPEN, _CLOSE, '…', SNIPPET_WORDS, match]
+    if limit:
+        sql += ' LIMIT %s'
+        params.append(limit)
+    with connections[router.db_for_read(Service)].cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+
+    services = Service.objects.in_bulk([row[0] for row in rows])
+    results = []
+    for service_id, rank, name, snippet in rows:
+        service = services.get(service_id)
+        if service is None:
+            continue
+        service.search_rank = -rank
+        service.name_highlight = _highlighted(name)
+        service.description_snippet = _highlighted(snippet)
+        results.append(service)
+    return results
+
+
+def _mark(text, terms):
+    # Подсветка слов, начинающихся с любого из термов
+    pattern = re.compile(r'\b(%s)\w*' % '|'.join(map(re.escape, terms)), re.IGNORECASE)
+    return pattern.sub(lambda m: _OPEN + m.group(0) + _CLOSE, text)
+
+
+def _snippet(text, terms):
+    words = text.split()
+    for i, word in enumerate(words):
+        if any(stem(word).startswith(term) or word.lower().startswith(term) for term in terms):
+            start = max(0, i - SNIPPET_WORDS // 2)
+            fragment = ' '.join(words[start:start + SNIPPET_WORDS])
+            return ('…' if start else '') + fragment + ('…' if start + SNIPPET_WORDS < len(words) else '')
+    return ' '.join(words[:SNIPPET_WORDS])
+
+
+def _search_python(terms, limit):
+    condition = reduce(and_, (
+        Q(name__icontains=term) | Q(description__icontains=term) for term in terms
+    ))
+    results = []
+    for service in Service.objects.filter(condition):
+        name, description = service.name.lower(), service.description.lower()
+        service.search_rank = sum(
+            NAME_WEIGHT * name.count(term) + DESCRIPTION_WEIGHT * description.count(term)
+            for term in terms
+        )
+        service.name_highlight = _highlighted(_mark(service.name, terms))
+        service.description_snippet = _highlighted(_mark(_snippet(service.description, terms), terms))
+        results.append(service)
+    results.sort(key=lambda s: (-s.search_rank, s.pk))
+    return results[:limit] if limit else results
+
+
+def index_service(service):
+    if not fts_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [service.pk])
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, name, description) VALUES (%s, %s, %s)',
+            [service.pk, service.name, service.description],
+        )
+
+
+def unindex_service(service_id):
+    if not fts_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [service_id])
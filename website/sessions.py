@@ -0,0 +1,91 @@
+from django.conf import settings
+from django.contrib.sessions.backends import cached_db
+from django.contrib.sessions.models import Session
+from django.core import checks
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from django.utils import timezone
+
+# Сессии в кеше с записью в БД (SESSION_ENGINE = 'website.sessions').
+# Чтение сессии на каждом запросе обслуживает кеш, в БД идут только записи
+# (вход, выход, смена данных сессии) и промахи кеша. Выход и сброс пользователя
+# (website/auth.py) удаляют записи кеша, поэтому кеш должен быть общим для всех
+# процессов (Redis, Memcached): кеш процесса (LocMemCache) не видит выхода,
+# сделанного в другом процессе — manage.py check --deploy сообщает об этом
+# ошибкой website.E001. При разработке копия сессии в нём живёт не дольше
+# SESSION_CACHE_TTL, а не весь срок сессии.
+KEY_PREFIX = 'sessions:'
+PURGE_BATCH_SIZE = 500
+
+
+def _cache_ttl():
+    return getattr(settings, 'SESSION_CACHE_TTL', 300)
+
+
+def check_shared_cache(app_configs=None, **kwargs):
+    """Системная проверка для check --deploy: сессии и пользователи не должны жить в кеше процесса."""
+    aliases = set()
+    if settings.SESSION_ENGINE == __name__:
+        aliases.add(settings.SESSION_CACHE_ALIAS)
+    if 'website.auth.SessionUserBackend' in settings.AUTHENTICATION_BACKENDS:
+        aliases.add('default')
+    return [
+        checks.Error(
+            f'Кеш «{alias}» — LocMemCache: выход и смена пароля в одном процессе не видны другим.',
+            hint='Сессиям и пользователям (website.sessions, website.auth) нужен общий кеш — Redis или Memcached.',
+            id='website.E001',
+        )
+        for alias in sorted(aliases)
+        if isinstance(caches[alias], LocMemCache)
+    ]
+
+
+class _CappedCache:
+    """Обёртка кеша, ограничивающая время жизни записей сессий."""
+
+    def __init__(self, cache):
+        self._cache = cache
+
+    def __getattr__(self, name):
+        return getattr(self._cache, name)
+
+    def __contains__(self, key):
+        return key in self._cache
+
+    def _timeout(self, timeout):
+        return _cache_ttl() if timeout is None else min(timeout, _cache_ttl())
+
+    def set(self, key, value, timeout=None, version=None):
+        return self._cache.set(key, value, self._timeout(timeout), version=version)
+
+    async def aset(self, key, value, timeout=None, version=None):
+        return await self._cache.aset(key, value, self._timeout(timeout), version=version)
+
+
+class SessionStore(cached_db.SessionStore):
+    cache_key_prefix = KEY_PREFIX
+
+    def __init__(self, session_key=None):
+        super().__init__(session_key)
+        self._cache = _CappedCache(self._cache)
+
+
+def purge_expired(batch_size=PURGE_BATCH_SIZE, now=None):
+    """Удаляет истёкшие сессии пачками и возвращает их число.
+
+    Каждая пачка — своя короткая транзакция: один DELETE по всей таблице
+    держал бы блокировку записи SQLite, пока не пройдёт всю таблицу.
+    """
+    now = now or timezone.now()
+    deleted = 0
+    while True:
+        keys = list(
+            Session.objects.filter(expire_date__lt=now)
+            .order_by('expire_date')
+            .values_list('session_key', flat=True)[:batch_size]
+        )
+        if not keys:
+            return deleted
+        with transaction.atomic():
+            deleted += Session.objects.filter(session_key__in=keys, expire_date__lt=now).delete()[0]
@@ -0,0 +1,200 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+from django.dispatch import receiver
+
+from . import auth, blobs, counters, freshness, images, loyalty, search, tasks, widgets
+from .availability import availability
+from .statuses import status_registry
+from .models import Appointment, AppointmentStatus, Service, Master, Review, Promotion, GalleryImage, User
+
+
+# Инкрементальное обновление индекса занятости мастеров — после фиксации транзакции:
+# откаченная запись не должна остаться в индексе
+@receiver(post_save, sender=Appointment)
+def appointment_saved(sender, instance, **kwargs):
+    transaction.on_commit(partial(availability.update, instance))
+
+
+@receiver(post_delete, sender=Appointment)
+def appointment_deleted(sender, instance, **kwargs):
+    transaction.on_commit(partial(availability.discard, instance.pk))
+
+
+# Реестр статусов перечитывается при любом изменении статусов
+@receiver(post_save, sender=AppointmentStatus)
+@receiver(post_delete, sender=AppointmentStatus)
+def reset_statuses(sender, **kwargs):
+    status_registry.refresh()
+
+
+# Длительность услуги, её удаление или флаг статуса меняют занятость сразу многих записей
+@receiver(post_save, sender=Service)
+@receiver(post_delete, sender=Service)
+@receiver(post_save, sender=AppointmentStatus)
+@receiver(post_delete, sender=AppointmentStatus)
+def reset_availability(sender, **kwargs):
+    availability.clear()
+
+
+# Сброс закешированных виджетов главной страницы
+@receiver(post_save, sender=Appointment)
+@receiver(post_delete, sender=Appointment)
+@receiver(post_save, sender=Service)
+@receiver(post_delete, sender=Service)
+def reset_popular_services(sender, **kwargs):
+    widgets.invalidate('popular_services')
+
+
+@receiver(post_save, sender=Appointment)
+@receiver(post_delete, sender=Appointment)
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+@receiver(post_save, sender=Master)
+@receiver(post_delete, sender=Master)
+def reset_top_masters(sender, **kwargs):
+    widgets.invalidate('top_masters')
+
+
+@receiver(post_save, sender=Promotion)
+@receiver(post_delete, sender=Promotion)
+def reset_upcoming_promotions(sender, **kwargs):
+    widgets.invalidate('upcoming_promotions')
+
+
+# Версии таблиц каталога для ETag / Last-Modified главной и списка услуг
+@receiver(post_save, sender=Service)
+@receiver(post_delete, sender=Service)
+@receiver(post_save, sender=Master)
+@receiver(post_delete, sender=Master)
+@receiver(post_save, sender=Promotion)
+@receiver(post_delete, sender=Promotion)
+def touch_catalogue(sender, **kwargs):
+    freshness.versions.touch(sender)
+
+
+# Закешированный пользователь сессии (website/auth.py): роль, хеш сессии, флаги доступа
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def reset_session_user(sender, instance, **kwargs):
+    auth.invalidate(instance.pk)
+
+
+# Денормализованные счётчики мастеров и услуг
+def _appointment_key(appointment):
+    return appointment.master_id, appointment.service_id, appointment.appointment_date
+
+
+@receiver(pre_save, sender=Appointment)
+def remember_appointment(sender, instance, **kwargs):
+    instance._counters_old = None
+    if instance.pk:
+        instance._counters_old = (
+            Appointment.objects.filter(pk=instance.pk)
+            .values_list('master_id', 'service_id', 'appointment_date')
+            .first()
+        )
+
+
+@receiver(post_save, sender=Appointment)
+def update_appointment_counters(sender, instance, **kwargs):
+    counters.appointment_changed(
+        getattr(instance, '_counters_old', None), _appointment_key(instance), instance.pk
+    )
+
+
+@receiver(post_delete, sender=Appointment)
+def drop_appointment_counters(sender, instance, **kwargs):
+    counters.appointment_changed(_appointment_key(instance), None, instance.pk)
+
+
+def _review_key(review_id=None, appointment_id=None, rating=None):
+    # (мастер, услуга, оценка) отзыва — одним запросом по записи
+    if review_id is not None:
+        return (
+            Review.objects.filter(pk=review_id)
+            .values_list('appointment__master_id', 'appointment__service_id', 'rating')
+            .first()
+        )
+    row = Appointment.objects.filter(pk=appointment_id).values_list('master_id', 'service_id').first()
+    return (*row, rating) if row else None
+
+
+@receiver(pre_save, sender=Review)
+def remember_review(sender, instance, **kwargs):
+    instance._counters_old = _review_key(review_id=instance.pk) if instance.pk else None
+
+
+@receiver(post_save, sender=Review)
+def update_review_counters(sender, instance, **kwargs):
+    counters.review_changed(
+        getattr(instance, '_counters_old', None),
+        _review_key(appointment_id=instance.appointment_id, rating=instance.rating),
+    )
+
+
+@receiver(pre_delete, sender=Review)
+def drop_review_counters(sender, instance, **kwargs):
+    # До удаления: при каскаде от записи её мастер и услуга ещё доступны
+    counters.review_changed(_review_key(review_id=instance.pk), None)
+
+
+# Синхронизация полнотекстового индекса услуг
+@receiver(post_save, sender=Service)
+def index_service(sender, instance, **kwargs):
+    search.index_service(instance)
+
+
+@receiver(post_delete, sender=Service)
+def unindex_service(sender, instance, **kwargs):
+    search.unindex_service(instance.pk)
+
+
+# Скользящий счётчик визитов для скидки постоянного клиента; корзины правятся
+# после коммита, чтобы откаченная запись не оставила в кеше лишний визит
+@receiver(post_save, sender=Appointment)
+def count_visit(sender, instance, created, **kwargs):
+    if created and instance.client_id:
+        transaction.on_commit(partial(loyalty.record_visit, instance.client_id, instance.created_at, 1))
+
+
+@receiver(post_delete, sender=Appointment)
+def uncount_visit(sender, instance, **kwargs):
+    if instance.client_id:
+        transaction.on_commit(partial(loyalty.record_visit, instance.client_id, instance.created_at, -1))
+
+
+# Производные картинок для новых загрузок строит фоновый воркер (website/tasks.py)
+@receiver(post_save, sender=Service)
+@receiver(post_save, sender=Master)
+@receiver(post_save, sender=Promotion)
+@receiver(post_save, sender=GalleryImage)
+def build_image_variants(sender, instance, **kwargs):
+    if images.pending_fields(instance):
+        tasks.enqueue('images.build_variants', model=instance._meta.label, pk=instance.pk)
+
+
+# Счётчики ссылок на файлы хранилища по содержимому
+@receiver(pre_save, sender=Service)
+@receiver(pre_save, sender=Master)
+@receiver(pre_save, sender=Promotion)
+@receiver(pre_save, sender=GalleryImage)
+def remember_files(sender, instance, **kwargs):
+    instance._blobs_old = blobs.stored_names(instance)
+
+
+@receiver(post_save, sender=Service)
+@receiver(post_save, sender=Master)
+@receiver(post_save, sender=Promotion)
+@receiver(post_save, sender=GalleryImage)
+def update_file_references(sender, instance, **kwargs):
+    blobs.references_changed(getattr(instance, '_blobs_old', {}), blobs.current_names(instance))
+
+
+@receiver(post_delete, sender=Service)
+@receiver(post_delete, sender=Master)
+@receiver(post_delete, sender=Promotion)
+@receiver(post_delete, sender=GalleryImage)
+def drop_file_references(sender, instance, **kwargs):
+    blobs.references_changed(blobs.current_names(instance), {})
@@ -0,0 +1,75 @@
+import threading
+import time as _time
+
+from django.conf import settings
+
+from .models import AppointmentStatus
+
+
+class StatusRegistry:
+    """Статусы записей в памяти процесса.
+
+    Сбрасывается сигналами при изменении AppointmentStatus, поэтому проверки
+    конфликтов и фильтры работают с id статусов без соединения таблиц.
+    Сигнал приходит только в процесс, который сохранил статус, — остальные
+    перечитывают таблицу (несколько строк) раз в STATUS_REGISTRY_TTL секунд.
+    changed_at — когда содержимое реестра в последний раз изменилось: по нему
+    индекс занятости отбрасывает дни, загруженные со старым набором статусов.
+    """
+
+    def __init__(self):
+        self._statuses = None
+        self._loaded_at = 0.0
+        self._changed_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def ttl(self):
+        return getattr(settings, 'STATUS_REGISTRY_TTL', 30)
+
+    def _is_fresh(self):
+        return self._statuses is not None and _time.monotonic() - self._loaded_at < self.ttl
+
+    def _load(self):
+        if self._is_fresh():
+            return self._statuses
+        with self._lock:
+            if not self._is_fresh():
+                rows = list(
+                    AppointmentStatus.objects.order_by('id')
+                    .values_list('id', 'code', 'name', 'occupies_slot')
+                )
+                statuses = {
+                    'choices': [(code, name) for pk, code, name, occupies in rows],
+                    'ids': {code: pk for pk, code, name, occupies in rows},
+                    'busy': frozenset(pk for pk, code, name, occupies in rows if occupies),
+                    'names': {pk: name for pk, code, name, occupies in rows},
+                }
+                now = _time.monotonic()
+                if statuses != self._statuses:
+                    self._changed_at = now
+                self._statuses, self._loaded_at = statuses, now
+            return self._statuses
+
+    def busy_ids(self):
+        return self._load()['busy']
+
+    def id_for(self, code):
+        return self._load()['ids'].get(code)
+
+    def choices(self):
+        return self._load()['choices']
+
+    def name_for(self, status_id):
+        return self._load()['names'].get(status_id, '')
+
+    def changed_at(self):
+        self._load()
+        return self._changed_at
+
+    def refresh(self):
+        with self._lock:
+            self._loaded_at = 0.0
+
+
+status_registry = StatusRegistry()
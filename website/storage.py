@@ -0,0 +1,91 @@
+import hashlib
+import os
+import posixpath
+import uuid
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.storage import FileSystemStorage
+
+# Хранилище загрузок по содержимому: файл кладётся в BLOB_DIR/<aa>/<sha256><расширение>,
+# повторная загрузка тех же байтов возвращает уже существующий файл.
+# Ссылки на файлы считаются в модели MediaBlob (website/blobs.py).
+BLOB_DIR = 'blobs'
+
+
+def content_name(content, name):
+    sha = hashlib.sha256()
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    for chunk in content.chunks():
+        sha.update(chunk)
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    digest = sha.hexdigest()
+    extension = posixpath.splitext(name)[1].lower()
+    return f'{BLOB_DIR}/{digest[:2]}/{digest}{extension}'
+
+
+def is_blob(name):
+    return bool(name) and name.startswith(BLOB_DIR + '/')
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    def get_available_name(self, name, max_length=None):
+        # Имя выбирает _save() по содержимому: занятое имя — тот же файл, а не конфликт
+        return name
+
+    def _save(self, name, content):
+        blob = content_name(content, name)
+        if self.exists(blob):
+            return blob
+        # Пишем во временный файл рядом и переименовываем: параллельная загрузка
+        # тех же байтов просто заменит файл таким же, читатель не увидит недописанный
+        partial = super()._save(f'{blob}.{uuid.uuid4().hex}.part', content)
+        try:
+            os.replace(self.path(partial), self.path(blob))
+        except BaseException:
+            self.delete(partial)
+            raise
+        return blob
+
+
+_storage = ContentAddressedStorage()
+
+
+def content_addressed_storage():
+    # Вызываемый объект: миграции хранят ссылку на функцию, а не настройки хранилища
+    return _storage
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """collectstatic с хешами в именах, минификацией CSS и сжатыми копиями .gz/.br.
+
+    Минифицируется уже хешированная копия: хеш считается по исходнику и всё
+    так же меняется вместе с ним.
+    """
+
+    def stored_name(self, name):
+        # Статика ещё не собрана (разработка, тесты) — ссылки на исходные имена
+        if not self.hashed_files:
+            return name
+        return super().stored_name(name)
+
+    def post_process(self, paths, dry_run=False, **options):
+        hashed_names = set()
+        for name, hashed_name, processed in super().post_process(paths, dry_run=dry_run, **options):
+            if hashed_name and not isinstance(processed, Exception):
+                hashed_names.add(hashed_name)
+            yield name, hashed_name, processed
+        if dry_run:
+            return
+        # Импорт здесь: assets сам импортирует этот модуль
+        from .assets import COMPRESSIBLE, compress, minify_css
+        for hashed_name in sorted(hashed_names):
+            path = self.path(hashed_name)
+            if hashed_name.endswith('.css') and '.min.' not in hashed_name:
+                with open(path, encoding='utf-8') as f:
+                    text = f.read()
+                with open(path, 'w', encoding='utf-8') as f:
+                    f.write(minify_css(text))
+            if hashed_name.endswith(COMPRESSIBLE):
+                compress(path)
@@ -0,0 +1,203 @@
+import random
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.utils import timezone
+
+from . import freshness
+from .bulk import after_bulk_load, insert_appointments
+from .models import Appointment, AppointmentStatus, Master, MasterService, Promotion, Review, Service, User
+from .search import index_service
+from .statuses import status_registry
+
+# Синтетические данные салона для нагрузочных замеров (manage.py generate_salon_data).
+# Всё вставляется пачками через bulk_create; расписание каждого мастера строится
+# последовательно по дням, поэтому записи не пересекаются.
+DEFAULT_SCALE = {
+    'masters': 50,
+    'services': 500,
+    'clients': 5000,
+    'appointments': 200_000,
+    'reviews': 50_000,
+    'promotions': 20,
+}
+BATCH_SIZE = 5000
+# Записи строятся от сегодняшнего дня + FUTURE_DAYS назад в прошлое
+FUTURE_DAYS = 14
+CANCELLED_SHARE = 0.1
+
+STATUSES = (
+    (AppointmentStatus.CONFIRMED, 'Подтверждена', True),
+    (AppointmentStatus.IN_PROGRESS, 'В работе', True),
+    (AppointmentStatus.CANCELLED, 'Отменена', False),
+)
+SERVICE_KINDS = ('Маникюр', 'Педикюр', 'Наращивание', 'Покрытие гель-лаком', 'Дизайн ногтей', 'Снятие', 'Укрепление')
+SERVICE_STYLES = ('классический', 'аппаратный', 'комбинированный', 'японский', 'френч', 'омбре', 'экспресс', 'SPA')
+NAMES = ('Анна', 'Мария', 'Ксения', 'Евгения', 'Марина', 'Ольга', 'Дарья', 'Алина', 'Виктория', 'Софья')
+SPECIALIZATIONS = ('Маникюр и покрытие', 'Наращивание ногтей', 'Педикюр', 'Дизайн и роспись', 'Универсал')
+REVIEW_TEXTS = (
+    'Всё понравилось, приду ещё.',
+    'Аккуратно и быстро.',
+    'Мастер опоздал, но результат хороший.',
+    'Покрытие держится уже третью неделю.',
+    'Дороговато, но качественно.',
+)
+DURATIONS = (30, 45, 60, 90, 120)
+
+
+def _log(stdout, message):
+    if stdout is not None:
+        stdout.write(message)
+
+
+def generate(scale=None, seed=0, stdout=None):
+    """Наполняет БД синтетическими данными. Возвращает число созданных объектов по видам."""
+    scale = {**DEFAULT_SCALE, **(scale or {})}
+    rng = random.Random(seed)
+    statuses = _statuses()
+    services = _services(rng, scale['services'])
+    _log(stdout, f'Услуг: {len(services)}')
+    masters = _masters(rng, scale['masters'], services)
+    _log(stdout, f'Мастеров: {len(masters)}')
+    client_ids = _clients(scale['clients'])
+    _log(stdout, f'Клиентов: {len(client_ids)}')
+    appointments = _appointments(rng, scale['appointments'], masters, services, client_ids, statuses)
+    _log(stdout, f'Записей: {appointments}')
+    reviews = _reviews(rng, scale['reviews'])
+    _log(stdout, f'Отзывов: {reviews}')
+    promotions = _promotions(rng, scale['promotions'])
+    after_bulk_load(client_ids)
+    freshness.versions.touch(Promotion)
+    return {
+        'services': len(services), 'masters': len(masters), 'clients': len(client_ids),
+        'appointments': appointments, 'reviews': reviews, 'promotions': promotions,
+    }
+
+
+def _statuses():
+    for code, name, occupies_slot in STATUSES:
+        AppointmentStatus.objects.get_or_create(code=code, defaults={'name': name, 'occupies_slot': occupies_slot})
+    status_registry.refresh()
+    return {code: status_registry.id_for(code) for code, name, occupies_slot in STATUSES}
+
+
+def _services(rng, count):
+    """{id: (длительность, цена)} созданных услуг."""
+    start = Service.objects.count()
+    created = Service.objects.bulk_create([
+        Service(
+            name=f'{rng.choice(SERVICE_KINDS)} {rng.choice(SERVICE_STYLES)} №{start + i + 1}',
+            description=f'{rng.choice(SERVICE_KINDS)}: {rng.choice(SERVICE_STYLES)} вариант, '
+                        f'{rng.choice(REVIEW_TEXTS).lower()}',
+            price=Decimal(rng.randrange(500, 5000, 50)),
+            duration_minutes=rng.choice(DURATIONS),
+        )
+        for i in range(count)
+    ], batch_size=BATCH_SIZE)
+    # bulk_create не вызывает сигналы — поисковый индекс заполняем сами
+    for service in created:
+        index_service(service)
+    return {service.pk: (service.duration_minutes, service.price) for service in created}
+
+
+def _masters(rng, count, services):
+    """{id мастера: [id услуг]}."""
+    start = Master.objects.count()
+    created = Master.objects.bulk_create([
+        Master(name=f'{rng.choice(NAMES)} {start + i + 1}', specialization=rng.choice(SPECIALIZATIONS))
+        for i in range(count)
+    ], batch_size=BATCH_SIZE)
+    service_ids = list(services)
+    masters = {}
+    links = []
+    for i, master in enumerate(created):
+        chosen = set(rng.sample(service_ids, min(len(service_ids), rng.randint(10, 40))))
+        # Каждую услугу выполняет хотя бы один мастер
+        chosen.update(service_ids[i::len(created)])
+        masters[master.pk] = sorted(chosen)
+        links.extend(MasterService(master=master, service_id=service_id) for service_id in chosen)
+    MasterService.objects.bulk_create(links, batch_size=BATCH_SIZE)
+    return masters
+
+
+def _clients(count):
+    start = User.objects.filter(username__startswith='client_').count()
+    # Вход синтетическим клиентам не нужен: один неиспользуемый пароль на всех
+    password = make_password(None)
+    User.objects.bulk_create([
+        User(username=f'client_{start + i + 1:06d}', password=password, role='client')
+        for i in range(count)
+    ], batch_size=BATCH_SIZE, ignore_conflicts=True)
+    usernames = [f'client_{start + i + 1:06d}' for i in range(count)]
+    return list(User.objects.filter(username__in=usernames).values_list('id', flat=True))
+
+
+def _appointments(rng, count, masters, services, client_ids, statuses):
+    if not (count and masters and client_ids):
+        return 0
+    opening, closing = 9 * 60, 21 * 60
+    day = timezone.localdate() + timedelta(days=FUTURE_DAYS)
+    created = 0
+    batch = []
+    while created < count:
+        for master_id, service_ids in masters.items():
+            minutes = opening + rng.choice((0, 15, 30))
+            while created < count:
+                service_id = rng.choice(service_ids)
+                duration, price = services[service_id]
+                if minutes + duration > closing:
+                    break
+                cancelled = rng.random() < CANCELLED_SHARE
+                start = time(minutes // 60, minutes % 60)
+                booked_at = timezone.make_aware(datetime.combine(day, start)) - timedelta(days=rng.randint(0, 30))
+                batch.append((Appointment(
+                    client_id=rng.choice(client_ids), master_id=master_id, service_id=service_id,
+                    appointment_date=day, appointment_time=start, price_paid=price,
+                    status_id=statuses[AppointmentStatus.CANCELLED if cancelled else AppointmentStatus.CONFIRMED],
+                ), booked_at))
+                created += 1
+                minutes += duration + rng.choice((0, 0, 15, 30, 60))
+            if created >= count:
+                break
+        if len(batch) >= BATCH_SIZE:
+            insert_appointments(batch)
+            batch = []
+        day -= timedelta(days=1)
+    if batch:
+        insert_appointments(batch)
+    return created
+
+
+def _reviews(rng, count):
+    if not count:
+        return 0
+    past = list(
+        Appointment.objects.filter(appointment_date__lt=timezone.localdate(), review__isnull=True)
+        .values_list('id', 'client_id')
+    )
+    chosen = rng.sample(past, min(count, len(past)))
+    with transaction.atomic():
+        Review.objects.bulk_create([
+            Review(
+                appointment_id=appointment_id, client_id=client_id,
+                rating=rng.choices((1, 2, 3, 4, 5), weights=(1, 2, 5, 12, 20))[0],
+                text=rng.choice(REVIEW_TEXTS),
+            )
+            for appointment_id, client_id in chosen
+        ], batch_size=BATCH_SIZE)
+    return len(chosen)
+
+
+def _promotions(rng, count):
+    today = timezone.localdate()
+    promotions = []
+    for i in range(count):
+        start = today + timedelta(days=rng.randint(-60, 60))
+        promotions.append(Promotion(
+            title=f'Акция №{i + 1}: {rng.choice(SERVICE_KINDS).lower()} со скидкой',
+            start_date=start, end_date=start + timedelta(days=rng.randint(7, 45)),
+        ))
+    Promotion.objects.bulk_create(promotions, batch_size=BATCH_SIZE)
+    return count
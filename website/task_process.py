@@ -0,0 +1,9 @@
+# Точка входа дочернего процесса пула воркера. Модуль не импортирует модели
+# на верхнем уровне: при запуске через spawn Django ещё не настроен.
+
+
+def execute(task_id):
+    import django
+    django.setup()
+    from website.tasks import execute as execute_task
+    return execute_task(task_id)
@@ -0,0 +1,144 @@
+import logging
+import multiprocessing
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import timedelta
+from functools import partial
+
+from django.apps import apps
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import task_process
+from .models import Task
+
+# Очередь фоновых задач в БД. Задачи регистрируются декоратором @task,
+# ставятся в очередь через enqueue() и выполняются командой manage.py worker
+# в пуле потоков или процессов. Неудачные попытки повторяются с растущей паузой.
+logger = logging.getLogger(__name__)
+
+_registry = {}
+
+
+def task(name):
+    def decorator(func):
+        _registry[name] = func
+        return func
+    return decorator
+
+
+def enqueue(name, max_attempts=None, **payload):
+    """Ставит задачу в очередь после фиксации текущей транзакции.
+
+    Задача, поставленная из откаченной транзакции, не появится: иначе воркер
+    мог бы взять её раньше, чем откатится строка, ради которой она создана.
+    """
+    if name not in _registry:
+        raise KeyError(f'Неизвестная задача: {name}')
+    if getattr(settings, 'TASKS_EAGER', False):
+        # Режим без воркера (разработка, тесты): выполняем сразу. Ошибка задачи, как и
+        # у воркера, только пишется в лог — сохранение, из которого её поставили, не ломается
+        try:
+            _registry[name](**payload)
+        except Exception:
+            logger.exception('Задача %s упала', name)
+        return
+    transaction.on_commit(partial(
+        Task.objects.create,
+        name=name,
+        payload=payload,
+        max_attempts=max_attempts or getattr(settings, 'TASK_MAX_ATTEMPTS', 5),
+    ))
+
+
+def retry_delay(attempts):
+    return timedelta(seconds=getattr(settings, 'TASK_RETRY_BASE_SECONDS', 10) * 2 ** (attempts - 1))
+
+
+def claim(limit):
+    """Забирает до limit готовых задач. Условный UPDATE защищает от двойного захвата."""
+    claimed = []
+    now = timezone.now()
+    candidates = (
+        Task.objects.filter(status=Task.PENDING, run_after__lte=now)
+        .order_by('run_after', 'id')
+        .values_list('id', flat=True)[:limit]
+    )
+    for task_id in candidates:
+        taken = Task.objects.filter(pk=task_id, status=Task.PENDING).update(
+            status=Task.RUNNING, attempts=F('attempts') + 1, locked_at=now,
+        )
+        if taken:
+            claimed.append(task_id)
+    return claimed
+
+
+def release_stale():
+    # Задачи, зависшие в «выполняется» после падения воркера, возвращаются в очередь
+    timeout = timedelta(seconds=getattr(settings, 'TASK_LOCK_TIMEOUT', 600))
+    return Task.objects.filter(status=Task.RUNNING, locked_at__lt=timezone.now() - timeout).update(
+        status=Task.PENDING, locked_at=None,
+    )
+
+
+def execute(task_id):
+    """Выполняет одну захваченную задачу (в потоке или дочернем процессе пула)."""
+    close_old_connections()
+    job = Task.objects.get(pk=task_id)
+    try:
+        _registry[job.name](**job.payload)
+    except Exception:
+        error = traceback.format_exc()
+        logger.warning('Задача %s #%s упала (попытка %s)', job.name, job.pk, job.attempts)
+        if job.attempts >= job.max_attempts:
+            Task.objects.filter(pk=job.pk).update(status=Task.FAILED, last_error=error, locked_at=None)
+        else:
+            Task.objects.filter(pk=job.pk).update(
+                status=Task.PENDING, last_error=error, locked_at=None,
+                run_after=timezone.now() + retry_delay(job.attempts),
+            )
+        return False
+    else:
+        Task.objects.filter(pk=job.pk).update(status=Task.DONE, last_error='', locked_at=None)
+        return True
+    finally:
+        close_old_connections()
+
+
+def run_worker(concurrency=2, use_processes=False, poll_interval=1.0, once=False):
+    release_stale()
+    if use_processes:
+        # spawn: дочерние процессы не наследуют открытые соединения с БД
+        executor = ProcessPoolExecutor(max_workers=concurrency, mp_context=multiprocessing.get_context('spawn'))
+        target = task_process.execute
+    else:
+        executor = ThreadPoolExecutor(max_workers=concurrency)
+        target = execute
+    running = set()
+    processed = 0
+    with executor:
+        while True:
+            free = concurrency - len(running)
+            task_ids = claim(free) if free else []
+            running.update(executor.submit(target, task_id) for task_id in task_ids)
+            if not running:
+                if once:
+                    break
+                time.sleep(poll_interval)
+                continue
+            done, running = wait(running, timeout=poll_interval, return_when=FIRST_COMPLETED)
+            processed += len(done)
+    return processed
+
+
+# --- Задачи приложения ---
+
+@task('images.build_variants')
+def build_image_variants(model, pk, force=False):
+    from .images import generate_for_instance
+    instance = apps.get_model(model).objects.filter(pk=pk).first()
+    if instance is not None:
+        generate_for_instance(instance, force=force)
@@ -0,0 +1,23 @@
+from functools import lru_cache
+
+from django import template
+from django.templatetags.static import static
+from django.utils.html import format_html
+
+from website.assets import VENDORED, vendored_path
+
+register = template.Library()
+
+
+@lru_cache(maxsize=None)
+def _is_vendored(name):
+    return vendored_path(name).exists()
+
+
+@register.simple_tag
+def vendored_stylesheet(name):
+    """<link> на локальную копию из VENDORED; пока её не скачали (build_assets) — на CDN с SRI."""
+    path, url, integrity = VENDORED[name]
+    if _is_vendored(name):
+        return format_html('<link rel="stylesheet" href="{}">', static(path))
+    return format_html('<link rel="stylesheet" href="{}" integrity="{}" crossorigin="anonymous">', url, integrity)
@@ -0,0 +1,45 @@
+from django import template
+
+from website.fragments import get_or_render
+
+register = template.Library()
+
+
+class FragmentCacheNode(template.Node):
+    def __init__(self, nodelist, obj, name, vary_on):
+        self.nodelist = nodelist
+        self.obj = obj
+        self.name = name
+        self.vary_on = vary_on
+
+    def render(self, context):
+        return get_or_render(
+            self.name,
+            self.obj.resolve(context),
+            [value.resolve(context) for value in self.vary_on],
+            lambda: self.nodelist.render(context),
+        )
+
+
+@register.tag('cache_fragment')
+def do_cache_fragment(parser, token):
+    """{% cache_fragment объект "имя" [доп. значения…] %}…{% endcache_fragment %}
+
+    Кеширует фрагмент по версии объекта (модель, pk, updated_at) и доп. значениям —
+    тем полям, что показываются во фрагменте, но не меняют updated_at (например, рейтинг).
+    Объектом может быть и просто строка версии, например из list_version().
+    """
+    bits = token.split_contents()
+    if len(bits) < 3:
+        raise template.TemplateSyntaxError(f'{bits[0]}: нужны объект и имя фрагмента')
+    name = bits[2]
+    if not (name[0] == name[-1] and name[0] in '"\''):
+        raise template.TemplateSyntaxError(f'{bits[0]}: имя фрагмента должно быть строкой в кавычках')
+    nodelist = parser.parse(('endcache_fragment',))
+    parser.delete_first_token()
+    return FragmentCacheNode(
+        nodelist,
+        parser.compile_filter(bits[1]),
+        name[1:-1],
+        [parser.compile_filter(bit) for bit in bits[3:]],
+    )
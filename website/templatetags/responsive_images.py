@@ -0,0 +1,42 @@
+from django import template
+from django.core.files.storage import default_storage
+from django.utils.html import format_html, format_html_join
+
+from website.images import get_manifest
+
+register = template.Library()
+
+_MIME_TYPES = {'avif': 'image/avif', 'webp': 'image/webp', 'jpeg': 'image/jpeg', 'png': 'image/png'}
+
+
+def _srcset(variants):
+    return ', '.join(f'{default_storage.url(path)} {width}w' for width, path in variants)
+
+
+@register.simple_tag
+def responsive_image(field_file, alt='', css_class='', sizes='80px'):
+    """<picture> с AVIF/WebP и srcset; без производных — обычный <img> с оригиналом."""
+    if not field_file:
+        return ''
+    manifest = get_manifest(field_file.name)
+    if not manifest:
+        return format_html('<img src="{}" alt="{}" class="{}" loading="lazy">', field_file.url, alt, css_class)
+
+    fallback = manifest['variants'][manifest['fallback']]
+    sources = format_html_join(
+        '', '<source type="{}" srcset="{}" sizes="{}">',
+        (
+            (_MIME_TYPES[fmt], _srcset(variants), sizes)
+            for fmt, variants in manifest['variants'].items()
+            if fmt != manifest['fallback']
+        ),
+    )
+    return format_html(
+        '<picture>{}<img src="{}" srcset="{}" sizes="{}" alt="{}" class="{}" loading="lazy" decoding="async"></picture>',
+        sources,
+        default_storage.url(fallback[0][1]),
+        _srcset(fallback),
+        sizes,
+        alt,
+        css_class,
+    )
@@ -1,3 +1,1364 @@
-from django.test import TestCase
+import gzip
+import re
+import tempfile
+import threading
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from pathlib import Path
+from unittest import skipUnless
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from PIL import Image as PILImage
+
+from django.contrib.sessions.models import Session
+from django.core import checks
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed, ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import CommandError, call_command
+from django.db import connection, connections, router, transaction
+from django.template import Context, Template
+from django.test import (
+    AsyncClient, Client, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import (
+    assets, auth, benchmark, bulk, concurrency, counters, database, freshness, images, loyalty, search, sessions,
+    synthetic, tasks,
+)
+from .availability import AvailabilityIndex, DaySchedule, availability
+from .fragments import fragment_key
+from .models import (
+    Appointment, AppointmentStatus, Master, MasterService, MediaBlob, Promotion, Review, Service, Task, User,
+)
+from .pagination import APPOINTMENT_ORDERING
+from .perf import PerfMiddleware, Recorder, report, store
+from .statuses import status_registry
+from .storage import content_addressed_storage
+from .views import APPOINTMENTS_PAGE_SIZE, FREE_SLOTS_MAX_DAYS, FREE_SLOTS_MAX_PAGE_SIZE
+from .widgets import WIDGETS
+
+# Строка плана вида «SCAN website_appointment» без индекса — полный проход по таблице
+FULL_SCAN_RE = re.compile(r'\bSCAN (\w+)$')
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN есть только у SQLite')
+class QueryPlanTests(TestCase):
+    """Горячие запросы должны обслуживаться индексами, а не полным сканированием."""
+
+    def setUp(self):
+        AppointmentStatus.objects.create(name='Подтверждена', code=AppointmentStatus.CONFIRMED, occupies_slot=True)
+        status_registry.refresh()
+
+    def plan(self, queryset):
+        return queryset.explain().splitlines()
+
+    def assertNoFullScan(self, queryset):
+        plan = self.plan(queryset)
+        scans = [line for line in plan if FULL_SCAN_RE.search(line)]
+        self.assertFalse(scans, 'Полное сканирование таблицы:\n' + '\n'.join(plan))
+        return plan
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = self.assertNoFullScan(queryset)
+        self.assertTrue(
+            any(index_name in line for line in plan),
+            f'Индекс {index_name} не используется:\n' + '\n'.join(plan),
+        )
+
+    def test_availability_range(self):
+        today = date.today()
+        queryset = AvailabilityIndex.busy_queryset([1, 2, 3], today, today + timedelta(days=6))
+        self.assertUsesIndex(queryset, 'appointment_master_day_idx')
+
+    def test_loyalty_discount_count(self):
+        queryset = Appointment.objects.filter(
+            client_id=1, created_at__gte=timezone.now() - timedelta(days=182)
+        )
+        self.assertUsesIndex(queryset, 'appointment_client_idx')
+
+    def test_appointments_by_date(self):
+        queryset = Appointment.objects.filter(appointment_date__gte=date.today() - timedelta(days=30))
+        self.assertUsesIndex(queryset, 'appointment_date_idx')
+
+    def test_homepage_widgets(self):
+        for name, compute in WIDGETS.items():
+            with self.subTest(widget=name):
+                self.assertNoFullScan(compute())
+
+    def test_upcoming_promotions(self):
+        self.assertUsesIndex(WIDGETS['upcoming_promotions'](), 'promotion_end_date_idx')
+
+    def test_appointment_list_first_page(self):
+        queryset = Appointment.objects.order_by(*APPOINTMENT_ORDERING)[:51]
+        plan = self.assertNoFullScan(queryset)
+        self.assertFalse([line for line in plan if 'TEMP B-TREE' in line], '\n'.join(plan))
+
+    def test_appointment_list_filtered_by_master(self):
+        queryset = Appointment.objects.order_by(*APPOINTMENT_ORDERING).filter(
+            master_id=1, appointment_date__gte=date.today()
+        )[:51]
+        self.assertUsesIndex(queryset, 'appointment_master_day_idx')
+
+    def test_masters_for_service(self):
+        queryset = MasterService.objects.filter(service_id=1).values_list('master_id', flat=True)
+        self.assertNoFullScan(queryset)
+
+
+class AvailabilityTests(TestCase):
+    """Интервалы занятости: соседние записи, пересечения, статусы и откат транзакции."""
+
+    def setUp(self):
+        self.busy = AppointmentStatus.objects.create(name='Подтверждена', code=AppointmentStatus.CONFIRMED, occupies_slot=True)
+        self.cancelled = AppointmentStatus.objects.create(name='Отменена', code=AppointmentStatus.CANCELLED, occupies_slot=False)
+        status_registry.refresh()
+        availability.clear()
+        self.addCleanup(availability.clear)
+        self.master = Master.objects.create(name='Анна')
+        self.service = Service.objects.create(name='Маникюр', price=1000, duration_minutes=60)
+        self.client_user = User.objects.create_user('guest', role='client')
+        self.day = date.today() + timedelta(days=3)
+
+    def create(self, hour, minute=0, status=None):
+        return Appointment.objects.create(
+            client=self.client_user, master=self.master, service=self.service, status=status or self.busy,
+            appointment_date=self.day, appointment_time=time(hour, minute),
+        )
+
+    def book(self, hour, minute=0, status=None):
+        # Индекс обновляется после фиксации, а TestCase её не делает
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.create(hour, minute, status)
+
+    def is_free(self, hour, minute=0, exclude_id=None):
+        return availability.is_slot_free(self.master.pk, self.day, time(hour, minute), 60, exclude_id=exclude_id)
+
+    def test_day_schedule_intervals(self):
+        schedule = DaySchedule({1: (600, 660), 2: (660, 720), 3: (800, 830)})
+        # Соседние интервалы сливаются в блок, но граница не считается занятой
+        self.assertEqual((schedule.starts, schedule.ends), ([600, 800], [720, 830]))
+        self.assertTrue(schedule.is_free(540, 600))
+        self.assertTrue(schedule.is_free(720, 780))
+        self.assertFalse(schedule.is_free(659, 661))
+        self.assertFalse(schedule.is_free(810, 900))
+        self.assertFalse(schedule.is_free(630, 690, exclude_id=1))
+        self.assertTrue(schedule.is_free(600, 660, exclude_id=1))
+        schedule.remove(2)
+        self.assertTrue(schedule.is_free(660, 720))
+
+    def test_free_slots_skip_busy_blocks(self):
+        schedule = DaySchedule({1: (9 * 60, 10 * 60), 2: (10 * 60 + 30, 11 * 60)})
+        self.assertEqual(schedule.free_slots(30, 3), [time(10, 0), time(11, 0), time(11, 15)])
+
+    def test_adjacent_and_overlapping_bookings(self):
+        first = self.book(10)
+        self.assertTrue(self.is_free(11))
+        self.assertTrue(self.is_free(9))
+        self.assertFalse(self.is_free(10, 30))
+        self.assertTrue(self.is_free(10, 30, exclude_id=first.pk))
+        self.book(11)
+        with self.assertRaises(ValidationError):
+            self.book(11, 45)
+
+    def test_cancelled_booking_does_not_occupy(self):
+        self.book(10, status=self.cancelled)
+        self.assertTrue(self.is_free(10))
+        self.book(10)
+        self.assertFalse(self.is_free(10, 15))
+
+    def test_status_change_in_other_process(self):
+        self.book(10)
+        self.assertFalse(self.is_free(10))
+        # Правка без сигналов — так её видит процесс, который статус не сохранял
+        AppointmentStatus.objects.filter(pk=self.busy.pk).update(occupies_slot=False, name='Перенесена')
+        self.assertFalse(self.is_free(10))
+        with override_settings(STATUS_REGISTRY_TTL=0):
+            self.assertEqual(status_registry.name_for(self.busy.pk), 'Перенесена')
+            self.assertTrue(self.is_free(10))
+
+    def test_service_delete_resets_durations(self):
+        self.book(10)
+        self.assertFalse(self.is_free(10, 30))
+        # Записи остаются без услуги и занимают время по умолчанию
+        self.service.delete()
+        self.assertFalse(self.is_free(10))
+        self.assertTrue(self.is_free(10, 30))
+
+    def test_index_follows_commits_only(self):
+        availability.day(self.master.pk, self.day)
+        try:
+            with transaction.atomic():
+                self.create(10)
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        self.assertTrue(self.is_free(10))
+        with self.captureOnCommitCallbacks() as callbacks:
+            appointment = self.create(12)
+        self.assertTrue(self.is_free(12))
+        for callback in callbacks:
+            callback()
+        self.assertFalse(self.is_free(12))
+        with self.captureOnCommitCallbacks(execute=True):
+            appointment.delete()
+        self.assertTrue(self.is_free(12))
+
+
+class CounterTests(TestCase):
+    """Счётчики мастеров и услуг следуют за записями и отзывами; rebuild исправляет расхождения."""
+
+    def setUp(self):
+        self.status = AppointmentStatus.objects.create(name='Подтверждена', code=AppointmentStatus.CONFIRMED, occupies_slot=True)
+        status_registry.refresh()
+        availability.clear()
+        self.addCleanup(availability.clear)
+        self.anna, self.olga = Master.objects.create(name='Анна'), Master.objects.create(name='Ольга')
+        self.service = Service.objects.create(name='Маникюр', price=1000, duration_minutes=60)
+        self.guest = User.objects.create_user('guest', role='client')
+        self.appointment = Appointment.objects.create(
+            client=self.guest, master=self.anna, service=self.service, status=self.status,
+            appointment_date=date.today(), appointment_time=time(10, 0),
+        )
+
+    def counters(self, obj):
+        obj.refresh_from_db()
+        return obj.review_count, obj.rating_sum, obj.rating_avg, obj.bookings_30d
+
+    def test_appointment_create_move_delete(self):
+        self.assertEqual(self.counters(self.anna), (0, 0, None, 1))
+        self.assertEqual(self.counters(self.service)[3], 1)
+        Review.objects.create(client=self.guest, appointment=self.appointment, text='-', rating=4)
+        self.appointment.master = self.olga
+        self.appointment.save()
+        self.assertEqual(self.counters(self.anna), (0, 0, None, 0))
+        self.assertEqual(self.counters(self.olga), (1, 4, 4.0, 1))
+        # Перенос за пределы окна 30 дней убирает запись из bookings_30d
+        self.appointment.appointment_date = date.today() - timedelta(days=40)
+        self.appointment.save()
+        self.assertEqual(self.counters(self.olga), (1, 4, 4.0, 0))
+        self.appointment.delete()
+        self.assertEqual(self.counters(self.olga), (0, 0, None, 0))
+        self.assertEqual(self.counters(self.service), (0, 0, None, 0))
+
+    def test_review_edit_and_delete(self):
+        review = Review.objects.create(client=self.guest, appointment=self.appointment, text='-', rating=4)
+        Review.objects.create(client=self.guest, appointment=self.appointment, text='-', rating=5)
+        self.assertEqual(self.counters(self.anna)[:3], (2, 9, 4.5))
+        review.rating = 2
+        review.save()
+        self.assertEqual(self.counters(self.service)[:3], (2, 7, 3.5))
+        review.delete()
+        self.assertEqual(self.counters(self.anna)[:3], (1, 5, 5.0))
+
+    def test_rebuild_decays_bookings_window(self):
+        # Окно сдвигается со временем без сигналов — это делает ежедневный rebuild
+        Appointment.objects.filter(pk=self.appointment.pk).update(appointment_date=date.today() - timedelta(days=31))
+        mismatches = counters.rebuild(verify_only=True)
+        self.assertEqual({(type(obj), field) for obj, field, *_ in mismatches},
+                         {(Master, 'bookings_30d'), (Service, 'bookings_30d')})
+        self.assertEqual(self.counters(self.anna)[3], 1)
+        counters.rebuild()
+        self.assertEqual(self.counters(self.anna)[3], 0)
+        self.assertEqual(counters.rebuild(verify_only=True), [])
+
+
+class SearchTests(TestCase):
+    """Индекс FTS5 следует за услугами, включая bulk_create генератора; ввод пользователя экранируется."""
+
+    def setUp(self):
+        if not search.fts_available():
+            self.skipTest('SQLite собран без FTS5')
+
+    def names(self, query):
+        return [service.name for service in search.search_services(query)]
+
+    def test_index_follows_save_and_delete(self):
+        service = Service.objects.create(name='Маникюр классический', description='Уход за ногтями', price=1000, duration_minutes=60)
+        self.assertEqual(self.names('маникюра'), ['Маникюр классический'])
+        service.name = 'Педикюр'
+        service.save()
+        self.assertEqual(self.names('маникюр'), [])
+        self.assertEqual(self.names('педикюр'), ['Педикюр'])
+        service.delete()
+        self.assertEqual(self.names('педикюр'), [])
+
+    def test_bulk_created_services_are_indexed(self):
+        synthetic.generate({
+            'masters': 1, 'services': 3, 'clients': 2, 'appointments': 5, 'reviews': 1, 'promotions': 1,
+        })
+        for service in Service.objects.all():
+            self.assertIn(service.name, self.names(service.name))
+
+    def test_query_syntax_is_escaped(self):
+        Service.objects.create(name='Маникюр "френч"', description='Покрытие * гель-лак', price=1000, duration_minutes=60)
+        for query in ('"френч"', 'френч"', 'френч*', '*', '"', 'маникюр OR', 'NEAR(маникюр)', 'гель-лак', "'; DROP"):
+            with self.subTest(query=query):
+                self.assertIsInstance(search.search_services(query), list)
+        self.assertEqual(self.names('"френч"'), ['Маникюр "френч"'])
+        self.assertEqual(self.names('NEAR(маникюр)'), [])
+        self.assertEqual(search.search_services('*'), [])
+        # Кавычки и разметка в названии попадают в подсветку экранированными
+        self.assertIn('&quot;<mark>френч</mark>&quot;', search.search_services('френч')[0].name_highlight)
+
+
+class LoyaltyTests(TestCase):
+    """Корзины визитов и расчёт скидки постоянного клиента."""
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.status = AppointmentStatus.objects.create(name='Подтверждена', code=AppointmentStatus.CONFIRMED, occupies_slot=True)
+        status_registry.refresh()
+        availability.clear()
+        self.addCleanup(availability.clear)
+        self.master = Master.objects.create(name='Анна')
+        self.service = Service.objects.create(name='Маникюр', price=Decimal('999.99'), duration_minutes=30)
+        self.guest = User.objects.create_user('guest', role='client')
+
+    def visit(self, number):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Appointment.objects.create(
+                client=self.guest, master=self.master, service=self.service, status=self.status,
+                appointment_date=date.today() + timedelta(days=number // 20), appointment_time=time(9 + number % 20 // 2, number % 2 * 30),
+            )
+
+    def test_tiers_and_price(self):
+        policy = loyalty.LoyaltyPolicy()
+        self.assertEqual(policy.tier(10)[1], 0)
+        self.assertEqual(policy.tier(11)[1], 10)
+        self.assertEqual(policy.price(Decimal('999.99'), 0), Decimal('999.99'))
+        # 999.99 × 0.9 = 899.991 → до копеек
+        self.assertEqual(policy.price(Decimal('999.99'), 11), Decimal('899.99'))
+
+    def test_buckets_follow_visits(self):
+        policy = loyalty.LoyaltyPolicy()
+        for number in range(10):
+            self.visit(number)
+        self.assertEqual(policy.quote(self.service, self.guest)[0], Decimal('999.99'))
+        # Одиннадцатый визит правит закешированную корзину сигналом, без пересборки
+        with self.assertNumQueries(0):
+            loyalty.record_visit(self.guest.pk, timezone.now(), 1)
+            self.assertEqual(loyalty.visit_count(self.guest.pk), 11)
+        loyalty.record_visit(self.guest.pk, timezone.now(), -1)
+        appointment = self.visit(10)
+        self.assertEqual(policy.quote(self.service, self.guest), (Decimal('899.99'), policy.tier(11)))
+        with self.captureOnCommitCallbacks(execute=True):
+            appointment.delete()
+        self.assertEqual(loyalty.visit_counts([self.guest.pk]), {self.guest.pk: 10})
+        # Визиты старше окна не считаются
+        loyalty.record_visit(self.guest.pk, timezone.now() - timedelta(days=loyalty.WINDOW_DAYS + 1), 1)
+        self.assertEqual(loyalty.visit_count(self.guest.pk), 10)
+
+    def test_rolled_back_visit_not_counted(self):
+        self.visit(0)
+        self.assertEqual(loyalty.visit_count(self.guest.pk), 1)
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                Appointment.objects.create(
+                    client=self.guest, master=self.master, service=self.service, status=self.status,
+                    appointment_date=date.today(), appointment_time=time(10),
+                )
+                raise RuntimeError
+        self.assertEqual(callbacks, [])
+        self.assertEqual(loyalty.visit_count(self.guest.pk), 1)
+
+    def test_window_bound_by_local_date(self):
+        appointment = self.visit(0)
+        first_day = timezone.make_aware(datetime.combine(loyalty._window_start(), time.min))
+        # Пересборка из БД берёт весь первый день окна, как и подсчёт по корзинам
+        Appointment.objects.filter(pk=appointment.pk).update(created_at=first_day + timedelta(minutes=1))
+        self.assertEqual(loyalty.load_buckets([self.guest.pk]), {self.guest.pk: {first_day.date(): 1}})
+        Appointment.objects.filter(pk=appointment.pk).update(created_at=first_day - timedelta(minutes=1))
+        self.assertEqual(loyalty.load_buckets([self.guest.pk]), {self.guest.pk: {}})
+
+    def test_buckets_rebuilt_after_ttl(self):
+        self.visit(0)
+        self.assertEqual(loyalty.visit_count(self.guest.pk), 1)
+        key = loyalty._key(self.guest.pk)
+        expires, buckets = cache.get(key)
+        # Правка сигналом не продлевает срок корзины
+        self.visit(1)
+        self.assertEqual(cache.get(key)[0], expires)
+        self.assertEqual(loyalty.visit_count(self.guest.pk), 2)
+        # Удаление в другом процессе: сигнал сюда не дошёл, до пересборки виден старый счёт
+        Appointment.objects.filter(client=self.guest).update(client=None)
+        self.assertEqual(loyalty.visit_count(self.guest.pk), 2)
+        cache.set(key, (0, buckets))
+        self.assertEqual(loyalty.visit_count(self.guest.pk), 0)
+
+
+class TaskQueueTests(TransactionTestCase):
+    """Очередь задач: постановка после фиксации, единственный захват и предел попыток."""
+
+    def setUp(self):
+        self.calls = []
+        tasks.task('tests.record')(lambda **payload: self.calls.append(payload))
+        tasks.task('tests.fail')(self.fail_task)
+        self.addCleanup(tasks._registry.pop, 'tests.record')
+        self.addCleanup(tasks._registry.pop, 'tests.fail')
+
+    @staticmethod
+    def fail_task(**payload):
+        raise ValueError('битая картинка')
+
+    def test_enqueue_waits_for_commit(self):
+        try:
+            with transaction.atomic():
+                tasks.enqueue('tests.record', value=1)
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        self.assertFalse(Task.objects.exists())
+        with transaction.atomic():
+            tasks.enqueue('tests.record', value=2)
+            self.assertFalse(Task.objects.exists())
+        self.assertEqual(list(Task.objects.values_list('payload', flat=True)), [{'value': 2}])
+
+    @override_settings(TASKS_EAGER=True)
+    def test_eager_failure_does_not_propagate(self):
+        with self.assertLogs('website.tasks', 'ERROR'):
+            tasks.enqueue('tests.fail')
+        tasks.enqueue('tests.record', value=3)
+        self.assertEqual(self.calls, [{'value': 3}])
+
+    def test_claim_is_exclusive(self):
+        first, second = (Task.objects.create(name='tests.record') for _ in range(2))
+        raced = []
+
+        def other_worker(execute, sql, params, many, context):
+            # Другой воркер забирает первую задачу между выборкой кандидатов и UPDATE
+            if sql.startswith('UPDATE') and not raced:
+                raced.append(True)
+                Task.objects.filter(pk=first.pk).update(status=Task.RUNNING)
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(other_worker):
+            self.assertEqual(tasks.claim(10), [second.pk])
+        self.assertEqual(tasks.claim(10), [])
+        self.assertEqual(Task.objects.get(pk=second.pk).attempts, 1)
+
+    @override_settings(TASK_RETRY_BASE_SECONDS=10)
+    def test_retries_until_max_attempts(self):
+        job = Task.objects.create(name='tests.fail', max_attempts=2)
+        self.assertEqual(tasks.claim(1), [job.pk])
+        with self.assertLogs('website.tasks', 'WARNING'):
+            self.assertFalse(tasks.execute(job.pk))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Task.PENDING, 1))
+        self.assertGreater(job.run_after, timezone.now() + timedelta(seconds=9))
+        # Пауза до следующей попытки ещё не прошла
+        self.assertEqual(tasks.claim(1), [])
+        Task.objects.filter(pk=job.pk).update(run_after=timezone.now())
+        self.assertEqual(tasks.claim(1), [job.pk])
+        with self.assertLogs('website.tasks', 'WARNING'):
+            self.assertFalse(tasks.execute(job.pk))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Task.FAILED, 2))
+        self.assertIn('битая картинка', job.last_error)
+        self.assertEqual(tasks.claim(1), [])
+        self.assertEqual([tasks.retry_delay(n).seconds for n in (1, 2, 3)], [10, 20, 40])
+
+
+class BlobStorageTests(TestCase):
+    """Хранилище по содержимому: один файл на одинаковые байты, счётчик ссылок и уборка."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = Path(directory.name)
+        media = override_settings(MEDIA_ROOT=directory.name)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.storage = content_addressed_storage()
+
+    def service(self, name, data=None):
+        service = Service(name=name, price=1000, duration_minutes=60)
+        if data is not None:
+            service.image.save(f'{name}.jpg', ContentFile(data), save=False)
+        with self.captureOnCommitCallbacks(execute=True):
+            service.save()
+        return service
+
+    def test_same_content_shares_file(self):
+        first, second = self.service('Маникюр', b'one'), self.service('Педикюр', b'one')
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertTrue(first.image.name.startswith('blobs/') and first.image.name.endswith('.jpg'))
+        self.assertEqual(MediaBlob.objects.get(name=first.image.name).ref_count, 2)
+        self.assertEqual(len(list(self.root.rglob('*.jpg'))), 1)
+        self.assertEqual(list(self.root.rglob('*.part')), [])
+
+    def test_existing_file_is_reused(self):
+        # Файл уже записан параллельной загрузкой — имя то же, без суффиксов
+        name = self.storage.save('a.jpg', ContentFile(b'same'))
+        self.assertEqual(self.storage.save('b.jpg', ContentFile(b'same')), name)
+        self.assertEqual(self.storage.listdir(name.rsplit('/', 1)[0])[1], [name.rsplit('/', 1)[1]])
+
+    def test_file_deleted_with_last_reference(self):
+        first, second = self.service('Маникюр', b'one'), self.service('Педикюр', b'one')
+        name = first.image.name
+
+        first.image.save('new.jpg', ContentFile(b'two'), save=False)
+        with self.captureOnCommitCallbacks(execute=True):
+            first.save()
+        self.assertEqual(MediaBlob.objects.get(name=name).ref_count, 1)
+        self.assertEqual(MediaBlob.objects.get(name=first.image.name).ref_count, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(MediaBlob.objects.filter(name=name).exists())
+        self.assertFalse(self.storage.exists(name))
+        self.assertTrue(self.storage.exists(first.image.name))
+
+    def test_dedupe_media(self):
+        (self.root / 'services').mkdir()
+        for filename, data in [('a.jpg', b'one'), ('a_x1Yz.jpg', b'one'), ('copy.jpg', b'one'), ('own.jpg', b'own')]:
+            (self.root / 'services' / filename).write_bytes(data)
+        first, second = self.service('Маникюр'), self.service('Педикюр')
+        Service.objects.filter(pk=first.pk).update(image='services/a.jpg')
+        Service.objects.filter(pk=second.pk).update(image='services/a_x1Yz.jpg')
+        orphan = self.storage.save('orphan.jpg', ContentFile(b'orphan'))
+
+        call_command('dedupe_media', stdout=StringIO())
+
+        names = set(Service.objects.values_list('image', flat=True))
+        self.assertEqual(len(names), 1)
+        blob = names.pop()
+        self.assertEqual(MediaBlob.objects.get().name, blob)
+        self.assertEqual(MediaBlob.objects.get().ref_count, 2)
+        self.assertTrue(self.storage.exists(blob))
+        self.assertFalse(self.storage.exists(orphan))
+        # Старые файлы и копия перенесённого удалены, уникальный непривязанный оставлен
+        self.assertEqual(self.storage.listdir('services')[1], ['own.jpg'])
+
+
+@override_settings(IMAGE_VARIANT_WIDTHS=[40, 160], IMAGE_VARIANT_FORMATS=['webp'])
+class ImageVariantTests(TestCase):
+    """Производные картинок: файлы и манифест, тег <picture>, задача при сохранении и команда."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        media = override_settings(MEDIA_ROOT=directory.name)
+        media.enable()
+        self.addCleanup(media.disable)
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def service(self, name, color):
+        buffer = BytesIO()
+        PILImage.new('RGB', (100, 50), color).save(buffer, 'PNG')
+        service = Service(name=name, price=1000, duration_minutes=60)
+        service.image.save(f'{name}.png', ContentFile(buffer.getvalue()), save=False)
+        with self.captureOnCommitCallbacks(execute=True):
+            service.save()
+        return service
+
+    def render(self, service):
+        template = Template('{% load responsive_images %}{% responsive_image service.image alt="Маникюр" %}')
+        return template.render(Context({'service': service}))
+
+    def test_variants_and_manifest(self):
+        service = self.service('Маникюр', 'red')
+        manifest = images.generate_variants(service.image)
+        self.assertEqual((manifest['width'], manifest['height']), (100, 50))
+        self.assertEqual(manifest['fallback'], 'jpeg')
+        expected = ['webp', 'jpeg'] if 'webp' in images.variant_formats() else ['jpeg']
+        self.assertEqual(list(manifest['variants']), expected)
+        for variants in manifest['variants'].values():
+            # Шире оригинала не увеличиваем
+            self.assertEqual([width for width, path in variants], [40, 100])
+            for width, path in variants:
+                self.assertTrue(default_storage.exists(path))
+        self.assertEqual(images.get_manifest(service.image.name), manifest)
+
+    def test_tag(self):
+        service = self.service('Маникюр', 'red')
+        html = self.render(service)
+        self.assertHTMLEqual(
+            html, f'<img src="{service.image.url}" alt="Маникюр" class="" loading="lazy">'
+        )
+        images.generate_variants(service.image)
+        html = self.render(service)
+        self.assertTrue(html.startswith('<picture>'))
+        self.assertIn('40w', html)
+        self.assertIn('100w', html)
+        if 'webp' in images.variant_formats():
+            self.assertIn('<source type="image/webp"', html)
+
+    def test_save_enqueues_task(self):
+        service = self.service('Маникюр', 'red')
+        task = Task.objects.get(name='images.build_variants')
+        self.assertEqual(task.payload, {'model': 'website.Service', 'pk': service.pk})
+        # Производные уже есть — повторное сохранение новую задачу не ставит
+        images.generate_variants(service.image)
+        with self.captureOnCommitCallbacks(execute=True):
+            service.save()
+        self.assertEqual(Task.objects.filter(name='images.build_variants').count(), 1)
+
+    def test_command(self):
+        first, second = self.service('Маникюр', 'red'), self.service('Педикюр', 'blue')
+        out = StringIO()
+        call_command('build_image_variants', stdout=out, stderr=StringIO())
+        self.assertIn('Готово: 2, с ошибками: 0', out.getvalue())
+        for service in (first, second):
+            self.assertIsNotNone(images.get_manifest(service.image.name))
+
+
+class HomepageWidgetTests(TestCase):
+    """Запись, отзыв, акция или услуга сбрасывают закешированные виджеты главной."""
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        freshness.versions.clear()
+        self.status = AppointmentStatus.objects.create(name='Подтверждена', code=AppointmentStatus.CONFIRMED, occupies_slot=True)
+        self.master = Master.objects.create(name='Анна')
+        self.service = Service.objects.create(name='Маникюр', price=1000, duration_minutes=60)
+        self.guest = User.objects.create_user('guest', role='client')
+
+    def widgets(self):
+        context = self.client.get(reverse('index')).context
+        return {name: list(context[name]) for name in WIDGETS}
+
+    def test_writes_reset_widgets(self):
+        self.assertEqual(self.widgets(), {'popular_services': [], 'top_masters': [self.master], 'upcoming_promotions': []})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            appointment = Appointment.objects.create(
+                client=self.guest, master=self.master, service=self.service, status=self.status,
+                appointment_date=timezone.localdate() - timedelta(days=1), appointment_time=time(10, 0),
+            )
+        self.assertEqual([service.bookings_30d for service in self.widgets()['popular_services']], [1])
+
+        Review.objects.create(client=self.guest, appointment=appointment, text='-', rating=5)
+        self.assertEqual(self.widgets()['top_masters'][0].rating_avg, 5)
+
+        promotion = Promotion.objects.create(
+            title='Скидка 10%', start_date=timezone.localdate(), end_date=timezone.localdate() + timedelta(days=7),
+        )
+        self.assertEqual(self.widgets()['upcoming_promotions'], [promotion])
+
+        service = Service.objects.get(pk=self.service.pk)
+        service.name = 'Маникюр аппаратный'
+        service.save()
+        self.assertEqual([service.name for service in self.widgets()['popular_services']], ['Маникюр аппаратный'])
+        self.assertContains(self.client.get(reverse('index')), 'Маникюр аппаратный')
+
+
+class BulkTransferTests(TestCase):
+    """Выгрузка и загрузка записей: пустые связи переживают круг, неоднозначные имена отвергаются."""
+
+    def setUp(self):
+        self.status = AppointmentStatus.objects.create(name='Подтверждена', code=AppointmentStatus.CONFIRMED, occupies_slot=True)
+        self.master = Master.objects.create(name='Анна')
+        self.service = Service.objects.create(name='Маникюр', price=1000, duration_minutes=60)
+        self.guest = User.objects.create_user('guest', role='client')
+        self.day = timezone.localdate() + timedelta(days=3)
+
+    def book(self, at, **fields):
+        values = dict(client=self.guest, master=self.master, service=self.service, status=self.status,
+                      appointment_date=self.day, appointment_time=at)
+        values.update(fields)
+        return Appointment.objects.create(**values)
+
+    def rows(self):
+        return sorted(
+            row[1:] for row in bulk.export_rows(Appointment.objects.all())
+        )
+
+    def import_rows(self, text, fmt):
+        importer = bulk.AppointmentImporter()
+        importer.run(StringIO(text), fmt)
+        return importer
+
+    def test_round_trip(self):
+        self.book(time(10, 0), price_paid=Decimal('1500.00'))
+        # Пустые связи появляются, когда клиента, мастера или услугу удаляют (SET_NULL)
+        gone = [
+            User.objects.create_user('gone', role='client'),
+            Master.objects.create(name='Ольга'),
+            Service.objects.create(name='Педикюр', price=1500, duration_minutes=90),
+        ]
+        self.book(time(12, 0), client=gone[0], master=gone[1])
+        self.book(time(14, 0), service=gone[2])
+        for obj in gone:
+            obj.delete()
+        for fmt in bulk.FORMATS:
+            with self.subTest(fmt=fmt):
+                before = self.rows()
+                stream = StringIO()
+                self.assertEqual(bulk.write_rows(stream, bulk.export_rows(Appointment.objects.all()), fmt), 3)
+                Appointment.objects.all().delete()
+
+                importer = self.import_rows(stream.getvalue(), fmt)
+                self.assertEqual(importer.errors, [])
+                self.assertEqual(importer.imported, 3)
+                self.assertEqual(self.rows(), before)
+
+    def test_ambiguous_master_rejected(self):
+        Master.objects.create(name='Анна')
+        status = AppointmentStatus.CONFIRMED
+        text = (
+            'date,time,client,master,service,status\n'
+            f'{self.day},10:00,guest,Анна,Маникюр,{status}\n'
+            f'{self.day},10:00,guest,,Маникюр,{status}\n'
+        )
+        importer = self.import_rows(text, 'csv')
+        self.assertEqual(importer.imported, 1)
+        self.assertEqual(len(importer.errors), 1)
+        self.assertEqual(importer.errors[0][0], 2)
+        self.assertIn('несколько', importer.errors[0][1])
+
+    def test_busy_master_rejected(self):
+        self.book(time(10, 0))
+        text = (
+            f'{{"date": "{self.day}", "time": "10:30", "client": "guest", "master": "Анна", "service": "Маникюр", "status": "{AppointmentStatus.CONFIRMED}"}}\n'
+            f'{{"date": "{self.day}", "time": "11:00", "client": "guest", "master": "Анна", "service": "Маникюр", "status": "{AppointmentStatus.CONFIRMED}"}}\n'
+            f'{{"date": "{self.day}", "time": "11:30", "client": "guest", "master": "Анна", "service": "Маникюр", "status": "{AppointmentStatus.CONFIRMED}"}}\n'
+        )
+        importer = self.import_rows(text, 'jsonl')
+        self.assertEqual(importer.imported, 1)
+        self.assertEqual([line_no for line_no, message in importer.errors], [1, 3])
+
+
+class AppointmentListTests(TestCase):
+    """Список записей: страницы по ключу без пропусков и повторов, фильтры и выгрузка CSV."""
+
+    def setUp(self):
+        self.busy = AppointmentStatus.objects.create(name='Подтверждена', code=AppointmentStatus.CONFIRMED, occupies_slot=True)
+        self.cancelled = AppointmentStatus.objects.create(name='Отменена', code=AppointmentStatus.CANCELLED, occupies_slot=False)
+        status_registry.refresh()
+        self.anna, self.olga = Master.objects.create(name='Анна'), Master.objects.create(name='Ольга')
+        self.service = Service.objects.create(name='Маникюр', price=1000, duration_minutes=60)
+        self.guest = User.objects.create_user('guest', role='client')
+        self.day = date(2030, 5, 10)
+        # Много записей с одинаковыми датой и временем: порядок решает id.
+        # bulk_create — без проверки занятости мастера
+        Appointment.objects.bulk_create([
+            Appointment(
+                client=self.guest, master=self.anna if i % 2 else self.olga, service=self.service,
+                status=self.cancelled if i % 5 == 0 else self.busy,
+                appointment_date=self.day - timedelta(days=i % 3), appointment_time=time(10 + i % 2, 0),
+            )
+            for i in range(APPOINTMENTS_PAGE_SIZE * 2 + 7)
+        ])
+
+    def ids(self, params=None):
+        response = self.client.get(reverse('appointment_list'), params or {})
+        return [appointment.pk for appointment in response.context['appointments']], response
+
+    def test_keyset_pages(self):
+        expected = list(Appointment.objects.order_by(*APPOINTMENT_ORDERING).values_list('pk', flat=True))
+        seen, url = [], reverse('appointment_list')
+        while url:
+            response = self.client.get(url)
+            seen.extend(appointment.pk for appointment in response.context['appointments'])
+            next_query = response.context['next_query']
+            url = f"{reverse('appointment_list')}?{next_query}" if next_query else None
+        self.assertEqual(seen, expected)
+
+    def test_filters(self):
+        for params, lookup in [
+            ({'master': self.anna.pk}, {'master': self.anna}),
+            ({'date_from': self.day.isoformat(), 'date_to': self.day.isoformat()}, {'appointment_date': self.day}),
+            ({'status': AppointmentStatus.CANCELLED}, {'status': self.cancelled}),
+        ]:
+            with self.subTest(params=params):
+                expected = Appointment.objects.filter(**lookup).order_by(*APPOINTMENT_ORDERING)
+                self.assertEqual(self.ids(params)[0], list(expected.values_list('pk', flat=True)[:APPOINTMENTS_PAGE_SIZE]))
+
+    def test_invalid_filter_shows_errors(self):
+        ids, response = self.ids({'date_from': 'вчера', 'master': 0})
+        self.assertEqual(ids, [])
+        self.assertTrue(response.context['filter_form'].errors['date_from'])
+        self.assertContains(response, response.context['filter_form'].errors['master'][0])
+        response = self.client.get(reverse('appointment_export'), {'date_from': 'вчера'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('date_from', response.content.decode())
+
+    def test_malformed_cursor(self):
+        for cursor in ('garbage', '2030-05-10_10:00', '2030-13-01_10:00:00_1', '2030-05-10_10:00:00_x'):
+            with self.subTest(cursor=cursor):
+                self.assertRedirects(
+                    self.client.get(reverse('appointment_list'), {'after': cursor}), reverse('appointment_list')
+                )
+
+    def test_export_csv(self):
+        response = self.client.get(reverse('appointment_export'), {'master': self.anna.pk})
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], '#,Дата,Время,Клиент,Мастер,Услуга,Статус,Оплачено')
+        first = Appointment.objects.filter(master=self.anna).order_by(*APPOINTMENT_ORDERING).first()
+        self.assertEqual(
+            lines[1], f'{first.pk},{first.appointment_date},{first.appointment_time},guest,Анна,Маникюр,{first.status.name},'
+        )
+        self.assertEqual(len(lines) - 1, Appointment.objects.filter(master=self.anna).count())
+
+
+class AdminQueryCountTests(TestCase):
+    """Число запросов страницы списка в админке не должно расти вместе с числом строк."""
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'password', role='admin')
+        self.client.force_login(self.admin)
+        self.status = AppointmentStatus.objects.create(
+            name='Подтверждена', code=AppointmentStatus.CONFIRMED, occupies_slot=True
+        )
+        status_registry.refresh()
+        availability.clear()
+        self.services = [
+            Service.objects.create(name=f'Услуга {i}', price=1000, duration_minutes=30) for i in range(3)
+        ]
+        self.rows = 0
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries)
+
+    def assertConstantQueries(self, url, add_rows):
+        """Страница с 2 и с 12 строками должна обходиться одним и тем же числом запросов."""
+        add_rows(2)
+        # Первый запрос прогревает кеши (типы содержимого и т.п.) и в сравнении не участвует
+        self.count_queries(url)
+        small = self.count_queries(url)
+        add_rows(10)
+        large = self.count_queries(url)
+        self.assertEqual(small, large, f'{url}: {small} запросов на 2 строки, {large} на 12')
+
+    def add_clients(self, count):
+        for _ in range(count):
+            self.rows += 1
+            client = User.objects.create_user(f'client{self.rows}', role='client')
+            self.add_appointments(2, client=client)
+
+    def add_masters(self, count):
+        for _ in range(count):
+            self.rows += 1
+            master = Master.objects.create(name=f'Мастер {self.rows}')
+            for service in self.services:
+                MasterService.objects.create(master=master, service=service)
+
+    def add_appointments(self, count, client=None, master=None, day=None):
+        # Не больше 20 записей в день, дальше — по дню назад
+        self.rows += 1
+        master = master or Master.objects.create(name=f'Мастер записей {self.rows}')
+        client = client or User.objects.create_user(f'visitor{self.rows}', role='client')
+        day = day or date.today() + timedelta(days=1)
+        for i in range(count):
+            start = datetime.combine(day - timedelta(days=i // 20), time(9, 0)) + timedelta(minutes=30 * (i % 20))
+            Appointment.objects.create(
+                client=client, master=master, service=self.services[i % len(self.services)],
+                appointment_date=start.date(), appointment_time=start.time(), status=self.status,
+            )
+
+    def test_user_changelist(self):
+        self.assertConstantQueries(reverse('admin:website_user_changelist'), self.add_clients)
+
+    def test_master_changelist(self):
+        self.assertConstantQueries(reverse('admin:website_master_changelist'), self.add_masters)
+
+    def test_appointment_changelist(self):
+        self.assertConstantQueries(reverse('admin:website_appointment_changelist'), self.add_appointments)
+
+    def test_schedule_grid(self):
+        # Не админка, но та же проверка: сетка недели на 2 и на 12 мастеров с записями
+        url = reverse('schedule') + f'?view=week&date={date.today().isoformat()}'
+        self.assertConstantQueries(url, lambda count: [self.add_appointments(3) for _ in range(count)])
+        response = self.client.get(url)
+        self.assertEqual(len(response.context['rows']), Master.objects.count())
+        blocks = [block for master, cells in response.context['rows'] for blocks in cells for block in blocks]
+        self.assertEqual(len(blocks), Appointment.objects.count())
+        # 30 минут из 12 часов рабочего дня
+        self.assertEqual(blocks[0].width, round(30 * 100 / (12 * 60), 2))
+
+    def test_schedule_date_edges(self):
+        # Крайние даты не должны выводить сетку и ссылки «назад»/«вперёд» за date.min/date.max
+        for query in ('date=0001-01-01', 'date=9999-12-31', 'date=9999-12-31&view=week', 'date=0001-01-01&view=week'):
+            with self.subTest(query=query):
+                response = self.client.get(reverse('schedule') + '?' + query)
+                self.assertEqual(response.status_code, 200)
+                self.assertLessEqual(response.context['days'][-1], response.context['next_day'])
+        self.assertRedirects(self.client.get(reverse('schedule') + '?date=31.12.2024'), reverse('schedule'))
+
+    def test_master_change_page(self):
+        master = Master.objects.create(name='Занятой мастер')
+        url = reverse('admin:website_master_change', args=[master.pk])
+        self.assertConstantQueries(url, lambda count: self.add_appointments(
+            count, master=master, day=date.today() + timedelta(days=count)
+        ))
+
+    def test_master_change_page_hides_old_appointments(self):
+        master = Master.objects.create(name='Давний мастер')
+        self.add_appointments(3, master=master)
+        self.add_appointments(60, master=master, day=date.today() - timedelta(days=100))
+        response = self.client.get(reverse('admin:website_master_change', args=[master.pk]))
+        self.assertEqual(response.context['inline_admin_formsets'][1].formset.total_form_count(), 3)
+
+        url = reverse('admin:website_master_older_appointments', args=[master.pk])
+        first = self.client.get(url)
+        self.assertEqual(len(first.context['appointments']), 50)
+        second = self.client.get(url, {'before': first['X-Next-Cursor']})
+        self.assertEqual(len(second.context['appointments']), 10)
+        self.assertNotIn('X-Next-Cursor', second)
+
+    def test_master_change_page_adds_and_edits_appointments(self):
+        master = Master.objects.create(name='Мастер карточки')
+        self.add_appointments(1, master=master)
+        appointment = Appointment.objects.get(master=master)
+        url = reverse('admin:website_master_change', args=[master.pk])
+        response = self.client.get(url)
+        inline = response.context['inline_admin_formsets'][1]
+        self.assertTrue(inline.has_add_permission)
+        # Клиент и услуга — поля id с подписью уже загруженного объекта
+        self.assertContains(response, f'<strong><a href="{reverse("admin:website_user_change", args=[appointment.client_id])}">')
+
+        newcomer = User.objects.create_user('newcomer', role='client')
+        day = date.today() + timedelta(days=5)
+        data = {'name': master.name, 'specialization': ''}
+        for inline_formset in response.context['inline_admin_formsets']:
+            formset = inline_formset.formset
+            forms = [form for form in formset.forms if form.instance.pk]
+            data.update({
+                f'{formset.prefix}-TOTAL_FORMS': len(forms), f'{formset.prefix}-INITIAL_FORMS': len(forms),
+                f'{formset.prefix}-MIN_NUM_FORMS': 0, f'{formset.prefix}-MAX_NUM_FORMS': 1000,
+            })
+            for form in forms:
+                for name, field in form.fields.items():
+                    value = form.initial.get(name, field.initial)
+                    data[form.add_prefix(name)] = '' if value is None else getattr(value, 'pk', value)
+        prefix = inline.formset.prefix
+        # Существующей записи — другой клиент, и новая запись в той же форме
+        data[f'{prefix}-0-client'] = newcomer.pk
+        data.update({
+            f'{prefix}-TOTAL_FORMS': 2, f'{prefix}-1-client': newcomer.pk, f'{prefix}-1-service': self.services[0].pk,
+            f'{prefix}-1-appointment_date': day.isoformat(), f'{prefix}-1-appointment_time': '15:00',
+            f'{prefix}-1-status': self.status.pk, f'{prefix}-1-master': master.pk,
+        })
+        response = self.client.post(url, data)
+        self.assertEqual(response.status_code, 302, getattr(response, 'context', None) and response.context['errors'])
+        self.assertEqual(Appointment.objects.get(pk=appointment.pk).client, newcomer)
+        self.assertTrue(Appointment.objects.filter(master=master, client=newcomer, appointment_date=day).exists())
+
+
+@override_settings(PERF_SAMPLE_RATE=1.0, PERF_SNAPSHOT_DIR=None)
+class PerfMiddlewareTests(TestCase):
+    """Замеры по имени URL и пометка повторяющихся запросов."""
+
+    def setUp(self):
+        store.clear()
+        self.addCleanup(store.clear)
+
+    def test_records_view(self):
+        self.client.get(reverse('services_list'))
+        self.client.get(reverse('services_list'))
+        row = next(row for row in report() if row['view'] == 'services_list')
+        self.assertEqual(row['requests'], 2)
+        self.assertGreater(row['queries_avg'], 0)
+        self.assertGreater(row['template_ms_avg'], 0)
+
+    @override_settings(PERF_SAMPLE_RATE=0)
+    def test_disabled_when_rate_is_zero(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            PerfMiddleware(lambda request: None)
+
+    def test_flags_duplicate_queries(self):
+        recorder = Recorder()
+        with connection.execute_wrapper(recorder):
+            for service_id in range(5):
+                list(Service.objects.filter(pk=service_id))
+        store.add('test:n_plus_one', 0.01, recorder)
+        row = next(row for row in report() if row['view'] == 'test:n_plus_one')
+        self.assertEqual(row['n_plus_one_requests'], 1)
+        self.assertEqual(row['duplicate_queries'][0]['max_repeats'], 5)
+
+
+class BenchmarkSmokeTests(TestCase):
+    """Генератор данных и все сценарии замеров работают на маленьком наборе."""
+
+    def test_generate_and_run(self):
+        created = synthetic.generate({
+            'masters': 3, 'services': 10, 'clients': 20, 'appointments': 1000, 'reviews': 30, 'promotions': 2,
+        })
+        self.assertEqual(created['appointments'], 1000)
+        self.assertEqual(created['reviews'], 30)
+        before = Appointment.objects.count()
+        results = benchmark.run(iterations=2, warmup=0)
+        self.assertEqual(set(results), set(benchmark.SCENARIOS))
+        # Записи, созданные сценарием бронирования, откатываются
+        self.assertEqual(Appointment.objects.count(), before)
+        baseline = {'results': {name: {**result, 'queries': result['queries'] - 1} for name, result in results.items()}}
+        self.assertTrue(all(row[4] for row in benchmark.compare(results, baseline) if row[1] == 'queries'))
+
+    def test_bad_baseline(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        for name, text in [('missing.json', None), ('broken.json', '{'), ('list.json', '[]')]:
+            path = Path(directory.name) / name
+            if text is not None:
+                path.write_text(text)
+            with self.subTest(name=name), self.assertRaisesMessage(CommandError, str(path)):
+                call_command('benchmark', 'index', baseline=str(path), iterations=1, warmup=0, stdout=StringIO())
+
+
+class FragmentCacheTests(TestCase):
+    """Правка услуги сбрасывает только её закешированную карточку."""
+
+    def test_edit_invalidates_only_its_card(self):
+        first = Service.objects.create(name='Маникюр', price=1000, duration_minutes=30)
+        second = Service.objects.create(name='Педикюр', price=1500, duration_minutes=60)
+        self.assertContains(self.client.get(reverse('services_list')), 'Маникюр')
+        keys = {service.pk: fragment_key('service_row', service) for service in (first, second)}
+
+        first.name = 'Маникюр аппаратный'
+        first.save()
+        self.assertContains(self.client.get(reverse('services_list')), 'Маникюр аппаратный')
+        self.assertNotEqual(fragment_key('service_row', first), keys[first.pk])
+        self.assertEqual(fragment_key('service_row', Service.objects.get(pk=second.pk)), keys[second.pk])
+
+
+class ConditionalGetTests(TestCase):
+    """Повторный запрос каталога с тем же ETag получает 304, пока каталог не изменился."""
+
+    def setUp(self):
+        freshness.versions.clear()
+
+    def test_not_modified_until_service_changes(self):
+        service = Service.objects.create(name='Маникюр', price=1000, duration_minutes=30)
+        response = self.client.get(reverse('services_list'))
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        self.assertTrue(response.has_header('Last-Modified'))
+
+        self.assertEqual(self.client.get(reverse('services_list'), HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        service.price = 1200
+        service.save()
+        response = self.client.get(reverse('services_list'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+class ConcurrencyTests(SimpleTestCase):
+    """gather() выполняет функции одновременно, а внутри транзакции — по очереди в потоке запроса."""
+
+    def test_runs_in_parallel(self):
+        # Барьер на двоих проходится, только если обе функции работают одновременно
+        barrier = threading.Barrier(2, timeout=5)
+        results = async_to_sync(concurrency.gather)(lambda: barrier.wait() >= 0, lambda: barrier.wait() >= 0)
+        self.assertEqual(results, [True, True])
+
+
+class AsyncViewTests(TestCase):
+    """Async-представления отвечают и под ASGI, и через WSGI-клиент."""
+
+    def setUp(self):
+        freshness.versions.clear()
+
+    def test_serial_inside_transaction(self):
+        threads = async_to_sync(concurrency.gather)(threading.get_ident, threading.get_ident)
+        self.assertEqual(len(set(threads)), 1)
+
+    def test_index_and_free_slots(self):
+        service = Service.objects.create(name='Маникюр', price=1000, duration_minutes=60)
+        master = Master.objects.create(name='Анна')
+        MasterService.objects.create(master=master, service=service)
+        client = AsyncClient()
+
+        response = async_to_sync(client.get)(reverse('index'))
+        self.assertEqual(response.status_code, 200)
+        # Под WSGI то же представление выполняется через async_to_sync
+        response = self.client.get(reverse('index'), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+        day = timezone.localdate() + timedelta(days=1)
+        response = async_to_sync(client.get)(
+            reverse('free_slots', args=[service.pk]), {'date_from': day.isoformat(), 'date_to': day.isoformat()}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['slots'][0], {'date': day.isoformat(), 'time': '09:00', 'master': master.pk})
+        self.assertEqual(async_to_sync(client.get)(reverse('free_slots', args=[0])).status_code, 404)
+
+
+class FreeSlotsTests(TestCase):
+    """API свободных слотов: порядок дата → время → мастер, страницы и ошибки параметров."""
+
+    def setUp(self):
+        availability.clear()
+        self.addCleanup(availability.clear)
+        self.status = AppointmentStatus.objects.create(name='Подтверждена', code=AppointmentStatus.CONFIRMED, occupies_slot=True)
+        self.service = Service.objects.create(name='Маникюр', price=1000, duration_minutes=60)
+        self.anna, self.olga = Master.objects.create(name='Анна'), Master.objects.create(name='Ольга')
+        for master in (self.anna, self.olga):
+            MasterService.objects.create(master=master, service=self.service)
+        self.day = timezone.localdate() + timedelta(days=1)
+        self.url = reverse('free_slots', args=[self.service.pk])
+
+    def get(self, **params):
+        return self.client.get(self.url, {'date_from': self.day.isoformat(), 'date_to': self.day.isoformat(), **params})
+
+    def test_order_across_masters(self):
+        client = User.objects.create_user('guest', role='client')
+        with self.captureOnCommitCallbacks(execute=True):
+            Appointment.objects.create(client=client, master=self.anna, service=self.service, status=self.status,
+                                       appointment_date=self.day, appointment_time=time(9, 0))
+        slots = self.get(page_size=4).json()['slots']
+        self.assertEqual([(slot['time'], slot['master']) for slot in slots], [
+            ('09:00', self.olga.pk), ('09:15', self.olga.pk), ('09:30', self.olga.pk), ('09:45', self.olga.pk),
+        ])
+        slots = self.get(page_size=100).json()['slots']
+        self.assertEqual(slots, sorted(slots, key=lambda slot: (slot['date'], slot['time'], slot['master'])))
+        self.assertIn({'date': self.day.isoformat(), 'time': '10:00', 'master': self.anna.pk}, slots)
+
+    def test_pages(self):
+        both = self.get(page_size=6).json()
+        first, second = self.get(page_size=3).json(), self.get(page_size=3, page=2).json()
+        self.assertTrue(first['has_next'])
+        self.assertEqual(first['slots'] + second['slots'], both['slots'])
+        last = self.get(page_size=100, page=2).json()
+        self.assertFalse(last['has_next'])
+
+    def test_default_range(self):
+        data = self.client.get(self.url).json()
+        self.assertEqual(data['date_from'], timezone.localdate().isoformat())
+        self.assertEqual(data['date_to'], (timezone.localdate() + timedelta(days=6)).isoformat())
+        # На краю календаря диапазон обрезается по date.max, а не падает
+        data = self.client.get(self.url, {'date_from': '9999-12-30'}).json()
+        self.assertEqual(data['date_to'], date.max.isoformat())
+
+    def test_bad_params(self):
+        for params in [
+            {'date_from': '31.12.2024'},
+            {'date_to': 'завтра'},
+            {'date_to': (self.day - timedelta(days=1)).isoformat()},
+            {'date_to': (self.day + timedelta(days=FREE_SLOTS_MAX_DAYS)).isoformat()},
+            {'page': 0},
+            {'page': 'два'},
+            {'page_size': 0},
+            {'page_size': FREE_SLOTS_MAX_PAGE_SIZE + 1},
+        ]:
+            with self.subTest(params=params):
+                response = self.get(**params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('error', response.json())
+        self.assertEqual(self.get(page_size=FREE_SLOTS_MAX_PAGE_SIZE).status_code, 200)
+
+    def test_unknown_service(self):
+        self.assertEqual(self.client.get(reverse('free_slots', args=[0])).status_code, 404)
+
+
+class FileServingTests(SimpleTestCase):
+    """Отдача файлов: сжатая копия, диапазоны, 304 и вечный кеш для неизменяемых имён."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = Path(directory.name)
+        self.css = ('.a { color: red; }\n' * 50).encode()
+        (self.root / 'site.css').write_bytes(self.css)
+        assets.compress(self.root / 'site.css')
+        self.factory = RequestFactory()
+
+    def test_compressed_copy_and_revalidation(self):
+        response = assets.serve(self.factory.get('/', HTTP_ACCEPT_ENCODING='gzip, deflate'), 'site.css', self.root)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Cache-Control'], 'public, no-cache')
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), self.css)
+
+        request = self.factory.get('/', HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(assets.serve(request, 'site.css', self.root, immutable=True).status_code, 304)
+        response = assets.serve(self.factory.get('/'), 'site.css', self.root, immutable=True)
+        self.assertNotIn('Content-Encoding', response)
+        self.assertIn('immutable', response['Cache-Control'])
+
+    def test_range(self):
+        response = assets.serve(self.factory.get('/', HTTP_RANGE='bytes=4-9'), 'site.css', self.root)
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 4-9/{len(self.css)}')
+        self.assertEqual(b''.join(response.streaming_content), self.css[4:10])
+
+        response = assets.serve(self.factory.get('/', HTTP_RANGE='bytes=-5'), 'site.css', self.root)
+        self.assertEqual(b''.join(response.streaming_content), self.css[-5:])
+        response = assets.serve(self.factory.get('/', HTTP_RANGE=f'bytes={len(self.css)}-'), 'site.css', self.root)
+        self.assertEqual(response.status_code, 416)
+
+    def test_minify_css_keeps_strings_and_selectors(self):
+        css = '/* note */ a :hover , b > i {\n  content: "a ; b" ;\n  margin: 0 auto;\n}\n/*! license */'
+        self.assertEqual(assets.minify_css(css), 'a :hover,b>i{content:"a ; b";margin:0 auto}/*! license */')
+
+
+class ConcurrentBookingTests(TransactionTestCase):
+    """Десятки одновременных заявок на один слот: сохраняется ровно одна, остальным — 409 или 503."""
+
+    THREADS = 24
+
+    def setUp(self):
+        status = AppointmentStatus.objects.create(
+            name='Подтверждена', code=AppointmentStatus.CONFIRMED, occupies_slot=True
+        )
+        status_registry.refresh()
+        availability.clear()
+        self.addCleanup(availability.clear)
+        self.addCleanup(status_registry.refresh)
+        master = Master.objects.create(name='Анна')
+        service = Service.objects.create(name='Маникюр', price=1000, duration_minutes=60)
+        clients = [User.objects.create_user(f'guest{i}', role='client') for i in range(self.THREADS)]
+        day = date.today() + timedelta(days=3)
+        self.posts = [
+            {
+                'client': client.pk, 'master': master.pk, 'service': service.pk, 'status': status.pk,
+                # Разное время в пределах часа — все заявки пересекаются друг с другом
+                'appointment_date': day.isoformat(), 'appointment_time': f'10:{i % 4 * 15:02d}',
+            }
+            for i, client in enumerate(clients)
+        ]
+
+    def test_one_winner(self):
+        barrier = threading.Barrier(self.THREADS, timeout=10)
+        codes = []
+
+        def post(data):
+            try:
+                # Тестовая БД — общая in-memory (shared cache): там чтение упирается в табличные
+                # блокировки писателя без ожидания. Читателям это снимаем, писатели конкурируют как обычно
+                connection.cursor().execute('PRAGMA read_uncommitted = 1')
+                client = Client()
+                barrier.wait()
+                codes.append(client.post(reverse('appointment_add'), data).status_code)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=post, args=(data,)) for data in self.posts]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(Appointment.objects.count(), 1)
+        self.assertEqual(codes.count(302), 1)
+        self.assertEqual(len(codes), self.THREADS)
+        self.assertTrue(set(codes) <= {302, 409, 503}, codes)
+        self.assertIn(409, codes)
+
+
+class SessionTests(TestCase):
+    """Сессия и пользователь запроса читаются из кеша; пользователь — только из нужных полей."""
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.user = User.objects.create_user('anna', role='master', email='anna@example.com')
+        self.client.force_login(self.user)
+
+    def user_queries(self, queries):
+        return [q['sql'] for q in queries if 'FROM "website_user" WHERE' in q['sql'] or 'django_session' in q['sql']]
+
+    def test_warm_request_skips_session_and_user_tables(self):
+        self.client.get(reverse('appointment_list'))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('appointment_list'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.user_queries(queries.captured_queries), [])
+        user = response.wsgi_request.user
+        self.assertEqual((user.pk, user.username, user.role), (self.user.pk, 'anna', 'master'))
+        self.assertIn('email', user.get_deferred_fields())
+        # Отложенное поле дочитывается по обращению
+        self.assertEqual(user.email, 'anna@example.com')
+
+    def test_saved_user_is_reloaded(self):
+        self.client.get(reverse('appointment_list'))
+        self.user.role = 'admin'
+        self.user.save()
+        self.assertEqual(self.client.get(reverse('appointment_list')).wsgi_request.user.role, 'admin')
+
+    def test_password_change_ends_session(self):
+        self.client.get(reverse('appointment_list'))
+        self.user.set_password('new-password-123')
+        self.user.save()
+        self.assertFalse(self.client.get(reverse('appointment_list')).wsgi_request.user.is_authenticated)
+
+    def test_purge_expired(self):
+        now = timezone.now()
+        for i in range(5):
+            Session.objects.create(session_key=f'expired{i}', session_data='', expire_date=now - timedelta(days=1))
+        self.assertEqual(sessions.purge_expired(batch_size=2, now=now), 5)
+        # Сессия force_login не истекла
+        self.assertEqual(Session.objects.count(), 1)
+
+    def test_shared_cache_deploy_check(self):
+        errors = checks.run_checks(include_deployment_checks=True, tags=[checks.Tags.caches])
+        self.assertEqual([error.id for error in errors], ['website.E001'])
+        # Без --deploy проверка не мешает migrate, collectstatic и остальным командам
+        self.assertEqual(checks.run_checks(tags=[checks.Tags.caches]), [])
+        shared = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+        with override_settings(CACHES=shared):
+            self.assertEqual(sessions.check_shared_cache(), [])
+
+    def test_password_hash_not_cached(self):
+        self.client.get(reverse('appointment_list'))
+        values, session_auth_hash = cache.get(auth.KEY_PREFIX + str(self.user.pk))
+        self.assertNotIn(self.user.password, values)
+        self.assertEqual(session_auth_hash, self.user.get_session_auth_hash())
+
+
+@override_settings(SQLITE_PRAGMAS={'journal_mode': 'wal'})
+class DatabaseRoutingTests(TransactionTestCase):
+    """Страницы @read_only читают через отдельное соединение; внутри транзакции — через default."""
+
+    databases = {'default', 'read'}
+
+    def test_pragmas_applied(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], database.DEFAULT_PRAGMAS['busy_timeout'])
+        with connections['read'].cursor() as cursor:
+            cursor.execute('PRAGMA query_only')
+            self.assertEqual(cursor.fetchone()[0], 1)
+
+    @override_settings(SQLITE_PRAGMAS={})
+    def test_wal_is_opt_in(self):
+        # Режим журнала меняет файл базы — по умолчанию его не трогаем. С журналом
+        # отката — полный fsync, и отдельное соединение для чтения не используется
+        values = database.pragmas('default')
+        self.assertNotIn('journal_mode', values)
+        self.assertEqual(values['synchronous'], 'full')
+        self.assertIsNone(database.read_alias())
+        self.assertEqual(database.read_only(lambda request: router.db_for_read(Service))(None), 'default')
+        with override_settings(SQLITE_PRAGMAS={'journal_mode': 'wal'}):
+            values = database.pragmas('default')
+            self.assertEqual(values['journal_mode'], 'wal')
+            self.assertEqual(values['synchronous'], 'normal')
+            self.assertEqual(next(iter(values)), 'busy_timeout')
+            self.assertNotIn('journal_mode', database.pragmas('read'))
+            self.assertEqual(database.read_alias(), 'read')
+        with override_settings(SQLITE_PRAGMAS={'journal_mode': 'wal', 'synchronous': 'full'}):
+            self.assertEqual(database.pragmas('default')['synchronous'], 'full')
+
+    def test_read_only_view_uses_read_connection(self):
+        with CaptureQueriesContext(connections['read']) as reads, CaptureQueriesContext(connection) as writes:
+            response = self.client.get(reverse('appointment_list'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(any('website_appointment' in q['sql'] for q in reads.captured_queries))
+        self.assertFalse(any('website_appointment' in q['sql'] for q in writes.captured_queries))
+
+    def test_export_streams_from_read_connection(self):
+        # Строки выгрузки читаются уже после выхода из представления
+        with CaptureQueriesContext(connections['read']) as reads, CaptureQueriesContext(connection) as writes:
+            response = self.client.get(reverse('appointment_export'))
+            b''.join(response.streaming_content)
+        self.assertTrue(any('website_appointment' in q['sql'] for q in reads.captured_queries))
+        self.assertFalse(any('website_appointment' in q['sql'] for q in writes.captured_queries))
+
+    def test_router(self):
+        route = database.read_only(lambda request: router.db_for_read(Service))
+        self.assertEqual(route(None), 'read')
+        self.assertEqual(router.db_for_read(Service), 'default')
+        self.assertEqual(database.read_only(lambda request: router.db_for_write(Service))(None), 'default')
+        with transaction.atomic():
+            self.assertEqual(route(None), 'default')
@@ -5,10 +5,15 @@ from .views import (
     book_appointment,
     register,
     appointment_list,
+    appointment_export,
+    schedule,
     appointment_add,
     appointment_detail,
     appointment_edit,
     appointment_delete,
+    free_slots,
+    service_search,
+    perf_report,
 )
 
 urlpatterns = [
@@ -19,8 +24,17 @@ urlpatterns = [
 
     # CRUD для записей Appointment
     path('appointments/', appointment_list, name='appointment_list'),
+    path('appointments/export/', appointment_export, name='appointment_export'),
+    path('appointments/schedule/', schedule, name='schedule'),
     path('appointments/add/', appointment_add, name='appointment_add'),
     path('appointments/<int:pk>/', appointment_detail, name='appointment_detail'),
     path('appointments/<int:pk>/edit/', appointment_edit, name='appointment_edit'),
     path('appointments/<int:pk>/delete/', appointment_delete, name='appointment_delete'),
+
+    # API свободных слотов
+    path('api/services/<int:service_id>/free-slots/', free_slots, name='free_slots'),
+    path('api/services/search/', service_search, name='service_search'),
+
+    # Замеры производительности (только для сотрудников)
+    path('api/perf/', perf_report, name='perf_report'),
 ]
\ No newline at end of file
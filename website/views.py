@@ -1,86 +1,164 @@
-from django.shortcuts import render, redirect
-from django.utils import timezone
-from django.db.models import Count, Avg, Q
-from datetime import date, timedelta
-from .models import Service, Master, Promotion, Appointment
-from .forms import AppointmentForm
+import asyncio
+import csv
+from datetime import date, datetime, time, timedelta
+from functools import partial
+from itertools import chain
+
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth import login
-from .forms import RegistrationForm
-from django.shortcuts import render, get_object_or_404, redirect
-
-def index(request):
-    # Виджет 1: Топ-3 популярных услуг за последний месяц
-    one_month_ago = date.today() - timedelta(days=30)
-    popular_services = (
-        Service.objects
-        .filter(appointments__appointment_date__gte=one_month_ago)  # <— здесь было appointment__, а нужно appointments__
-        .annotate(bookings_count=Count('appointments'))
-        .order_by('-bookings_count')[:3]
-    )
+from django.core.exceptions import NON_FIELD_ERRORS, ValidationError
+from django.db import router
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404, redirect, render
+from django.utils import timezone
 
-    # Виджет 2: Топ-3 мастера по среднему рейтингу
-    top_masters = (
-        Master.objects
-        .annotate(avg_rating=Avg('appointments__review__rating'))
-        .order_by('-avg_rating')[:3]
-    )
+from . import freshness
+from . import schedule as salon_schedule
+from .availability import find_free_slots, service_master_ids
+from .booking import SLOT_TAKEN, BookingBusy, alternatives, save_with_retry
+from .concurrency import gather, run
+from .database import read_only
+from .forms import AppointmentFilterForm, AppointmentForm, RegistrationForm
+from .fragments import list_version
+from .loyalty import pricing_policy
+from .models import Appointment, Master, Promotion, Service
+from .pagination import APPOINTMENT_ORDERING, after_cursor, appointment_cursor
+from .perf import report as perf_report_rows
+from .search import search_services
+from .widgets import aget_widgets
 
-    # Виджет 3: Ближайшие активные акции
-    today = date.today()
-    upcoming_promotions = (
-        Promotion.objects
-        .filter(end_date__gte=today)
-        .order_by('start_date')[:3]
-    )
+# Ограничения API свободных слотов
+FREE_SLOTS_MAX_DAYS = 31
+FREE_SLOTS_MAX_PAGE_SIZE = 100
+# Список записей: размер страницы (порядок и курсор — website/pagination.py)
+APPOINTMENTS_PAGE_SIZE = 50
+# Сколько подсказок отдаёт поиск «по мере ввода»
+SEARCH_SUGGEST_LIMIT = 10
 
+# Таблицы, из которых собираются главная и список услуг (версии — website/freshness.py)
+INDEX_TABLES = (Service, Master, Promotion)
+SERVICES_LIST_TABLES = (Service,)
+
+def _index_etag(request):
+    # «Активна / скоро» у акций зависит от даты, поэтому она входит в ETag
+    return freshness.etag(request, *INDEX_TABLES, extra=(timezone.localdate(), request.GET.get('q', '')))
+
+def _index_last_modified(request):
+    start_of_day = timezone.make_aware(datetime.combine(timezone.localdate(), time.min))
+    return max(freshness.last_modified(*INDEX_TABLES), start_of_day)
+
+def _services_list_etag(request):
+    return freshness.etag(request, *SERVICES_LIST_TABLES, extra=(request.GET.get('q', ''),))
+
+def _services_list_last_modified(request):
+    return freshness.last_modified(*SERVICES_LIST_TABLES)
+
+# Страницы, которые только читают, помечены @read_only: их запросы идут на
+# отдельное соединение для чтения (website/database.py).
+# Главная, каталог и свободные слоты — async-представления: независимые запросы
+# идут параллельно (website/concurrency.py). Под ASGI они обслуживаются напрямую,
+# под WSGI Django выполняет их через async_to_sync.
+@read_only
+@freshness.conditional(_index_etag, _index_last_modified)
+async def index(request):
     # Поиск услуг (если задан параметр q)
     query = request.GET.get('q', '').strip()
+
+    # Виджеты берутся из кеша (website/widgets.py); промахи и поиск считаются одновременно
+    widgets = aget_widgets('popular_services', 'top_masters', 'upcoming_promotions')
     if query:
-        search_results = Service.objects.filter(
-            Q(name__icontains=query) | Q(description__icontains=query)
-        )
+        widgets, search_results = await asyncio.gather(widgets, run(search_services, query))
     else:
-        search_results = None
+        widgets, search_results = await widgets, None
 
     context = {
-        'popular_services': popular_services,
-        'top_masters': top_masters,
-        'upcoming_promotions': upcoming_promotions,
+        **widgets,
         'search_results': search_results,
         'query': query,
     }
-    return render(request, 'website/index.html', context)
+    return await run(render, request, 'website/index.html', context)
 
-def services_list(request):
+def _services_list(request):
     query = request.GET.get('q', '').strip()
+    services_version = None
     if query:
-        services = Service.objects.filter(
-            Q(name__icontains=query) | Q(description__icontains=query)
-        )
+        services = search_services(query)
     else:
+        # Ленивый queryset: при попадании в кеш фрагмента список не запрашивается вовсе
         services = Service.objects.all()
-    return render(request, 'website/services_list.html', {'services': services, 'query': query})
+        services_version = list_version(services)
+    return render(request, 'website/services_list.html', {
+        'services': services,
+        'query': query,
+        'services_version': services_version,
+    })
+
+@read_only
+@freshness.conditional(_services_list_etag, _services_list_last_modified)
+async def services_list(request):
+    # Независимых запросов здесь нет: список ленивый и отрисовывается за один заход
+    return await run(_services_list, request)
+
+@read_only
+def service_search(request):
+    # JSON для поиска «по мере ввода»: лучшие совпадения с подсветкой
+    query = request.GET.get('q', '').strip()
+    results = search_services(query, limit=SEARCH_SUGGEST_LIMIT) if query else []
+    return JsonResponse({
+        'query': query,
+        'results': [
+            {
+                'id': service.id,
+                'name': service.name,
+                'name_highlight': service.name_highlight,
+                'description_snippet': service.description_snippet,
+                'price': str(service.price),
+            }
+            for service in results
+        ],
+    })
+
+def _save_booking(form, save=None):
+    """(запись или None, код ответа) для формы записи.
+
+    Занятый слот — 409 с подсказкой свободного времени, и при проверке формы,
+    и когда слот заняли параллельно под блокировкой; занятая БД — 503.
+    """
+    if not form.is_valid():
+        return None, _slot_taken(form) if form.has_error(NON_FIELD_ERRORS, SLOT_TAKEN) else 200
+    try:
+        return save_with_retry(save or form.save), 200
+    except ValidationError as exc:
+        form.add_error(None, exc)
+        return None, _slot_taken(form)
+    except BookingBusy:
+        form.add_error(None, 'Сейчас много записей, попробуйте ещё раз.')
+        return None, 503
+
+def _slot_taken(form):
+    free = alternatives(form.instance)
+    if free:
+        form.add_error(None, 'Свободно у мастера в этот день: ' + ', '.join(t.strftime('%H:%M') for t in free))
+    return 409
 
 def book_appointment(request, master_id):
+    status = 200
     if request.method == 'POST':
         form = AppointmentForm(request.POST)
-        if form.is_valid():
+
+        def save():
             appointment = form.save(commit=False)
-            # Бизнес-логика: скидка для «частого клиента»
-            six_months_ago = timezone.now() - timedelta(days=182)
-            past_count = Appointment.objects.filter(
-                client=request.user,
-                created_at__gte=six_months_ago
-            ).count()
-            if past_count > 10:
-                appointment.price_paid = appointment.service.price * 0.9
-            else:
-                appointment.price_paid = appointment.service.price
+            # Бизнес-логика: скидка для «частого клиента» (website/loyalty.py)
+            appointment.price_paid, _ = pricing_policy().quote(appointment.service, request.user)
             appointment.save()
+            return appointment
+
+        appointment, status = _save_booking(form, save)
+        if appointment is not None:
             return redirect('index')
     else:
         form = AppointmentForm(initial={'master': master_id, 'client': request.user})
-    return render(request, 'website/book_appointment.html', {'form': form})
+    return render(request, 'website/book_appointment.html', {'form': form}, status=status)
 
 def register(request):
     if request.method == 'POST':
@@ -95,40 +173,124 @@ def register(request):
         form = RegistrationForm()
     return render(request, 'website/register.html', {'form': form})
 
+def _filtered_appointments(request):
+    form = AppointmentFilterForm(request.GET or None)
+    appointments = Appointment.objects.order_by(*APPOINTMENT_ORDERING)
+    if form.is_bound:
+        # С ошибкой в фильтре — не весь список, а пустой и ошибки формы
+        appointments = form.filter(appointments) if form.is_valid() else appointments.none()
+    return form, appointments
+
+@read_only
 def appointment_list(request):
-    appointments = Appointment.objects.select_related('client','master','service').all()
-    return render(request, 'website/appointment_list.html', {'appointments': appointments})
+    form, appointments = _filtered_appointments(request)
+    cursor = request.GET.get('after')
+    if cursor:
+        appointments = after_cursor(appointments, cursor)
+        if appointments is None:
+            return redirect('appointment_list')
+
+    page = list(
+        appointments.select_related('client', 'master', 'service')[:APPOINTMENTS_PAGE_SIZE + 1]
+    )
+    next_query = None
+    if len(page) > APPOINTMENTS_PAGE_SIZE:
+        page = page[:APPOINTMENTS_PAGE_SIZE]
+        params = request.GET.copy()
+        params['after'] = appointment_cursor(page[-1])
+        next_query = params.urlencode()
+
+    filter_params = request.GET.copy()
+    filter_params.pop('after', None)
+    return render(request, 'website/appointment_list.html', {
+        'appointments': page,
+        'filter_form': form,
+        'filter_query': filter_params.urlencode(),
+        'next_query': next_query,
+        'is_first_page': not cursor,
+    })
+
+class _Echo:
+    # Псевдо-файл для csv.writer: строка сразу уходит в ответ
+    def write(self, value):
+        return value
+
+@read_only
+def appointment_export(request):
+    # CSV тех же отфильтрованных записей, потоково и без загрузки всех строк в память
+    form, appointments = _filtered_appointments(request)
+    if form.is_bound and not form.is_valid():
+        return HttpResponse(form.errors.as_text(), status=400, content_type='text/plain; charset=utf-8')
+    # Строки читаются уже после выхода из представления, когда @read_only снят:
+    # соединение выбираем сейчас
+    rows = appointments.using(router.db_for_read(Appointment)).values_list(
+        'id', 'appointment_date', 'appointment_time',
+        'client__username', 'master__name', 'service__name', 'status__name', 'price_paid',
+    ).iterator(chunk_size=2000)
+    writer = csv.writer(_Echo())
+    header = ['#', 'Дата', 'Время', 'Клиент', 'Мастер', 'Услуга', 'Статус', 'Оплачено']
+    response = StreamingHttpResponse(
+        (writer.writerow(row) for row in chain([header], rows)),
+        content_type='text/csv; charset=utf-8',
+    )
+    response['Content-Disposition'] = 'attachment; filename="appointments.csv"'
+    return response
+
+@read_only
+def schedule(request):
+    # Сетка записей всех мастеров на день или неделю: два запроса при любом числе мастеров
+    view = request.GET.get('view') if request.GET.get('view') in salon_schedule.VIEWS else 'day'
+    try:
+        day = date.fromisoformat(request.GET.get('date') or timezone.localdate().isoformat())
+    except ValueError:
+        return redirect('schedule')
+    day = salon_schedule.clamp(day)
+    days, rows = salon_schedule.build(day, salon_schedule.VIEWS[view])
+    shift = timedelta(days=len(days))
+    return render(request, 'website/schedule.html', {
+        'days': days,
+        'rows': rows,
+        'hours': salon_schedule.hour_marks(),
+        'view': view,
+        'day': day,
+        'previous_day': day - shift,
+        'next_day': day + shift,
+        'today': timezone.localdate(),
+    })
 
+@read_only
 def appointment_detail(request, pk):
     appointment = get_object_or_404(Appointment, pk=pk)
     return render(request, 'website/appointment_detail.html', {'appointment': appointment})
 
 def appointment_add(request):
+    status = 200
     if request.method == 'POST':
         form = AppointmentForm(request.POST)
-        if form.is_valid():
-            appointment = form.save()
+        appointment, status = _save_booking(form)
+        if appointment is not None:
             return redirect('appointment_detail', pk=appointment.pk)
     else:
         form = AppointmentForm()
     return render(request, 'website/appointment_form.html', {
         'form': form,
         'title': 'Новая запись'
-    })
+    }, status=status)
 
 def appointment_edit(request, pk):
     appointment = get_object_or_404(Appointment, pk=pk)
+    status = 200
     if request.method == 'POST':
         form = AppointmentForm(request.POST, instance=appointment)
-        if form.is_valid():
-            form.save()
+        saved, status = _save_booking(form)
+        if saved is not None:
             return redirect('appointment_detail', pk=pk)
     else:
         form = AppointmentForm(instance=appointment)
     return render(request, 'website/appointment_form.html', {
         'form': form,
         'title': f'Редактировать запись #{pk}'
-    })
+    }, status=status)
 
 def appointment_delete(request, pk):
     appointment = get_object_or_404(Appointment, pk=pk)
@@ -138,3 +300,53 @@ def appointment_delete(request, pk):
     return render(request, 'website/appointment_confirm_delete.html', {
         'appointment': appointment
     })
+
+@read_only
+async def free_slots(request, service_id):
+    # JSON: ближайшие свободные слоты услуги у всех мастеров за диапазон дат
+    try:
+        # «Сегодня» — как у find_free_slots: по часовому поясу салона
+        date_from = date.fromisoformat(request.GET.get('date_from') or timezone.localdate().isoformat())
+        if request.GET.get('date_to'):
+            date_to = date.fromisoformat(request.GET['date_to'])
+        else:
+            try:
+                date_to = date_from + timedelta(days=6)
+            except OverflowError:
+                date_to = date.max
+        page = int(request.GET.get('page', 1))
+        page_size = int(request.GET.get('page_size', 20))
+    except ValueError:
+        return JsonResponse({'error': 'Некорректные параметры запроса.'}, status=400)
+    if date_to < date_from or (date_to - date_from).days >= FREE_SLOTS_MAX_DAYS:
+        return JsonResponse(
+            {'error': f'Диапазон дат должен быть не длиннее {FREE_SLOTS_MAX_DAYS} дней.'}, status=400
+        )
+    if page < 1 or not 1 <= page_size <= FREE_SLOTS_MAX_PAGE_SIZE:
+        return JsonResponse({'error': 'Некорректная страница.'}, status=400)
+
+    # Услуга и её мастера читаются одновременно, занятость — следующим запросом
+    service, master_ids = await gather(
+        partial(get_object_or_404, Service, pk=service_id), partial(service_master_ids, service_id)
+    )
+    slots, has_next = await run(
+        find_free_slots, service, date_from, date_to,
+        offset=(page - 1) * page_size, limit=page_size, master_ids=master_ids,
+    )
+    return JsonResponse({
+        'service': service.id,
+        'duration_minutes': service.duration_minutes,
+        'date_from': date_from.isoformat(),
+        'date_to': date_to.isoformat(),
+        'page': page,
+        'has_next': has_next,
+        'slots': [
+            {'date': day.isoformat(), 'time': slot.strftime('%H:%M'), 'master': master_id}
+            for day, slot, master_id in slots
+        ],
+    })
+
+@staff_member_required
+def perf_report(request):
+    # Сводка замеров по представлениям за окно PERF_WINDOW_SECONDS (для сотрудников)
+    return JsonResponse({'views': perf_report_rows()}, json_dumps_params={'ensure_ascii': False})
@@ -0,0 +1,73 @@
+from datetime import date
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+
+from .concurrency import gather
+from .models import Service, Master, Promotion
+
+# Виджеты главной страницы: считаются один раз и живут в кеше до истечения TTL
+# или до сброса сигналами (website/signals.py) при изменении исходных данных.
+KEY_PREFIX = 'homepage:'
+
+
+def _compute_popular_services():
+    # Топ-3 популярных услуг за последний месяц (по счётчику bookings_30d)
+    return (
+        Service.objects
+        .filter(bookings_30d__gt=0)
+        .order_by('-bookings_30d')[:3]
+    )
+
+
+def _compute_top_masters():
+    # Топ-3 мастера по среднему рейтингу (по счётчику rating_avg)
+    return (
+        Master.objects
+        .order_by(F('rating_avg').desc(nulls_last=True))[:3]
+    )
+
+
+def _compute_upcoming_promotions():
+    # Ближайшие активные акции
+    return (
+        Promotion.objects
+        .filter(end_date__gte=date.today())
+        .order_by('start_date')[:3]
+    )
+
+
+WIDGETS = {
+    'popular_services': _compute_popular_services,
+    'top_masters': _compute_top_masters,
+    'upcoming_promotions': _compute_upcoming_promotions,
+}
+
+
+def _compute(name):
+    value = list(WIDGETS[name]())
+    cache.set(KEY_PREFIX + name, value, getattr(settings, 'HOMEPAGE_WIDGETS_TTL', 300))
+    return value
+
+
+def get_widget(name):
+    value = cache.get(KEY_PREFIX + name)
+    if value is None:
+        value = _compute(name)
+    return value
+
+
+async def aget_widgets(*names):
+    """{имя: значение} для async-представлений: промахи кеша считаются параллельно."""
+    names = names or tuple(WIDGETS)
+    cached = await cache.aget_many([KEY_PREFIX + name for name in names])
+    values = {name: cached[KEY_PREFIX + name] for name in names if KEY_PREFIX + name in cached}
+    missing = [name for name in names if name not in values]
+    values.update(zip(missing, await gather(*(partial(_compute, name) for name in missing))))
+    return values
+
+
+def invalidate(*names):
+    cache.delete_many([KEY_PREFIX + name for name in (names or WIDGETS)])